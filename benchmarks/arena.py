@@ -0,0 +1,74 @@
+import json
+import tracemalloc
+
+from sys import argv
+
+from src.arena import ArenaBuilder
+from src.ast import ExprBuilder
+from src.compiler import FlechaCompiler
+from src.lexer import FlechaFastLexer
+from src.parser import FlechaParser
+from src.serializer import FlechaSerializer
+
+from .programs import compilableProgram, program, timed
+from .strings import consChains
+
+
+def exprPipeline(s: str):
+    parsed = FlechaParser(ExprBuilder()).parse(FlechaFastLexer().tokenize(s))
+    serialized = FlechaSerializer().serializeProgram(parsed.ast())
+    return json.loads(serialized)
+
+
+def arenaPipeline(s: str):
+    return FlechaParser(ArenaBuilder()).parse(FlechaFastLexer().tokenize(s))
+
+
+# el tiempo se mide sin tracemalloc, que agrega mucho overhead por objeto
+def measure(fun, *args):
+    result, elapsed = timed(fun, *args)
+    del result
+    tracemalloc.start()
+    result = fun(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained, peak
+
+
+def report(name: str, elapsed: float, retained: int, peak: int) -> None:
+    print(f"{name:<20} {elapsed:.3f}s  retenido {retained / 2**20:.1f}MB  pico {peak / 2**20:.1f}MB")
+
+
+# main no usa las definiciones generadas, que el compilador descartaria
+def compile(exps):
+    return list(FlechaCompiler(pruneDefinitions=False).compileExpressions(exps).lines())
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.arena [definiciones]
+    '''
+
+    size = int(argv[1]) if len(argv) > 1 else 2000
+
+    source = program(size)
+    print(f"parseo de {size} definiciones ({len(source)} bytes)")
+    exps, *stats = measure(exprPipeline, source)
+    report("Expr + json", *stats)
+    arena, *stats = measure(arenaPipeline, source)
+    report("AstArena", *stats)
+    # el json expande los strings a cadenas de Cons y el arena los guarda
+    # como nodos de string
+    if consChains([node.toList() for node in arena.ast()]) != exps:
+        raise Exception("el ast del arena difiere del ast de listas")
+    print(f"nodos del arena: {len(arena)}, simbolos: {len(arena.symbols)}")
+
+    source = compilableProgram(size)
+    print(f"compilacion de {size} definiciones")
+    expected, *stats = measure(lambda: compile(exprPipeline(source)))
+    report("Expr + json", *stats)
+    instructions, *stats = measure(lambda: compile(arenaPipeline(source).ast()))
+    report("AstArena", *stats)
+    if instructions != expected:
+        raise Exception("el codigo generado desde el arena difiere")
@@ -0,0 +1,50 @@
+import glob
+from sys import argv
+
+from src.astopt import AstOptimizer
+from src.compiler import FlechaCompiler
+from src.pipeline import parseSource
+
+from .calls import loopProgram
+from .programs import timed
+from .tailcalls import LOOPS
+
+CORPUS = "test_codegen_v2/test_codegen/test*.fl"
+
+
+# el corpus de pruebas de codegen si esta, o los programas de los otros
+# benchmarks si no
+def corpus():
+    paths = sorted(glob.glob(CORPUS))
+    if paths:
+        for path in paths:
+            with open(path) as source:
+                yield path, source.read()
+        return
+    for name, source in LOOPS.items():
+        yield name, source.format(n=1000)
+    yield "llamadas", loopProgram(1000)
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.astopt [pasadas]
+
+    instrucciones generadas por cada programa sin y con el optimizador de ast
+    '''
+
+    rounds = int(argv[1]) if len(argv) > 1 else None
+    totals = [0, 0]
+    optimizer = AstOptimizer() if rounds is None else AstOptimizer(rounds=rounds)
+    for name, source in corpus():
+        ast = parseSource(source)
+        plain = FlechaCompiler().compileExpressions(ast)
+        optimized, seconds = timed(optimizer.optimize, ast)
+        program = FlechaCompiler().compileExpressions(optimized)
+        totals[0] += len(plain)
+        totals[1] += len(program)
+        print(f"{name}: {len(plain)} -> {len(program)} instrucciones ({seconds * 1000:.1f}ms)")
+    print(f"total: {totals[0]} -> {totals[1]} instrucciones")
+    for line in optimizer.report():
+        print(f"  {line}")
@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import tracemalloc
+
+from sys import argv
+
+from src.arena import ArenaBuilder
+from src.lexer import FlechaFastLexer
+from src.parser import FlechaParser
+from src.reader import FlechaBinaryReader
+from src.serializer import FlechaSerializer
+
+from .programs import program, timed
+from .strings import consChains
+
+
+def writeJson(ast, path: str) -> None:
+    with open(path, 'w') as sink:
+        FlechaSerializer().writeProgram(ast, sink)
+
+
+def readJson(path: str):
+    with open(path, 'r') as inputFile:
+        return json.loads(inputFile.read())
+
+
+def retained(fun, *args) -> int:
+    tracemalloc.start()
+    result = fun(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def readBinary(path: str):
+    with open(path, 'rb') as inputFile:
+        return FlechaBinaryReader(inputFile.read()).read()
+
+
+def writeBinary(ast, path: str) -> None:
+    with open(path, 'wb') as sink:
+        FlechaSerializer().writeBinary(ast, sink)
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.binary [definiciones]
+    '''
+
+    size = int(argv[1]) if len(argv) > 1 else 2000
+    ast = FlechaParser(ArenaBuilder()).parse(FlechaFastLexer().tokenize(program(size))).ast()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonPath = os.path.join(tmp, 'program.ast')
+        binaryPath = os.path.join(tmp, 'program.bast')
+
+        _, jsonWrite = timed(writeJson, ast, jsonPath)
+        expected, jsonRead = timed(readJson, jsonPath)
+        _, binaryWrite = timed(writeBinary, ast, binaryPath)
+        loaded, binaryRead = timed(FlechaBinaryReader.load, binaryPath)
+
+        # el json expande los strings a cadenas de Cons y el binario los
+        # guarda como nodos de string
+        if consChains([node.toList() for node in loaded]) != expected:
+            raise Exception("el ast binario difiere del ast en json")
+
+        jsonMemory = retained(readJson, jsonPath)
+        binaryMemory = retained(readBinary, binaryPath)
+
+        print(f"{size} definiciones")
+        print(f"json:    {os.path.getsize(jsonPath):>10} bytes  escritura {jsonWrite:.3f}s  lectura {jsonRead:.3f}s  en memoria {jsonMemory / 2**20:.1f}MB")
+        print(f"binario: {os.path.getsize(binaryPath):>10} bytes  escritura {binaryWrite:.3f}s  lectura {binaryRead:.3f}s  en memoria {binaryMemory / 2**20:.1f}MB")
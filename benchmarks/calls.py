@@ -0,0 +1,72 @@
+import os
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.instructions import Call, ICall, Jump, MovLabel
+from src.pipeline import parseSource
+
+from .programs import execute, timed
+from .tailcalls import MAMARRACHO, run
+
+
+def callProgram(arity: int) -> str:
+    params = " ".join(f"a{i}" for i in range(arity))
+    args = " ".join(str(i) for i in range(arity))
+    body = " + ".join(f"a{i}" for i in range(arity))
+    return f"def f {params} = {body}\ndef main = unsafePrintInt (f {args})\n"
+
+
+# cada clausura que se construye carga su etiqueta con un mov_label; las que
+# estan antes del primer salto son de la seccion de datos y se construyen una
+# sola vez
+def callCounts(program):
+    code = program.instructions
+    start = next(index for index, ins in enumerate(code) if isinstance(ins, Jump))
+    closures = sum(1 for ins in code[start:] if isinstance(ins, MovLabel))
+    icalls = sum(1 for ins in code if isinstance(ins, ICall))
+    calls = sum(1 for ins in code if isinstance(ins, Call))
+    return closures, icalls, calls
+
+
+def loopProgram(iterations: int) -> str:
+    return (
+        "def step a b c = a + b * c\n"
+        "def loop n acc = if n == 0 then acc else (let inc x = x + n in loop (n - 1) (inc (step acc 1 2) % 1000))\n"
+        f"def main = unsafePrintInt (loop {iterations} 0)\n"
+    )
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.calls [aridad maxima] [iteraciones]
+
+    cuenta las clausuras que se construyen fuera de la seccion de datos, los
+    icall y los call de una llamada saturada a una definicion con y sin
+    entradas directas; corre ademas un bucle que llama a una funcion de tres
+    argumentos y a una lambda de un let, en ./mamarracho.bin si esta y si no
+    en la maquina de src.vm
+    '''
+
+    runnable = os.path.exists(MAMARRACHO)
+    limit = int(argv[1]) if len(argv) > 1 else 6
+    iterations = int(argv[2]) if len(argv) > 2 else 1000000 if runnable else 100000
+    print("clausuras fuera de los datos / icall / call en el programa")
+    for arity in range(1, limit + 1):
+        ast = parseSource(callProgram(arity))
+        curried = callCounts(FlechaCompiler(directCalls=False).compileExpressions(ast))
+        direct = callCounts(FlechaCompiler().compileExpressions(ast))
+        print(f"aridad {arity}: currificada {curried[0]} / {curried[1]} / {curried[2]}   directa {direct[0]} / {direct[1]} / {direct[2]}")
+
+    ast = parseSource(loopProgram(iterations))
+    for directCalls in [False, True]:
+        program = FlechaCompiler(directCalls=directCalls).compileExpressions(ast)
+        closures, icalls, calls = callCounts(program)
+        line = f"bucle {'directo' if directCalls else 'currificado'}: {closures} clausuras, {icalls} icall, {calls} call"
+        if runnable:
+            output, seconds = timed(run, program)
+            line += f"  -> {output} en {seconds:.2f}s"
+        else:
+            (output, vm), seconds = timed(execute, program)
+            line += f"  -> {output} en {seconds:.2f}s, {vm.steps} instrucciones ejecutadas, {vm.calls} llamadas"
+        print(line)
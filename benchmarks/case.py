@@ -0,0 +1,68 @@
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.instructions import Jump, JumpEq, JumpLt, Label, Load, MovInt
+from src.pipeline import parseSource
+
+
+def caseProgram(branches: int) -> str:
+    alternatives = "\n".join(f"  | C{i} -> {i}" for i in range(branches))
+    return f"def pick x = case x\n{alternatives}\ndef main = unsafePrintInt (pick C0)\n"
+
+
+# recorre solo el codigo del despacho del case, desde que se carga el tag
+# del valor hasta llegar a una rama, y cuenta las instrucciones ejecutadas
+def dispatchCost(program, tag: int):
+    code = program.instructions
+    start = next(index for index, ins in enumerate(code) if isinstance(ins, Load) and ins.index == 0)
+    targets = {ins.label: index for index, ins in enumerate(code) if isinstance(ins, Label)}
+    registers = {code[start].reg1: tag}
+    pc = start + 1
+    executed = 0
+    while True:
+        ins = code[pc]
+        if isinstance(ins, Label):
+            if program.label(ins.label).startswith("RAMA_"):
+                return program.label(ins.label), executed
+            pc += 1
+            continue
+        executed += 1
+        pc += 1
+        if isinstance(ins, MovInt):
+            registers[ins.reg] = ins.value
+        elif isinstance(ins, Jump):
+            pc = targets[ins.label]
+        elif isinstance(ins, JumpEq) and registers[ins.reg1] == registers[ins.reg2]:
+            pc = targets[ins.label]
+        elif isinstance(ins, JumpLt) and registers[ins.reg1] < registers[ins.reg2]:
+            pc = targets[ins.label]
+
+
+def measure(ast, binaryCase: bool, branches: int):
+    compiler = FlechaCompiler(binaryCase=binaryCase)
+    program = compiler.compileExpressions(ast)
+    costs = []
+    for i in range(branches):
+        tag = compiler.tags[f"C{i}"].tag
+        branch, executed = dispatchCost(program, tag)
+        if branch != f"RAMA_{i}_1":
+            raise Exception(f"el tag de C{i} llego a {branch}")
+        costs.append(executed)
+    return max(costs), sum(costs) / len(costs)
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.case [ramas maximas]
+    '''
+
+    limit = int(argv[1]) if len(argv) > 1 else 256
+    print("instrucciones ejecutadas para elegir la rama (peor caso / promedio)")
+    branches = 4
+    while branches <= limit:
+        ast = parseSource(caseProgram(branches))
+        linear = measure(ast, False, branches)
+        binary = measure(ast, True, branches)
+        print(f"{branches:>5} ramas: lineal {linear[0]:>4} / {linear[1]:>6.1f}   binaria {binary[0]:>3} / {binary[1]:>5.1f}")
+        branches *= 2
@@ -0,0 +1,51 @@
+from sys import argv
+
+from src.compiler import FlechaCompiler
+
+from .programs import timed
+
+
+# C 0 1 2 ... n: una sola aplicacion de constructor con n argumentos
+def wideConstructorAst(size: int):
+    exp = ["ExprConstructor", "C"]
+    for i in range(size):
+        exp = ["ExprApply", exp, ["ExprNumber", i]]
+    return [["Def", "main", exp]]
+
+
+# let x0 = 0 in let x1 = x0 in ... in xn
+def deepLetAst(size: int):
+    body = ["ExprVar", f"x{size - 1}"]
+    for i in reversed(range(size)):
+        value = ["ExprVar", f"x{i - 1}"] if i > 0 else ["ExprNumber", 0]
+        body = ["ExprLet", f"x{i}", value, body]
+    return [["Def", "main", body]]
+
+
+def compile(ast):
+    return FlechaCompiler().compileExpressions(ast)
+
+
+def scaling(name: str, makeAst, sizes):
+    print(name)
+    for size in sizes:
+        ins, seconds = timed(compile, makeAst(size))
+        print(f"{size:>7}: {seconds:.3f}s, {len(ins)} instrucciones ({seconds / size * 1e6:.2f}us por nodo)")
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.codegen [tamaño maximo]
+
+    corre con el limite de recursion por defecto de Python
+    '''
+
+    limit = int(argv[1]) if len(argv) > 1 else 16000
+    sizes = []
+    size = 1000
+    while size <= limit:
+        sizes.append(size)
+        size *= 2
+    scaling("constructor con muchos argumentos", wideConstructorAst, sizes)
+    scaling("lets anidados", deepLetAst, sizes)
@@ -0,0 +1,77 @@
+from src.compiler import FlechaCompiler
+from src.instructions import Alloc, Label, Return
+from src.pipeline import parseSource
+
+from .programs import execute
+
+
+# funciones recursivas sobre listas que construyen literales y
+# constructores sin argumentos en cada llamada
+LIST_PROGRAMS = {
+    "fill": (
+        "def fill xs = case xs\n"
+        "  | Nil -> Nil\n"
+        "  | Cons y ys -> Cons 0 (Cons 'x' (fill ys))\n"
+    ),
+    "flags": (
+        "def flags xs = case xs\n"
+        "  | Nil -> Nil\n"
+        "  | Cons y ys -> Cons True (Cons False (Cons Nil (flags ys)))\n"
+    ),
+    "map": (
+        "def map f xs = case xs\n"
+        "  | Nil -> Nil\n"
+        "  | Cons y ys -> Cons (f y) (map f ys)\n"
+        "def tens xs = map (\\x -> 10) xs\n"
+    ),
+}
+
+MAIN = "def main = unsafePrintInt 1\n"
+
+# para contar los alloc que se ejecutan, cada programa se aplica a una
+# lista de LENGTH elementos
+LENGTH = 100
+
+RUN = (
+    "def range n = if n == 0 then Nil else Cons n (range (n - 1))\n"
+    "def len xs = case xs | Nil -> 0 | Cons y ys -> 1 + len ys\n"
+    "def main = unsafePrintInt (len ({name} (range {length})))\n"
+)
+
+
+# allocs dentro de las rutinas, que se ejecutan en cada llamada, y fuera
+# de ellas (seccion de datos y definiciones), que se ejecutan una sola vez
+def allocations(program):
+    inRoutines = 0
+    once = 0
+    routine = False
+    for ins in program:
+        if isinstance(ins, Label) and program.label(ins.label).startswith("rtn_"):
+            routine = True
+        elif isinstance(ins, Return):
+            routine = False
+        elif isinstance(ins, Alloc):
+            if routine:
+                inRoutines += 1
+            else:
+                once += 1
+    return inRoutines, once
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.constants
+
+    los allocs ejecutados se cuentan corriendo cada funcion sobre una lista
+    en la maquina de src.vm
+    '''
+
+    print(f"{'programa':<10} {'allocs en rutinas':>20} {'allocs una vez':>20} {'allocs ejecutados':>20}")
+    for name, source in LIST_PROGRAMS.items():
+        ast = parseSource(source + MAIN)
+        before = allocations(FlechaCompiler(staticConstants=False).compileExpressions(ast))
+        after = allocations(FlechaCompiler().compileExpressions(ast))
+        ast = parseSource(source + RUN.format(name=name, length=LENGTH))
+        executed = [execute(FlechaCompiler(staticConstants=static).compileExpressions(ast))[1].allocations for static in [False, True]]
+        print(f"{name:<10} {before[0]:>9} -> {after[0]:<8} {before[1]:>9} -> {after[1]:<8} {executed[0]:>9} -> {executed[1]:<8}")
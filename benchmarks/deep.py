@@ -0,0 +1,68 @@
+import os
+import sys
+
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.pipeline import parseSource
+from src.serializer import FlechaSerializer
+
+from .instructions import memory
+from .programs import timed
+
+# con la sangria del json la salida crece con el cuadrado de la
+# profundidad, asi que con mas niveles solo se mide el formato binario
+JSON_LIMIT = 10000
+
+
+# programas con n niveles de anidamiento: un string, una lista escrita con
+# Cons, una secuencia de `;`, parentesis anidados y lets anidados
+def deepPrograms(n: int) -> dict:
+    return {
+        "string": "def main = unsafePrintChar (case \"" + "a" * n + "\" | Nil -> 'x' | Cons c cs -> c)\n",
+        "lista": "def main = unsafePrintInt (case " + "Cons 1 (" * n + "Nil" + ")" * n + " | Nil -> 0 | Cons x xs -> x)\n",
+        "secuencia": "def main = (" + "; ".join(["unsafePrintInt 1"] * n) + ")\n",
+        "parentesis": "def main = unsafePrintInt " + "(" * n + "1" + " + 1)" * n + "\n",
+        "lets": "def main = " + "".join(f"let x{i} = {i} in " for i in range(n)) + "unsafePrintInt x0\n",
+    }
+
+
+def writeJson(ast) -> None:
+    with open(os.devnull, "w") as sink:
+        FlechaSerializer().writeProgram(ast, sink)
+
+
+def serializeBinary(ast) -> bytes:
+    return FlechaSerializer().serializeBinary(ast)
+
+
+def compile(ast, optimize: int):
+    return FlechaCompiler(optimize=optimize).compileExpressions(ast)
+
+
+def measure(name: str, fun, *args):
+    result, seconds = timed(fun, *args)
+    del result
+    result, _, peak = memory(fun, *args)
+    print(f"  {name:>12}: {seconds:.3f}s, pico {peak / 2**20:.1f}MB")
+    return result
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.deep [niveles]
+
+    corre con el limite de recursion por defecto de Python
+    '''
+
+    depth = int(argv[1]) if len(argv) > 1 else 100000
+    print(f"{depth} niveles, limite de recursion {sys.getrecursionlimit()}")
+    for name, source in deepPrograms(depth).items():
+        print(name)
+        ast = measure("parseo", parseSource, source)
+        measure("binario", serializeBinary, ast)
+        if depth <= JSON_LIMIT:
+            measure("json", writeJson, ast)
+        for optimize in [0, 1]:
+            measure(f"-O{optimize}", compile, ast, optimize)
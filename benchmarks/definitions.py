@@ -0,0 +1,41 @@
+import gc
+
+from sys import argv
+
+from src.lexer import FlechaFastLexer
+from src.parser import FlechaParser
+
+from .programs import timed
+
+
+def source(size: int) -> str:
+    return "\n".join(f"def f{i} x = Cons x (f{i} {i})" for i in range(size))
+
+
+def parse(s: str):
+    return FlechaParser().parse(FlechaFastLexer().tokenize(s))
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.definitions [definiciones maximas] [--gc]
+    '''
+
+    # sin --gc se aisla el costo de construir el ast de las pasadas del
+    # recolector ciclico, que crecen con la cantidad de objetos vivos
+    options = [arg for arg in argv[1:] if arg.startswith('--')]
+    args = [arg for arg in argv[1:] if not arg.startswith('--')]
+    limit = int(args[0]) if args else 100000
+    if '--gc' not in options:
+        gc.disable()
+    size = 10
+    while size <= limit:
+        s = source(size)
+        parsed, parseTime = timed(parse, s)
+        ast, astTime = timed(parsed.ast)
+        if len(ast) != size:
+            raise Exception(f"se esperaban {size} definiciones y hay {len(ast)}")
+        perDef = astTime / size * 1e6
+        print(f"{size:>7} defs: parse {parseTime:.3f}s, ast {astTime:.4f}s ({perDef:.2f}us/def)")
+        size *= 10
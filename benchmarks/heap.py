@@ -0,0 +1,39 @@
+from io import StringIO
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.heap import Heap
+from src.pipeline import parseSource
+from src.vm import MAX_STEPS, runProgram
+
+from .programs import timed
+
+
+# arma una lista de length elementos, la suma y la descarta, rounds veces:
+# casi todo lo reservado es basura enseguida
+def garbageProgram(length: int, rounds: int) -> str:
+    return (
+        "def range n = if n == 0 then Nil else Cons n (range (n - 1))\n"
+        "def sum xs = case xs | Nil -> 0 | Cons y ys -> y + sum ys\n"
+        "def loop n acc = if n == 0 then acc else loop (n - 1) (acc + sum (range " + str(length) + "))\n"
+        "def main = unsafePrintInt (loop " + str(rounds) + " 0)\n"
+    )
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.heap [largo] [vueltas] [palabras]
+
+    corre un programa que genera mucha basura en src.vm con un heap chico
+    '''
+
+    length = int(argv[1]) if len(argv) > 1 else 1000
+    rounds = int(argv[2]) if len(argv) > 2 else 200
+    words = int(argv[3]) if len(argv) > 3 else 1 << 14
+    program = FlechaCompiler().compileExpressions(parseSource(garbageProgram(length, rounds)))
+    heap = Heap(initialWords=words, maxWords=words)
+    vm, seconds = timed(runProgram, program, StringIO(), MAX_STEPS, heap)
+    print(f"{vm.steps} instrucciones, {vm.allocations} allocs en {seconds:.2f}s")
+    for line in heap.report():
+        print(line)
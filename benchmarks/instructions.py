@@ -0,0 +1,49 @@
+import tracemalloc
+
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.pipeline import parseSource
+
+from .programs import compilableProgram, timed
+
+
+# main no usa las definiciones generadas, que el compilador descartaria
+def compile(ast):
+    return FlechaCompiler(pruneDefinitions=False).compileExpressions(ast)
+
+
+def render(program):
+    return list(program.lines())
+
+
+# pico y memoria retenida, medidos en otra corrida porque tracemalloc
+# agrega mucho overhead por objeto
+def memory(fun, *args):
+    tracemalloc.start()
+    result = fun(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.instructions [definiciones]
+    '''
+
+    size = int(argv[1]) if len(argv) > 1 else 20000
+    ast = parseSource(compilableProgram(size))
+
+    program, compileTime = timed(compile, ast)
+    del program
+    program, retained, peak = memory(compile, ast)
+    count = len(program)
+    print(f"compilacion de {size} definiciones: {count} instrucciones en {compileTime:.3f}s")
+    print(f"programa compilado: retenido {retained / 2**20:.1f}MB ({retained / count:.0f} bytes por instruccion), pico {peak / 2**20:.1f}MB")
+
+    lines, renderTime = timed(render, program)
+    del lines
+    lines, retained, peak = memory(render, program)
+    print(f"texto de todas las instrucciones: {renderTime:.3f}s, retenido {retained / 2**20:.1f}MB ({retained / count:.0f} bytes por instruccion)")
@@ -0,0 +1,52 @@
+from sys import argv
+
+from src.lexer import FlechaFastLexer, FlechaLexer
+
+from .programs import program, timed
+
+
+def slyTokens(s: str):
+    return list(FlechaLexer().tokenize(s))
+
+
+def fastTokens(s: str):
+    return list(FlechaFastLexer().scan(s))
+
+
+def fastArrays(s: str):
+    return FlechaFastLexer().scanArrays(s)
+
+
+def fastSlyTokens(s: str):
+    return list(FlechaFastLexer().tokenize(s))
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.lexer [definiciones]
+    '''
+
+    size = int(argv[1]) if len(argv) > 1 else 20000
+    source = program(size)
+    print(f"input: {len(source)} bytes")
+
+    expected, slyTime = timed(slyTokens, source)
+    tokens, fastTime = timed(fastTokens, source)
+    arrays, arraysTime = timed(fastArrays, source)
+    adapted, adaptedTime = timed(fastSlyTokens, source)
+
+    kinds = FlechaFastLexer().kinds
+    expected = [(tok.type, tok.value, tok.index, tok.end) for tok in expected]
+    if [(kinds[kind], source[start:end], start, end) for kind, start, end in tokens] != expected:
+        raise Exception("FlechaFastLexer.scan produjo tokens distintos a FlechaLexer")
+    if list(zip(*arrays)) != tokens:
+        raise Exception("FlechaFastLexer.scanArrays produjo tokens distintos a scan")
+    if [(tok.type, tok.value, tok.index, tok.end) for tok in adapted] != expected:
+        raise Exception("FlechaFastLexer.tokenize produjo tokens distintos a FlechaLexer")
+
+    print(f"tokens: {len(expected)}")
+    print(f"sly:          {slyTime:.3f}s")
+    print(f"fast scan:    {fastTime:.3f}s ({slyTime / fastTime:.1f}x)")
+    print(f"fast arrays:  {arraysTime:.3f}s ({slyTime / arraysTime:.1f}x)")
+    print(f"fast tokens:  {adaptedTime:.3f}s ({slyTime / adaptedTime:.1f}x)")
@@ -0,0 +1,51 @@
+import json
+
+from sys import argv
+
+from src.ast import ExprBuilder
+from src.compiler import FlechaCompiler
+from src.lexer import FlechaLexer
+from src.parser import FlechaParser
+from src.pipeline import parseSource
+from src.serializer import FlechaSerializer
+
+from .programs import compilableProgram, timed
+
+
+# lo que hacia src.main: serializar el ast a json y volver a leerlo
+def roundTrip(source: str):
+    parsed = FlechaParser(ExprBuilder()).parse(FlechaLexer().tokenize(source))
+    exps = json.loads(FlechaSerializer().serializeProgram(parsed.ast()))
+    return FlechaCompiler(pruneDefinitions=False).compileExpressions(exps)
+
+
+# compileSource sin descartar definiciones: main no usa las generadas, asi
+# que con las opciones por defecto se compilaria un programa vacio
+def inProcess(source: str):
+    return FlechaCompiler(pruneDefinitions=False).compileExpressions(parseSource(source))
+
+
+def repeat(fun, source: str, times: int):
+    for _ in range(times):
+        result = fun(source)
+    return result
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.pipeline [definiciones] [repeticiones]
+    '''
+
+    size = int(argv[1]) if len(argv) > 1 else 50
+    times = int(argv[2]) if len(argv) > 2 else 50
+    source = compilableProgram(size)
+
+    expected, roundTripTime = timed(repeat, roundTrip, source, times)
+    result, inProcessTime = timed(repeat, inProcess, source, times)
+    if list(result.lines()) != list(expected.lines()):
+        raise Exception("compileSource genero un codigo distinto")
+
+    print(f"{times} compilaciones de {size} definiciones")
+    print(f"json ida y vuelta: {roundTripTime / times * 1000:.2f}ms por programa")
+    print(f"compileSource:     {inProcessTime / times * 1000:.2f}ms por programa ({roundTripTime / inProcessTime:.1f}x)")
@@ -0,0 +1,47 @@
+from io import StringIO
+from typing import Callable
+from time import perf_counter
+
+from src.vm import runProgram
+
+
+def timed(fun: Callable, *args):
+    start = perf_counter()
+    result = fun(*args)
+    return result, perf_counter() - start
+
+
+def definition(i: int) -> str:
+    return (
+        f"-- definicion {i}\n"
+        f"def f{i} xs n =\n"
+        f"  let z = (\\k -> k * {i} + n % 3 / 1) in\n"
+        f"  case xs\n"
+        f"  | Nil -> (if !(n < {i}) && n != 1 || n <= 2 then 'a' elif n > 0 then '\\n' else 'c')\n"
+        f"  | Cons y ys -> (unsafePrintChar 'b'; f{i} ys (z y - 1); \"def {i}\\t\")\n"
+    )
+
+
+def program(size: int) -> str:
+    defs = [definition(i) for i in range(size)]
+    defs.append('def main = unsafePrintInt (f0 (Cons 1 Nil) 2)\n')
+    return "\n".join(defs)
+
+
+# solo usa construcciones que FlechaCompiler ya sabe compilar
+def compilableDefinition(i: int) -> str:
+    return f"def f{i} x = let y = {i} in (\\z -> y) 'c'\n"
+
+
+def compilableProgram(size: int) -> str:
+    defs = [compilableDefinition(i) for i in range(size)]
+    defs.append("def main = unsafePrintInt 1\n")
+    return "\n".join(defs)
+
+
+# corre un programa compilado en la maquina de src.vm y devuelve lo que
+# imprimio junto con la maquina, que tiene los contadores de la corrida
+def execute(program):
+    output = StringIO()
+    vm = runProgram(program, output)
+    return output.getvalue(), vm
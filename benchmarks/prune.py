@@ -0,0 +1,33 @@
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.pipeline import parseSource
+
+from .programs import timed
+
+
+# un preludio de funciones de listas del que main usa solo las dos primeras
+def preludeProgram(size: int) -> str:
+    defs = ["def len xs = case xs | Nil -> 0 | Cons y ys -> 1 + len ys"]
+    defs.append("def map f xs = case xs | Nil -> Nil | Cons y ys -> Cons (f y) (map f ys)")
+    for i in range(size):
+        defs.append(f"def f{i} xs acc = case xs | Nil -> acc | Cons y ys -> f{i} ys (acc + y * {i})")
+    defs.append("def main = unsafePrintInt (len (map (\\x -> x + 1) (Cons 1 (Cons 2 Nil))))")
+    return "\n".join(defs) + "\n"
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.prune [definiciones del preludio]
+    '''
+
+    size = int(argv[1]) if len(argv) > 1 else 1000
+    ast = parseSource(preludeProgram(size))
+    for prune in [False, True]:
+        compiler = FlechaCompiler(pruneDefinitions=prune)
+        program, seconds = timed(compiler.compileExpressions, ast)
+        print(f"{'con' if prune else 'sin'} poda: {len(program)} instrucciones en {seconds:.2f}s")
+        if prune:
+            for line in compiler.reachable.report():
+                print(f"  {line}")
@@ -0,0 +1,45 @@
+import sys
+
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.pipeline import parseSource
+
+from .codegen import deepLetAst, wideConstructorAst
+from .programs import compilableProgram, timed
+
+
+# main no usa las definiciones generadas, que el compilador descartaria
+def compile(ast, allocateRegisters: bool):
+    compiler = FlechaCompiler(allocateRegisters, pruneDefinitions=False)
+    return compiler, compiler.compileExpressions(ast)
+
+
+def outputSize(program) -> int:
+    return sum(len(line) + 1 for line in program.lines())
+
+
+def compare(name: str, ast) -> None:
+    (_, virtual), virtualTime = timed(compile, ast, False)
+    (compiler, allocated), allocatedTime = timed(compile, ast, True)
+    stats = compiler.allocator.stats
+    before = sum(stat[1] for stat in stats)
+    after = sum(stat[2] for stat in stats)
+    print(name)
+    print(f"  registros: {before} -> {after} en {len(stats)} regiones (maximo por region {max(stat[1] for stat in stats)} -> {max(stat[2] for stat in stats)})")
+    print(f"  instrucciones: {len(virtual)} -> {len(allocated)}, texto: {outputSize(virtual)} -> {outputSize(allocated)} bytes")
+    print(f"  compilacion: {virtualTime:.3f}s -> {allocatedTime:.3f}s")
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.regalloc [definiciones] [tamaño]
+    '''
+
+    sys.setrecursionlimit(100000)
+    size = int(argv[1]) if len(argv) > 1 else 2000
+    depth = int(argv[2]) if len(argv) > 2 else 2000
+    compare(f"{size} definiciones", parseSource(compilableProgram(size)))
+    compare(f"constructor con {depth} argumentos", wideConstructorAst(depth))
+    compare(f"{depth} lets anidados", deepLetAst(depth))
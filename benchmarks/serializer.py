@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+import tracemalloc
+
+from sys import argv
+
+from src.serializer import FlechaSerializer
+
+from .programs import timed
+
+
+# cadena de aplicaciones anidadas a derecha, como la que genera un string
+def deepAst(depth: int):
+    tail = ["ExprConstructor", "Nil"]
+    for i in range(depth):
+        head = ["ExprApply", ["ExprConstructor", "Cons"], ["ExprChar", 97 + i % 26]]
+        tail = ["ExprApply", head, tail]
+    return [["Def", "main", tail]]
+
+
+def wideAst(width: int):
+    branches = [["CaseBranch", "Cons", ["y", "ys"], ["ExprVar", "y"]], ["CaseBranch", "Nil", [], ["ExprNumber", 0]]]
+    body = ["ExprLet", "x", ["ExprNumber", 1], ["ExprCase", ["ExprVar", "xs"], branches]]
+    return [["Def", f"f{i}", ["ExprLambda", "xs", body]] for i in range(width)]
+
+
+def stringSerializer(ast):
+    return FlechaSerializer().serializeProgram(ast)
+
+
+def streamSerializer(ast):
+    sink = io.StringIO()
+    FlechaSerializer().writeProgram(ast, sink)
+    return sink.getvalue()
+
+
+def peak(fun, ast) -> int:
+    tracemalloc.start()
+    fun(ast)
+    _, peakSize = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peakSize
+
+
+def compare(name: str, ast) -> None:
+    expected, stringTime = timed(stringSerializer, ast)
+    result, streamTime = timed(streamSerializer, ast)
+    if result != expected:
+        raise Exception(f"{name}: la salida en streaming difiere")
+    stringPeak = peak(stringSerializer, ast)
+    with open(os.devnull, 'w') as devnull:
+        streamPeak = peak(lambda ast: FlechaSerializer().writeProgram(ast, devnull), ast)
+    print(f"{name}: {len(expected)} bytes")
+    print(f"  strings:   {stringTime:.3f}s  pico {stringPeak / 2**20:.1f}MB")
+    print(f"  streaming: {streamTime:.3f}s  pico {streamPeak / 2**20:.1f}MB ({stringTime / streamTime:.1f}x)")
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.serializer [profundidad] [ancho]
+    '''
+
+    depth = int(argv[1]) if len(argv) > 1 else 2000
+    width = int(argv[2]) if len(argv) > 2 else 20000
+    # serializeExp es recursivo: un nivel del ast usa dos frames
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * depth + 100))
+
+    compare(f"profundo ({depth} niveles)", deepAst(depth))
+    compare(f"ancho ({width} definiciones)", wideAst(width))
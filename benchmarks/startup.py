@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from sys import argv
+
+from .programs import timed
+
+from src.tables import CACHE_ENV
+
+
+def run(env: dict) -> None:
+    subprocess.run([sys.executable, '-c', 'import src.parser'], env=env, check=True)
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.startup [corridas]
+    '''
+
+    runs = int(argv[1]) if len(argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env[CACHE_ENV] = os.path.join(tmp, 'FlechaParser.lrtab')
+
+        cold = 0
+        for _ in range(runs):
+            if os.path.exists(env[CACHE_ENV]):
+                os.remove(env[CACHE_ENV])
+            _, elapsed = timed(run, env)
+            cold += elapsed
+
+        warm = 0
+        for _ in range(runs):
+            _, elapsed = timed(run, env)
+            warm += elapsed
+
+    print(f"runs: {runs}")
+    print(f"cold (genera tablas): {cold / runs * 1000:.1f}ms")
+    print(f"warm (lee cache):     {warm / runs * 1000:.1f}ms ({cold / warm:.1f}x)")
@@ -0,0 +1,61 @@
+import json
+import os
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.instructions import Jump
+from src.pipeline import parseSource
+from src.serializer import FlechaSerializer
+
+from .programs import timed
+from .tailcalls import MAMARRACHO, run
+
+
+# count funciones que imprimen cada una su string de length caracteres en
+# un bucle de iterations vueltas
+def stringProgram(count: int, length: int, iterations: int) -> str:
+    defs = ["def printS xs = case xs | Nil -> 0 | Cons c cs -> (unsafePrintChar c; printS cs)\n"]
+    for i in range(count):
+        text = (f"mensaje {i} " * length)[:length]
+        defs.append(f"def s{i} n = if n == 0 then 0 else (printS \"{text}\\n\"; s{i} (n - 1))\n")
+    calls = "; ".join(f"s{i} {iterations}" for i in range(count))
+    defs.append(f"def main = ({calls})\n")
+    return "".join(defs)
+
+
+# el json expande cada string a la cadena de Cons, asi que leerlo de vuelta
+# da el ast que se compilaba antes del nodo de string
+def consChains(ast):
+    return json.loads(FlechaSerializer().serializeProgram(ast))
+
+
+# instrucciones de la seccion de datos, que corre una sola vez, y del resto
+def sections(program):
+    code = program.instructions
+    start = next(index for index, ins in enumerate(code) if isinstance(ins, Jump))
+    return start, len(code) - start
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.strings [strings] [largo] [iteraciones]
+
+    si esta ./mamarracho.bin corre los dos programas
+    '''
+
+    count = int(argv[1]) if len(argv) > 1 else 200
+    length = int(argv[2]) if len(argv) > 2 else 60
+    iterations = int(argv[3]) if len(argv) > 3 else 100
+    ast = parseSource(stringProgram(count, length, iterations))
+    runnable = os.path.exists(MAMARRACHO)
+    if not runnable:
+        print(f"no se encontro {MAMARRACHO}, solo se cuentan las instrucciones")
+    for name, strings in [("cadenas de Cons", consChains(ast)), ("nodo de string", ast)]:
+        program, seconds = timed(FlechaCompiler().compileExpressions, strings)
+        data, code = sections(program)
+        line = f"{name:>16}: {data} instrucciones de datos, {code} de codigo, compilado en {seconds:.2f}s"
+        if runnable:
+            output, seconds = timed(run, program)
+            line += f", corrida {seconds:.2f}s"
+        print(line)
@@ -0,0 +1,72 @@
+import os
+import subprocess
+from sys import argv
+from tempfile import NamedTemporaryFile
+
+from src.compiler import FlechaCompiler
+from src.instructions import ICall, Jump, Label
+from src.pipeline import parseSource
+
+from .programs import execute, timed
+
+MAMARRACHO = "./mamarracho.bin"
+
+# bucles recursivos de cola: uno con acumulador, dos funciones mutuamente
+# recursivas y uno que recorre una lista por un case
+LOOPS = {
+    "acumulador": "def sumTo n acc = if n == 0 then acc else sumTo (n - 1) (acc + 1)\n"
+                  "def main = unsafePrintInt (sumTo {n} 0)\n",
+    "mutua": "def even n = if n == 0 then 1 else odd (n - 1)\n"
+             "def odd n = if n == 0 then 0 else even (n - 1)\n"
+             "def main = unsafePrintInt (even {n})\n",
+    "case": "def count n xs = case n == 0\n"
+            "  | True -> xs\n"
+            "  | False -> count (n - 1) (Cons n Nil)\n"
+            "def main = unsafePrintInt (case count {n} Nil | Nil -> 0 | Cons x xs -> x)\n",
+}
+
+
+# saltos a etiquetas de rutinas (llamadas de cola) y llamadas indirectas
+def callSites(program):
+    routines = {ins.label for ins in program if isinstance(ins, Label) and program.label(ins.label).startswith(("rtn_", "DIRECTO_"))}
+    jumps = sum(1 for ins in program if isinstance(ins, Jump) and ins.label in routines)
+    icalls = sum(1 for ins in program if isinstance(ins, ICall))
+    return jumps, icalls
+
+
+def run(program):
+    with NamedTemporaryFile("w", suffix=".mam", delete=False) as output:
+        program.write(output)
+    try:
+        result = subprocess.run([MAMARRACHO, output.name], capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else f"error {result.returncode}"
+    finally:
+        os.unlink(output.name)
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.tailcalls [iteraciones]
+
+    corre cada bucle con y sin llamadas de cola en ./mamarracho.bin o, si no
+    esta, en la maquina de src.vm, que informa la profundidad de la pila
+    '''
+
+    runnable = os.path.exists(MAMARRACHO)
+    iterations = int(argv[1]) if len(argv) > 1 else 1000000 if runnable else 100000
+    if not runnable:
+        print(f"no se encontro {MAMARRACHO}, se corre en src.vm")
+    for name, source in LOOPS.items():
+        ast = parseSource(source.format(n=iterations))
+        for tailCalls in [False, True]:
+            program = FlechaCompiler(tailCalls=tailCalls).compileExpressions(ast)
+            jumps, icalls = callSites(program)
+            line = f"{name:>10} {'con' if tailCalls else 'sin'} cola: {jumps} saltos, {icalls} icall"
+            if runnable:
+                output, seconds = timed(run, program)
+                line += f"  -> {output} en {seconds:.2f}s"
+            else:
+                (output, vm), seconds = timed(execute, program)
+                line += f"  -> {output} en {seconds:.2f}s, pila {vm.maxDepth}"
+            print(line)
@@ -0,0 +1,44 @@
+from io import StringIO
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.pipeline import parseSource
+from src.threaded import ThreadedVM
+
+from .astopt import corpus
+from .programs import execute, timed
+
+
+def run(vm: ThreadedVM) -> str:
+    vm.run()
+    return vm.sink.getvalue()
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.threaded [-O2]
+
+    corre el corpus de test_codegen_v2 (o los programas de los otros
+    benchmarks) en el interprete de src.vm y traducido a funciones de
+    python con src.threaded, verificando que impriman lo mismo
+    '''
+
+    level = int(argv[1][2:]) if len(argv) > 1 else 0
+    interpreted = 0
+    translated = 0
+    executed = 0
+    for name, source in corpus():
+        program = FlechaCompiler(optimize=level).compileExpressions(parseSource(source))
+        (expected, vm), seconds = timed(execute, program)
+        threaded, translation = timed(ThreadedVM, program, StringIO())
+        output, runSeconds = timed(run, threaded)
+        if output != expected:
+            raise Exception(f"{name}: la salida traducida no coincide con la del interprete")
+        interpreted += seconds
+        translated += translation
+        executed += runSeconds
+        print(f"{name}: interprete {seconds:.3f}s, traducido {runSeconds:.3f}s ({seconds / runSeconds:.1f}x) "
+              f"mas {translation * 1000:.1f}ms de traduccion, {vm.steps} instrucciones en {threaded.pieces} funciones")
+    print(f"total: interprete {interpreted:.2f}s, traducido {executed:.2f}s ({interpreted / executed:.1f}x) "
+          f"mas {translated:.2f}s de traduccion")
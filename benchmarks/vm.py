@@ -0,0 +1,33 @@
+from sys import argv
+
+from src.compiler import FlechaCompiler
+from src.instructions import readProgram
+from src.pipeline import parseSource
+
+from .astopt import corpus
+from .programs import execute, timed
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m benchmarks.vm [-O2]
+
+    corre el corpus de test_codegen_v2 (o los programas de los otros
+    benchmarks) en la maquina de src.vm, leyendo cada programa del texto
+    .mam como haria test_compiler.sh
+    '''
+
+    level = int(argv[1][2:]) if len(argv) > 1 else 0
+    steps = 0
+    total = 0
+    for name, source in corpus():
+        program = FlechaCompiler(optimize=level).compileExpressions(parseSource(source))
+        text = list(program.lines())
+        program, readSeconds = timed(readProgram, text)
+        (output, vm), seconds = timed(execute, program)
+        steps += vm.steps
+        total += seconds
+        print(f"{name}: {vm.steps} instrucciones en {seconds:.3f}s (lectura {readSeconds * 1000:.1f}ms), "
+              f"{vm.calls} llamadas, {vm.allocations} allocs, pila {vm.maxDepth}")
+    print(f"total: {steps} instrucciones en {total:.2f}s, {steps / total / 1e6:.2f}M instrucciones por segundo")
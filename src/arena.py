@@ -0,0 +1,276 @@
+from array import array
+from collections.abc import Sequence
+from typing import List, Optional
+
+from .util import parseString
+
+# tipos de nodo
+DEF = 0
+NUMBER = 1
+CHAR = 2
+VAR = 3
+CONSTRUCTOR = 4
+APPLY = 5
+CASE = 6
+BRANCH = 7
+LAMBDA = 8
+LET = 9
+STRING = 10
+
+KIND_NAMES = ["Def", "ExprNumber", "ExprChar", "ExprVar", "ExprConstructor", "ExprApply", "ExprCase", "CaseBranch", "ExprLambda", "ExprLet", "ExprString"]
+KIND_IDS = {name: kind for kind, name in enumerate(KIND_NAMES)}
+
+# como se decodifica cada operando: el campo i del nodo esta en la columna i
+INT = 0
+SYM = 1
+NODE = 2
+NODES = 3
+SYMS = 4
+INTS = 5
+
+FIELDS = [
+    (SYM, NODE),            # Def name body
+    (INT,),                 # ExprNumber value
+    (INT,),                 # ExprChar value
+    (SYM,),                 # ExprVar name
+    (SYM,),                 # ExprConstructor name
+    (NODE, NODE),           # ExprApply fun arg
+    (NODE, NODES),          # ExprCase exp branches
+    (SYM, SYMS, NODE),      # CaseBranch constructor params body
+    (SYM, NODE),            # ExprLambda param body
+    (SYM, NODE, NODE),      # ExprLet name value body
+    (INTS,),                # ExprString codes
+]
+
+
+class AstArena:
+    '''
+    Ast compacto: cada nodo es un indice en columnas paralelas respaldadas
+    por array (tipo y hasta tres operandos). Los identificadores se internan
+    en una tabla de simbolos y las listas de largo variable (ramas de un case,
+    parametros de una rama, caracteres de un string) se guardan en la columna lists como
+    [largo, elementos...].
+    '''
+    def __init__(self) -> None:
+        self.kinds = array('B')
+        self.op1 = array('q')
+        self.op2 = array('q')
+        self.op3 = array('q')
+        self.lists = array('q')
+        self.symbols = []
+        self.symbolIds = {}
+        self.roots = array('q')
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def intern(self, name: str) -> int:
+        sym = self.symbolIds.get(name)
+        if sym is None:
+            sym = len(self.symbols)
+            self.symbolIds[name] = sym
+            self.symbols.append(name)
+        return sym
+
+    def node(self, kind: int, op1: int = 0, op2: int = 0, op3: int = 0) -> int:
+        self.kinds.append(kind)
+        self.op1.append(op1)
+        self.op2.append(op2)
+        self.op3.append(op3)
+        return len(self.kinds) - 1
+
+    def list(self, values: List[int]) -> int:
+        offset = len(self.lists)
+        self.lists.append(len(values))
+        self.lists.extend(values)
+        return offset
+
+    def listValues(self, offset: int) -> array:
+        size = self.lists[offset]
+        return self.lists[offset + 1:offset + 1 + size]
+
+    def operand(self, node: int, index: int) -> int:
+        if index == 1:
+            return self.op1[node]
+        elif index == 2:
+            return self.op2[node]
+        return self.op3[node]
+
+    def field(self, node: int, index: int):
+        kind = self.kinds[node]
+        if index == 0:
+            return KIND_NAMES[kind]
+        decoder = FIELDS[kind][index - 1]
+        value = self.operand(node, index)
+        if decoder == INT:
+            return value
+        elif decoder == SYM:
+            return self.symbols[value]
+        elif decoder == NODE:
+            return ArenaNode(self, value)
+        elif decoder == NODES:
+            return [ArenaNode(self, child) for child in self.listValues(value)]
+        elif decoder == INTS:
+            return list(self.listValues(value))
+        return [self.symbols[sym] for sym in self.listValues(value)]
+
+    # arma las listas con una pila: cada entrada es un nodo pendiente y la
+    # lista donde va a quedar su resultado
+    def toList(self, node: int) -> List:
+        result: List = []
+        pending = [(ArenaNode(self, node), result)]
+        while pending:
+            view, target = pending.pop()
+            for value in view:
+                if isinstance(value, ArenaNode):
+                    child: List = []
+                    target.append(child)
+                    pending.append((value, child))
+                elif isinstance(value, list) and value and isinstance(value[0], ArenaNode):
+                    children: List = []
+                    target.append(children)
+                    for branch in value:
+                        child = []
+                        children.append(child)
+                        pending.append((branch, child))
+                else:
+                    target.append(value)
+        return result
+
+    # mismo contrato que ExprProgram.ast: una secuencia de definiciones
+    def ast(self) -> List:
+        return [ArenaNode(self, root) for root in self.roots]
+
+
+class ArenaNode(Sequence):
+    '''
+    Vista de un nodo del arena con la misma forma que el ast de listas
+    (["ExprApply", fun, arg], ...), para que FlechaCompiler y
+    FlechaSerializer lo consuman sin materializarlo.
+    '''
+    __slots__ = ('arena', 'id')
+
+    def __init__(self, arena: AstArena, id: int) -> None:
+        self.arena = arena
+        self.id = id
+
+    def __len__(self) -> int:
+        return len(FIELDS[self.arena.kinds[self.id]]) + 1
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("indice fuera del nodo")
+        return self.arena.field(self.id, index)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ArenaNode):
+            return self.arena is other.arena and self.id == other.id
+        return self.toList() == other
+
+    def __repr__(self) -> str:
+        return repr(self.toList())
+
+    def toList(self) -> List:
+        return self.arena.toList(self.id)
+
+    def key(self):
+        return (id(self.arena), self.id)
+
+
+# construye el arena directamente desde las acciones de FlechaParser, sin
+# nodos intermedios: las expresiones son indices de nodo y los parametros y
+# ramas se acumulan en listas invertidas por la recursion a derecha
+class ArenaBuilder:
+    def __init__(self) -> None:
+        self.arena = AstArena()
+
+    def begin(self) -> None:
+        self.arena = AstArena()
+
+    def empty(self) -> Optional[List]:
+        return None
+
+    def program(self) -> AstArena:
+        return self.arena
+
+    def addDefinition(self, program: AstArena, definition: int) -> AstArena:
+        program.roots.append(definition)
+        return program
+
+    def curry(self, params: Optional[List[int]], exp: int) -> int:
+        for param in params or []:
+            exp = self.arena.node(LAMBDA, param, exp)
+        return exp
+
+    def definition(self, id: str, params: Optional[List[int]], exp: int) -> int:
+        return self.arena.node(DEF, self.arena.intern(id), self.curry(params, exp))
+
+    def params(self, id: str, values: Optional[List[int]]) -> List[int]:
+        values = values if values is not None else []
+        values.append(self.arena.intern(id))
+        return values
+
+    def expr(self, exp: int) -> int:
+        return exp
+
+    def sequence(self, expr1: int, expr2: int) -> int:
+        return self.arena.node(LET, self.arena.intern("_"), expr1, expr2)
+
+    def ifThen(self, condition: int, ramaThen: int, ramaElse: int) -> int:
+        arena = self.arena
+        empty = arena.list([])
+        branches = [
+            arena.node(BRANCH, arena.intern("True"), empty, ramaThen),
+            arena.node(BRANCH, arena.intern("False"), empty, ramaElse),
+        ]
+        return arena.node(CASE, condition, arena.list(branches))
+
+    def case(self, expr1: int, expr2: Optional[List[int]]) -> int:
+        return self.arena.node(CASE, expr1, self.arena.list(list(reversed(expr2 or []))))
+
+    def cases(self, branchCase: int, branchesCase: Optional[List[int]]) -> List[int]:
+        branchesCase = branchesCase if branchesCase is not None else []
+        branchesCase.append(branchCase)
+        return branchesCase
+
+    def caseBranch(self, id: str, params: Optional[List[int]], exp: int) -> int:
+        arena = self.arena
+        return arena.node(BRANCH, arena.intern(id), arena.list(list(reversed(params or []))), exp)
+
+    def let(self, id: str, params: Optional[List[int]], exp1: int, exp2: int) -> int:
+        return self.arena.node(LET, self.arena.intern(id), self.curry(params, exp1), exp2)
+
+    def lambdaExpr(self, params: Optional[List[int]], exp: int) -> int:
+        return self.curry(params, exp)
+
+    def binOp(self, exp1: int, name: str, exp2: int) -> int:
+        return self.apply(self.apply(self.var(name), exp1), exp2)
+
+    def unOp(self, exp: int, name: str) -> int:
+        return self.apply(self.var(name), exp)
+
+    def apply(self, exp1: int, exp2: int) -> int:
+        return self.arena.node(APPLY, exp1, exp2)
+
+    def var(self, id: str) -> int:
+        return self.arena.node(VAR, self.arena.intern(id))
+
+    def cons(self, id: str) -> int:
+        return self.arena.node(CONSTRUCTOR, self.arena.intern(id))
+
+    def char(self, value: str) -> int:
+        return self.arena.node(CHAR, parseString(value)[0])
+
+    def string(self, value: str) -> int:
+        codes = parseString(value)
+        if not codes:
+            return self.cons("Nil")
+        return self.arena.node(STRING, self.arena.list(codes))
+
+    def number(self, value: str) -> int:
+        return self.arena.node(NUMBER, int(value))
+
+    def atomic(self, exp: int) -> int:
+        return exp
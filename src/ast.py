@@ -1,50 +1,66 @@
-from typing import List
+from typing import Iterator, List
 
-from .util import parseString
+from .util import parseString, stringExpr, trampoline
 
+# build arma el ast de listas de cada nodo como un generador que hace yield
+# del build de cada hijo y recibe su resultado, asi ast() recorre el arbol
+# con trampoline sobre una pila explicita y no depende de la profundidad de
+# anidamiento. Los nodos sin hijos devuelven la lista directamente
 class Expr:
     def ast(self) -> List:
+        return trampoline(self.build())
+
+    def build(self) -> Iterator:
         raise "abstract method"
 
     def isEmpty(self) -> bool:
         return False
 
 class ExprProgram(Expr):
-    def __init__(self, program: Expr, definition: Expr) -> None:
-        self.program = program
-        self.definition = definition
+    def __init__(self) -> None:
+        self.definitions = []
 
-    def ast(self) -> List:
-        return self.program.ast() + [self.definition.ast()]
+    def append(self, definition: Expr) -> Expr:
+        self.definitions.append(definition)
+        return self
+
+    def build(self) -> Iterator:
+        definitions = []
+        for definition in self.definitions:
+            definitions.append((yield definition.build()))
+        return definitions
 
 class ExprDefinition(Expr):
     def __init__(self, id: str, params: Expr, exp: Expr) -> None:
         self.id = id
         self.node = ExprLetParams(params, exp)
 
-    def ast(self) -> List:
-        return ["Def", self.id] + [self.node.ast()]
+    def build(self) -> Iterator:
+        return ["Def", self.id, (yield self.node.build())]
 
 class ExprParams(Expr): 
     def __init__(self, id: str = None, values: Expr = None) -> None:
         self.id = id
         self.values = values
 
-    def ast(self) -> List:
+    # la cadena de parametros se recorre con un ciclo
+    def build(self) -> List:
         res = []
-        if self.id:
-            res.append(self.id)
-        res += self.values.ast()
-        return res
+        node = self
+        while isinstance(node, ExprParams):
+            if node.id:
+                res.append(node.id)
+            node = node.values
+        return res + node.build()
 
 class ExprLetParams(Expr):
     def __init__(self, values: Expr, exp: Expr) -> None:
         self.values = values
         self.exp = exp
 
-    def ast(self) -> List:
-        tail = self.exp.ast()
-        for parametro in reversed(self.values.ast()):
+    def build(self) -> Iterator:
+        tail = yield self.exp.build()
+        for parametro in reversed(self.values.build()):
             tail = ["ExprLambda", parametro, tail]
         return tail
 
@@ -53,15 +69,16 @@ class ExprSequence(Expr):
         self.expr1 = expr1
         self.expr2 = expr2
 
-    def ast(self) -> List:
-        return ["ExprLet", "_", self.expr1.ast(), self.expr2.ast()]
+    def build(self) -> Iterator:
+        expr1 = yield self.expr1.build()
+        return ["ExprLet", "_", expr1, (yield self.expr2.build())]
 
 class ExprExpr(Expr):
     def __init__(self, expr: Expr) -> None:
         self.expr = expr
 
-    def ast(self) -> List:
-        return self.expr.ast()
+    def build(self) -> Iterator:
+        return (yield self.expr.build())
 
 class ExprIfThen(Expr):
     def __init__(self, condition: Expr, ramaThen: Expr, ramaElse: Expr) -> None:
@@ -69,30 +86,36 @@ class ExprIfThen(Expr):
         self.ramaThen = ramaThen
         self.ramaElse = ramaElse
 
-    def ast(self) -> List:
-        ramaThen = ["CaseBranch", "True", [], self.ramaThen.ast()]
-        ramaElse = ["CaseBranch", "False", [], self.ramaElse.ast()]
-        return ['ExprCase', self.condition.ast(), [ramaThen, ramaElse]]
+    def build(self) -> Iterator:
+        condition = yield self.condition.build()
+        ramaThen = ["CaseBranch", "True", [], (yield self.ramaThen.build())]
+        ramaElse = ["CaseBranch", "False", [], (yield self.ramaElse.build())]
+        return ['ExprCase', condition, [ramaThen, ramaElse]]
 
 class ExprCase(Expr):
     def __init__(self, expr1: Expr, expr2: Expr) -> None:
         self.expr1 = expr1
         self.expr2 = expr2
 
-    def ast(self) -> List:
-        return ['ExprCase', self.expr1.ast(), self.expr2.ast()]
+    def build(self) -> Iterator:
+        expr1 = yield self.expr1.build()
+        return ['ExprCase', expr1, (yield self.expr2.build())]
 
 class ExprCases(Expr):
     def __init__(self, branchCase: Expr = None, branchesCase: Expr = None) -> None:
         self.branchCase = branchCase
         self.branchesCase = branchesCase
 
-    def ast(self) -> List:
+    # la cadena de ramas se recorre con un ciclo
+    def build(self) -> Iterator:
         res = []
-        if self.branchCase:
-            res = [self.branchCase.ast()]
-        if self.branchesCase:
-            res += self.branchesCase.ast()
+        node = self
+        while isinstance(node, ExprCases):
+            if node.branchCase:
+                res.append((yield node.branchCase.build()))
+            node = node.branchesCase
+        if node:
+            res += (yield node.build())
         return res
 
 class ExprCaseBranch(Expr):
@@ -101,8 +124,8 @@ class ExprCaseBranch(Expr):
         self.node = ExprParams(values=params)
         self.exp = exp
 
-    def ast(self) -> List:
-        return ["CaseBranch", self.id] + [self.node.ast()] + [self.exp.ast()]
+    def build(self) -> Iterator:
+        return ["CaseBranch", self.id, self.node.build(), (yield self.exp.build())]
 
 class ExprLet(Expr):
     def __init__(self, id: str, params: Expr, exp1: Expr, exp2: Expr) -> None:
@@ -110,103 +133,169 @@ class ExprLet(Expr):
         self.node = ExprLetParams(params, exp1)
         self.exp2 = exp2
 
-    def ast(self) -> List:
-        return ["ExprLet", self.id] + [self.node.ast()] + [self.exp2.ast()]
+    def build(self) -> Iterator:
+        node = yield self.node.build()
+        return ["ExprLet", self.id, node, (yield self.exp2.build())]
 
 class ExprLambda(Expr):
     def __init__(self, params: Expr, exp: Expr) -> None:
         self.node = ExprLetParams(params, exp)
 
-    def ast(self) -> List:
-        return self.node.ast()
+    def build(self) -> Iterator:
+        return (yield self.node.build())
 
 class ExprApply(Expr):
     def __init__(self, exp1: Expr, exp2: Expr = None) -> None:
         self.exp1 = exp1
         self.exp2 = exp2
 
-    def ast(self) -> List:
+    def build(self) -> Iterator:
         res = ['ExprApply']
         if self.exp1 and not self.exp1.isEmpty():
-            res += [self.exp1.ast()]
+            res.append((yield self.exp1.build()))
         if self.exp2 and not self.exp2.isEmpty():
-            res += [self.exp2.ast()]
+            res.append((yield self.exp2.build()))
         return res
 
 class ExprOp(Expr):
     def __init__(self, name: str) -> None:
         self.name = name
 
-    def ast(self) -> List:
+    def build(self) -> List:
         return ["ExprVar", self.name]
 
 class ExprBinOp(Expr):
     def __init__(self, exp1: Expr, op: Expr, exp2: Expr) -> None:
         self.node = ExprApply(ExprApply(op, exp1), exp2)
 
-    def ast(self) -> List:
-        return self.node.ast()
+    def build(self) -> Iterator:
+        return (yield self.node.build())
 
 class ExprUnOp(Expr):
     def __init__(self, exp: Expr, op: Expr) -> None:
         self.node = ExprApply(op, exp)
 
-    def ast(self) -> List:
-        return self.node.ast()
+    def build(self) -> Iterator:
+        return (yield self.node.build())
 
 class ExprVar(Expr):
     def __init__(self, id: str) -> None:
         self.id = id
 
-    def ast(self) -> List:
+    def build(self) -> List:
         return ["ExprVar", self.id]
 
 class ExprCons(Expr):
     def __init__(self, id: str) -> None:
         self.id = id
 
-    def ast(self) -> List:
+    def build(self) -> List:
         return ["ExprConstructor", self.id]
 
 class ExprChar(Expr):
     def __init__(self, value: str) -> None:
         self.value = value
 
-    def ast(self) -> List:
+    def build(self) -> List:
         return ["ExprChar"] + parseString(self.value)
 
 class ExprString(Expr):
     def __init__(self, value: str) -> None:
         self.value = value
 
-    def ast(self) -> List:
-        parsedList = parseString(self.value)
-        tail = ['ExprConstructor', 'Nil']
-        if len(parsedList) > 0:
-            for ordinal in reversed(parsedList):
-                newCons = ['ExprConstructor', 'Cons']
-                newChar = ['ExprChar', ordinal]
-                head = ['ExprApply', newCons, newChar]
-                tail = ['ExprApply', head, tail]
-        return tail
+    # los codigos de los caracteres quedan juntos en un solo nodo; el
+    # serializador json lo expande a la cadena de Cons
+    def build(self) -> List:
+        return stringExpr(parseString(self.value))
 
 class ExprNumber(Expr):
     def __init__(self, value: str) -> None:
         self.value = value
 
-    def ast(self) -> List:
+    def build(self) -> List:
         return ["ExprNumber", int(self.value)]
 
 class ExprAtomic(Expr):
     def __init__(self, exp: Expr) -> None:
         self.exp = exp
 
-    def ast(self) -> List:
-        return self.exp.ast()
+    def build(self) -> Iterator:
+        return (yield self.exp.build())
 
 class ExprEmpty(Expr):
-    def ast(self) -> List:
+    def build(self) -> List:
         return []
 
     def isEmpty(self):
         return True
+
+# construye los nodos Expr a partir de las acciones de FlechaParser
+class ExprBuilder:
+    def begin(self) -> None:
+        pass
+
+    def empty(self) -> Expr:
+        return ExprEmpty()
+
+    def program(self) -> Expr:
+        return ExprProgram()
+
+    def addDefinition(self, program: Expr, definition: Expr) -> Expr:
+        return program.append(definition)
+
+    def definition(self, id: str, params: Expr, exp: Expr) -> Expr:
+        return ExprDefinition(id, params, exp)
+
+    def params(self, id: str, values: Expr) -> Expr:
+        return ExprParams(id, values)
+
+    def expr(self, exp: Expr) -> Expr:
+        return ExprExpr(exp)
+
+    def sequence(self, expr1: Expr, expr2: Expr) -> Expr:
+        return ExprSequence(expr1, expr2)
+
+    def ifThen(self, condition: Expr, ramaThen: Expr, ramaElse: Expr) -> Expr:
+        return ExprIfThen(condition, ramaThen, ramaElse)
+
+    def case(self, expr1: Expr, expr2: Expr) -> Expr:
+        return ExprCase(expr1, expr2)
+
+    def cases(self, branchCase: Expr, branchesCase: Expr) -> Expr:
+        return ExprCases(branchCase, branchesCase)
+
+    def caseBranch(self, id: str, params: Expr, exp: Expr) -> Expr:
+        return ExprCaseBranch(id, params, exp)
+
+    def let(self, id: str, params: Expr, exp1: Expr, exp2: Expr) -> Expr:
+        return ExprLet(id, params, exp1, exp2)
+
+    def lambdaExpr(self, params: Expr, exp: Expr) -> Expr:
+        return ExprLambda(params, exp)
+
+    def binOp(self, exp1: Expr, name: str, exp2: Expr) -> Expr:
+        return ExprBinOp(exp1, ExprOp(name), exp2)
+
+    def unOp(self, exp: Expr, name: str) -> Expr:
+        return ExprUnOp(exp, ExprOp(name))
+
+    def apply(self, exp1: Expr, exp2: Expr) -> Expr:
+        return ExprApply(exp1, exp2)
+
+    def var(self, id: str) -> Expr:
+        return ExprVar(id)
+
+    def cons(self, id: str) -> Expr:
+        return ExprCons(id)
+
+    def char(self, value: str) -> Expr:
+        return ExprChar(value)
+
+    def string(self, value: str) -> Expr:
+        return ExprString(value)
+
+    def number(self, value: str) -> Expr:
+        return ExprNumber(value)
+
+    def atomic(self, exp: Expr) -> Expr:
+        return ExprAtomic(exp)
@@ -0,0 +1,327 @@
+from typing import Dict, Iterator, List, Optional
+
+from .util import isExprApply, isExprConstructor, isExprDef, isExprLambda, isExprString, isExprVar, lambdaChain, stringExpr, trampoline
+
+# cantidad fija de pasadas: cada una aplica las reglas una vez en cada nodo,
+# de abajo hacia arriba, y la siguiente simplifica lo que dejo la anterior
+ROUNDS = 4
+
+# tamaño maximo, en nodos, del cuerpo de una definicion que se expande en
+# cada llamada
+INLINE_BUDGET = 16
+
+ATOMIC = ["ExprNumber", "ExprChar", "ExprConstructor", "ExprVar"]
+
+FOLD_ARITHMETIC = {
+    "ADD": lambda a, b: a + b,
+    "SUB": lambda a, b: a - b,
+    "MUL": lambda a, b: a * b,
+}
+
+FOLD_COMPARISONS = {
+    "EQ": lambda a, b: a == b,
+    "NE": lambda a, b: a != b,
+    "LT": lambda a, b: a < b,
+    "GT": lambda a, b: a > b,
+    "LE": lambda a, b: a <= b,
+    "GE": lambda a, b: a >= b,
+}
+
+
+def spine(exp: List):
+    # un string es Cons aplicado a su primer caracter y al resto
+    if isExprString(exp):
+        return ["ExprConstructor", "Cons"], [["ExprChar", exp[1][0]], stringExpr(exp[1][1:])]
+    args = []
+    while isExprApply(exp):
+        args.append(exp[2])
+        exp = exp[1]
+    args.reverse()
+    return exp, args
+
+
+def size(exp: List) -> int:
+    count = 0
+    pending = [exp]
+    while pending:
+        exp = pending.pop()
+        count += 1
+        expName = exp[0]
+        if expName == "ExprApply":
+            pending += [exp[1], exp[2]]
+        elif expName == "ExprLambda":
+            pending.append(exp[2])
+        elif expName == "ExprLet":
+            pending += [exp[2], exp[3]]
+        elif expName == "ExprCase":
+            count += len(exp[2])
+            pending.append(exp[1])
+            pending += [branch[3] for branch in exp[2]]
+    return count
+
+
+def boolean(value: bool) -> List:
+    return ["ExprConstructor", "True" if value else "False"]
+
+
+class AstOptimizer:
+    '''
+    Simplifica el ast de listas antes de compilarlo: pliega los operadores
+    aplicados a literales, reemplaza las variables ligadas por un let a una
+    variable o a un literal, reduce las lambdas aplicadas directamente, elige
+    la rama de un case sobre un constructor conocido y expande las llamadas
+    a definiciones globales chicas. Los operadores no se pueden tapar porque
+    sus nombres no son identificadores validos de Flecha.
+    '''
+    def __init__(self, rounds: int = ROUNDS, budget: int = INLINE_BUDGET) -> None:
+        self.rounds = rounds
+        self.budget = budget
+        self.lastName = 0
+        self.inlinable: Dict[str, List] = {}
+        self.counters = {
+            "constantes plegadas": 0,
+            "lets reemplazados": 0,
+            "lambdas reducidas": 0,
+            "case conocidos": 0,
+            "llamadas expandidas": 0,
+        }
+
+    def optimize(self, exps: List) -> List:
+        exps = [self.copy(exp) for exp in exps]
+        for _ in range(self.rounds):
+            self.inlinable = self.inlinableDefinitions(exps)
+            exps = [self.simplify(exp, {}) for exp in exps]
+        return exps
+
+    def report(self) -> List[str]:
+        return [f"{name}: {count}" for name, count in self.counters.items()]
+
+    # nombre que no puede aparecer en el programa: los identificadores de
+    # Flecha empiezan con minuscula
+    def freshName(self, name: str) -> str:
+        self.lastName += 1
+        return f"_{name}{self.lastName}"
+
+    # definiciones unicas que son una cadena de lambdas con un cuerpo chico
+    # que no se nombra a si mismo
+    def inlinableDefinitions(self, exps: List) -> Dict[str, List]:
+        counts = {}
+        for exp in exps:
+            if isExprDef(exp):
+                counts[exp[1]] = counts.get(exp[1], 0) + 1
+        inlinable = {}
+        for exp in exps:
+            if not isExprDef(exp) or counts[exp[1]] != 1 or not isExprLambda(exp[2]):
+                continue
+            chain = lambdaChain(exp[2])
+            body = chain[-1][2]
+            if size(body) <= self.budget and not self.occurs(exp[2], exp[1]):
+                inlinable[exp[1]] = chain
+        return inlinable
+
+    def occurs(self, exp: List, name: str) -> bool:
+        pending = [exp]
+        while pending:
+            exp = pending.pop()
+            expName = exp[0]
+            if expName == "ExprVar" and exp[1] == name:
+                return True
+            elif expName == "ExprApply":
+                pending += [exp[1], exp[2]]
+            elif expName == "ExprLambda" and exp[1] != name:
+                pending.append(exp[2])
+            elif expName == "ExprLet":
+                pending += [exp[2], exp[3]] if exp[1] != name else [exp[2]]
+            elif expName == "ExprCase":
+                pending.append(exp[1])
+                pending += [branch[3] for branch in exp[2] if name not in branch[2]]
+        return False
+
+    def copy(self, exp: List) -> List:
+        return self.substitute(exp, None, None)
+
+    # copia de exp con las apariciones libres de name reemplazadas por value,
+    # o None si value es una variable que quedaria capturada por un binder
+    def substitute(self, exp: List, name: Optional[str], value: Optional[List]) -> Optional[List]:
+        return trampoline(self.substituteNode(exp, name, value))
+
+    # cada yield pide la copia de un hijo (ver util.trampoline)
+    def substituteNode(self, exp: List, name: Optional[str], value: Optional[List]) -> Iterator:
+        expName = exp[0]
+        if expName == "ExprVar":
+            return list(value) if exp[1] == name else ["ExprVar", exp[1]]
+        elif expName in ["ExprNumber", "ExprChar", "ExprConstructor", "ExprString"]:
+            return [expName, exp[1]]
+        elif expName == "Def":
+            body = yield self.substituteNode(exp[2], name, value)
+            return None if body is None else ["Def", exp[1], body]
+        elif expName == "ExprApply":
+            fun = yield self.substituteNode(exp[1], name, value)
+            arg = yield self.substituteNode(exp[2], name, value)
+            return None if fun is None or arg is None else ["ExprApply", fun, arg]
+
+        binders = [exp[1]] if expName in ["ExprLambda", "ExprLet"] else []
+        if name in binders:
+            inner, innerValue = None, None
+        elif isExprVar(value) and value[1] in binders:
+            return None
+        else:
+            inner, innerValue = name, value
+        if expName == "ExprLambda":
+            body = yield self.substituteNode(exp[2], inner, innerValue)
+            return None if body is None else ["ExprLambda", exp[1], body]
+        elif expName == "ExprLet":
+            letValue = yield self.substituteNode(exp[2], name, value)
+            body = yield self.substituteNode(exp[3], inner, innerValue)
+            return None if letValue is None or body is None else ["ExprLet", exp[1], letValue, body]
+        elif expName == "ExprCase":
+            scrutinee = yield self.substituteNode(exp[1], name, value)
+            branches = []
+            for branch in exp[2]:
+                branches.append((yield self.substituteBranch(branch, name, value)))
+            if scrutinee is None or None in branches:
+                return None
+            return ["ExprCase", scrutinee, branches]
+        return list(exp)
+
+    def substituteBranch(self, branch: List, name: Optional[str], value: Optional[List]) -> Iterator:
+        params = list(branch[2])
+        if name in params:
+            body = yield self.substituteNode(branch[3], None, None)
+        elif isExprVar(value) and value[1] in params:
+            return None
+        else:
+            body = yield self.substituteNode(branch[3], name, value)
+        return None if body is None else ["CaseBranch", branch[1], params, body]
+
+    # let con nombres nuevos para los parametros: los valores se evaluan en
+    # orden, como los argumentos, y ninguno puede capturar a los anteriores
+    def bindAll(self, params: List[str], values: List[List], body: List) -> List:
+        # si un parametro se repite, el cuerpo ve el ultimo
+        names = []
+        for param in reversed(params):
+            fresh = self.freshName(param)
+            body = self.substitute(body, param, ["ExprVar", fresh])
+            names.append(fresh)
+        names.reverse()
+        for fresh, value in reversed(list(zip(names, values))):
+            body = ["ExprLet", fresh, value, body]
+        return body
+
+    def simplify(self, exp: List, bound: Dict[str, int]) -> List:
+        return trampoline(self.simplifyNode(exp, bound))
+
+    # cada yield pide la version simplificada de un hijo
+    def simplifyNode(self, exp: List, bound: Dict[str, int]) -> Iterator:
+        expName = exp[0]
+        if expName == "Def":
+            return ["Def", exp[1], (yield self.simplifyNode(exp[2], bound))]
+        elif expName == "ExprLambda":
+            return ["ExprLambda", exp[1], (yield self.simplifyScoped(exp[2], bound, [exp[1]]))]
+        elif expName == "ExprLet":
+            return (yield self.simplifyLet(exp, bound))
+        elif expName == "ExprCase":
+            return (yield self.simplifyCase(exp, bound))
+        elif expName == "ExprApply":
+            return (yield self.simplifyApply(exp, bound))
+        return list(exp)
+
+    # bound cuenta cuantos binders tapan cada nombre y se actualiza al
+    # entrar y salir de cada alcance, en lugar de copiarse en cada nodo
+    def simplifyScoped(self, exp: List, bound: Dict[str, int], names: List[str]) -> Iterator:
+        for name in names:
+            bound[name] = bound.get(name, 0) + 1
+        result = yield self.simplifyNode(exp, bound)
+        for name in names:
+            bound[name] -= 1
+            if not bound[name]:
+                del bound[name]
+        return result
+
+    def simplifyLet(self, exp: List, bound: Dict[str, int]) -> Iterator:
+        value = yield self.simplifyNode(exp[2], bound)
+        body = yield self.simplifyScoped(exp[3], bound, [exp[1]])
+        if value[0] in ATOMIC and (not isExprVar(value) or value[1] != exp[1]):
+            replaced = self.substitute(body, exp[1], value)
+            if replaced is not None:
+                self.counters["lets reemplazados"] += 1
+                return replaced
+        return ["ExprLet", exp[1], value, body]
+
+    def simplifyCase(self, exp: List, bound: Dict[str, int]) -> Iterator:
+        scrutinee = yield self.simplifyNode(exp[1], bound)
+        head, args = spine(scrutinee)
+        if isExprConstructor(head):
+            for branch in exp[2]:
+                if branch[1] == head[1] and len(branch[2]) == len(args):
+                    self.counters["case conocidos"] += 1
+                    body = yield self.simplifyScoped(branch[3], bound, branch[2])
+                    return self.bindAll(list(branch[2]), args, body)
+        branches = []
+        for branch in exp[2]:
+            body = yield self.simplifyScoped(branch[3], bound, branch[2])
+            branches.append(["CaseBranch", branch[1], list(branch[2]), body])
+        return ["ExprCase", scrutinee, branches]
+
+    def simplifyApply(self, exp: List, bound: Dict[str, int]) -> Iterator:
+        fun = yield self.simplifyNode(exp[1], bound)
+        arg = yield self.simplifyNode(exp[2], bound)
+        folded = self.fold(fun, arg)
+        if folded is not None:
+            self.counters["constantes plegadas"] += 1
+            return folded
+        if isExprLambda(fun):
+            self.counters["lambdas reducidas"] += 1
+            return ["ExprLet", fun[1], arg, fun[2]]
+        inlined = self.inline(["ExprApply", fun, arg], bound)
+        if inlined is not None:
+            self.counters["llamadas expandidas"] += 1
+            return inlined
+        return ["ExprApply", fun, arg]
+
+    def fold(self, fun: List, arg: List) -> Optional[List]:
+        if isExprVar(fun):
+            if fun[1] == "UMINUS" and arg[0] == "ExprNumber":
+                return ["ExprNumber", -arg[1]]
+            if fun[1] == "NOT" and isExprConstructor(arg) and arg[1] in ["True", "False"]:
+                return boolean(arg[1] == "False")
+            return None
+        if not isExprApply(fun) or not isExprVar(fun[1]):
+            return None
+        op = fun[1][1]
+        left = fun[2]
+        if op in ["AND", "OR"] and isExprConstructor(left) and left[1] in ["True", "False"]:
+            # True && e = e, False && e = False, True || e = True, False || e = e
+            decides = left[1] == ("False" if op == "AND" else "True")
+            return left if decides else arg
+        if left[0] != arg[0] or left[0] not in ["ExprNumber", "ExprChar"]:
+            return None
+        a, b = left[1], arg[1]
+        if op in FOLD_COMPARISONS:
+            return boolean(FOLD_COMPARISONS[op](a, b))
+        if left[0] != "ExprNumber":
+            return None
+        if op in FOLD_ARITHMETIC:
+            return ["ExprNumber", FOLD_ARITHMETIC[op](a, b)]
+        # la division de Mamarracho trunca: solo se pliega sin negativos
+        if op in ["DIV", "MOD"] and a >= 0 and b > 0:
+            return ["ExprNumber", a // b if op == "DIV" else a % b]
+        return None
+
+    # llamada con al menos todos los argumentos a una definicion chica cuyo
+    # cuerpo no nombra nada que este tapado en este punto
+    def inline(self, exp: List, bound: Dict[str, int]) -> Optional[List]:
+        head, args = spine(exp)
+        if not isExprVar(head) or head[1] in bound or head[1] not in self.inlinable:
+            return None
+        chain = self.inlinable[head[1]]
+        if len(args) < len(chain):
+            return None
+        params = [lambdaExp[1] for lambdaExp in chain]
+        body = chain[-1][2]
+        if any(self.occurs(body, name) for name in bound if name not in params):
+            return None
+        result = self.bindAll(params, args[:len(chain)], self.copy(body))
+        for extra in args[len(chain):]:
+            result = ["ExprApply", result, extra]
+        return result
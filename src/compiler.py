@@ -1,12 +1,20 @@
 import json
 import traceback
 
-from sys import argv
-from typing import List, Set
+from sys import argv, stdout
+from typing import Iterator, List, Optional, Set
 
+from .astopt import AstOptimizer
+from .emitter import CodeBuffer
 from .env import Binding, Env
-from .instructions import Alloc, Comment, ICall, Instruction, Jump, JumpEq, Load, MovInt, MovLabel, MovReg, Print, PrintChar, Return, Store
-from .util import isExprConstructor, isExprDef, isExprLambda, isExprVar, getExprConstructor
+from .freevars import FreeVarsAnalysis
+from .instructions import ARG, FUN, RES, Add, Alloc, Call, Comment, Div, ICall, Instruction, Jump, JumpEq, JumpLt, Load, MamProgram, Mod, MovInt, MovLabel, MovReg, Mul, Names, Print, PrintChar, Return, Store, Sub, globalNames
+from .peephole import PeepholeOptimizer
+from .reachability import ReachableDefinitions
+from .regalloc import RegisterAllocator
+from .reader import FlechaBinaryReader, isBinaryAst
+from .serializer import BINARY_MAGIC
+from .util import isExprApply, isExprConstructor, isExprDef, isExprLambda, isExprVar, getExprConstructor, lambdaChain, nodeKey, trampoline
 
 class Tag:
     def __init__(self, tag: int, size: int = 1) -> None:
@@ -16,8 +24,37 @@ class Tag:
     def __repr__(self) -> str:
         return str(self.tag)
 
+# cantidad de ramas de un case hasta la que conviene comparar una por una
+LINEAR_CASE = 3
+
+# cantidad maxima de variables capturadas de una lambda que se levanta a
+# parametros extra
+LIFT_LIMIT = 4
+
+# expresiones que se evaluan sin efectos y sin llamar a nada
+ATOMIC = ["ExprNumber", "ExprChar", "ExprVar", "ExprConstructor", "ExprString"]
+
+ARITHMETIC = {
+    "ADD": Add,
+    "SUB": Sub,
+    "MUL": Mul,
+    "DIV": Div,
+    "MOD": Mod,
+}
+
+# comparacion: (salto, si se invierten los operandos, si el salto va al
+# resultado False)
+COMPARISONS = {
+    "EQ": (JumpEq, False, False),
+    "NE": (JumpEq, False, True),
+    "LT": (JumpLt, False, False),
+    "GT": (JumpLt, True, False),
+    "LE": (JumpLt, True, True),
+    "GE": (JumpLt, False, True),
+}
+
 class FlechaCompiler:
-    def __init__(self) -> None:
+    def __init__(self, allocateRegisters: bool = True, optimize: int = 0, staticConstants: bool = True, binaryCase: bool = True, tailCalls: bool = True, directCalls: bool = True, pruneDefinitions: bool = True) -> None:
         self.tags = {
             "Num": Tag(1, 2),
             "Char": Tag(2, 2),
@@ -30,13 +67,44 @@ class FlechaCompiler:
         self.lastId = 7
         self.lastRoutine = 0
         self.lastLabel = 0
-        self.lambdas = []
+        self.code = CodeBuffer()
+        self.labels = Names()
+        self.globals = globalNames()
+        self.freeVars = {}
+        self.staticConstants = staticConstants
+        self.binaryCase = binaryCase
+        self.tailCalls = tailCalls
+        # etiqueta de la rutina de cada lambda y cadena de lambdas de cada
+        # definicion global, para saber a que rutina llama una aplicacion
+        self.routines = {}
+        self.knownFunctions = {}
+        # las definiciones conocidas tambien tienen una entrada directa que
+        # recibe todos los argumentos juntos; la ultima lambda de la cadena
+        # solo pasa los argumentos capturados a esa entrada
+        self.directCalls = directCalls
+        self.innermost = {}
+        self.liftedFunctions = {}
+        self.pruneDefinitions = pruneDefinitions
+        self.reachable = ReachableDefinitions()
+        self.constants = {}
+        self.strings = {}
+        self.allocateRegisters = allocateRegisters
+        self.allocator = RegisterAllocator()
+        self.optimize = optimize
+        self.astOptimizer = AstOptimizer()
+        self.peephole = PeepholeOptimizer(optimize)
 
     def freshLabel(self):
         self.lastLabel += 1
         label = self.lastLabel
         return f"{label}"
 
+    def label(self, name: str) -> int:
+        return self.labels.intern(name)
+
+    def globalRegister(self, name: str) -> int:
+        return -self.globals.intern(name) - 1
+
     def tag(self, name: str, size: int = 1) -> Tag:
         if name not in self.tags:
             self.lastId += 1
@@ -44,339 +112,753 @@ class FlechaCompiler:
         tag = self.tags[name]
         return tag
 
-    def compileDef(self, exp: List, env: Env, _: str) -> List[Instruction]:
+    def compileDef(self, exp: List, env: Env, _: int) -> Iterator:
         name = exp[1]
         defReg = env.get(name).value
         r0 = env.fresh()
-        base = [
-            f"{name}:"
-        ]
+        self.code.label(self.label(name))
         # env.bindRegister(name, r0)
-        expIns = self.compileExpression(exp[2], env, r0)
-        return base + expIns + [MovReg(defReg, r0)]
+        yield self.compileNode(exp[2], env, r0)
+        self.code.emit(MovReg(defReg, r0))
+        if self.directCalls and name in self.knownFunctions:
+            yield self.compileDirectRoutine(name, env)
 
-    def compileTagCharOrNumber(self, tag: Tag, exp: List, env: Env, reg: str) -> List[Instruction]:
-        value = exp[1]
-        slots = tag.size
+    def allocTag(self, tag: Tag, value: Optional[int], env: Env, reg: int) -> None:
         tmp = env.fresh()
         r0 = env.fresh()
-        return [
-            Alloc(r0, slots),
+        self.code.emit(
+            Alloc(r0, tag.size),
             MovInt(tmp, tag.tag),
             Store(r0, 0, tmp),
-            MovInt(tmp, value),
-            Store(r0, 1, tmp),
-            MovReg(reg, r0),
-        ]
+        )
+        if value is not None:
+            self.code.emit(
+                MovInt(tmp, value),
+                Store(r0, 1, tmp),
+            )
+        self.code.emit(MovReg(reg, r0))
+
+    # los literales y los constructores sin argumentos son inmutables: se
+    # construyen una sola vez en la seccion de datos, que corre al empezar el
+    # programa, y despues se leen de un registro global
+    def constant(self, tag: Tag, name: str, value: Optional[int], env: Env) -> int:
+        key = (name, value)
+        if key not in self.constants:
+            suffix = "" if value is None else f"_{value}" if value >= 0 else f"_m{-value}"
+            reg = self.globalRegister(f"@C_{name}{suffix}")
+            previous = self.code.beginData()
+            self.allocTag(tag, value, env, reg)
+            self.code.endData(previous)
+            self.constants[key] = reg
+        return self.constants[key]
+
+    def compileTag(self, tag: Tag, name: str, value: Optional[int], env: Env, reg: int) -> None:
+        if self.staticConstants:
+            self.code.emit(MovReg(reg, self.constant(tag, name, value, env)))
+        else:
+            self.allocTag(tag, value, env, reg)
 
-    def compileNumber(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+    def compileNumber(self, exp: List, env: Env, reg: int) -> None:
         tag = self.tag("Num")
-        return self.compileTagCharOrNumber(tag, exp, env, reg)
+        self.compileTag(tag, "Num", exp[1], env, reg)
 
-    def compileChar(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+    def compileChar(self, exp: List, env: Env, reg: int) -> None:
         tag = self.tag("Char")
-        return self.compileTagCharOrNumber(tag, exp, env, reg)
-
-    def compileConstructor(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+        self.compileTag(tag, "Char", exp[1], env, reg)
+
+    # un string no se puede modificar: con constantes estaticas sus celdas se
+    # construyen una sola vez en la seccion de datos y los strings iguales
+    # comparten la lista. Si no, se construye desde la cola cada vez
+    def compileString(self, exp: List, env: Env, reg: int) -> None:
+        if self.staticConstants:
+            self.code.emit(MovReg(reg, self.staticString(exp[1], env)))
+            return
+        tail = env.fresh()
+        self.compileConstructor(["ExprConstructor", "Nil"], env, tail)
+        self.code.emit(MovReg(reg, self.buildString(exp[1], tail, env)))
+
+    def staticString(self, codes: List[int], env: Env) -> int:
+        key = tuple(codes)
+        if key not in self.strings:
+            reg = self.globalRegister(f"@C_str_{len(self.strings)}")
+            nil = self.constant(self.tag("Nil"), "Nil", None, env)
+            previous = self.code.beginData()
+            self.code.emit(MovReg(reg, self.buildString(codes, nil, env)))
+            self.code.endData(previous)
+            self.strings[key] = reg
+        return self.strings[key]
+
+    # cada celda son cuatro instrucciones: los caracteres se leen de sus
+    # constantes y el tag de Cons queda en un solo registro
+    def buildString(self, codes: List[int], tail: int, env: Env) -> int:
+        charTag = self.tag("Char")
+        consTag = env.fresh()
+        self.code.emit(MovInt(consTag, self.tag("Cons").tag))
+        for code in reversed(codes):
+            if self.staticConstants:
+                char = self.constant(charTag, "Char", code, env)
+            else:
+                char = env.fresh()
+                self.allocTag(charTag, code, env, char)
+            cell = env.fresh()
+            self.code.emit(
+                Alloc(cell, 3),
+                Store(cell, 0, consTag),
+                Store(cell, 1, char),
+                Store(cell, 2, tail),
+            )
+            tail = cell
+        return tail
+
+    def compileConstructor(self, exp: List, env: Env, reg: int) -> None:
         value = exp[1]
-        tmp = env.fresh()
-        r0 = env.fresh()
-        t = self.tag(value)
-        tag = t.tag
-        slots = tag.size
-        return [
-            Alloc(r0, slots),
-            MovInt(tmp, tag),
-            Store(r0, 0, tmp),
-            MovReg(reg, r0),
-        ]
+        tag = self.tag(value)
+        self.compileTag(tag, value, None, env, reg)
 
-    def compileVar(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+    def compileVar(self, exp: List, env: Env, reg: int) -> None:
         name = exp[1]
         if env.isPrimitive(name):
             r1 = env.fresh()
-            ins = [Load(r1, reg, 1)]
+            self.code.emit(Load(r1, reg, 1))
             if name == "unsafePrintChar":
-                ins += [PrintChar(r1)]
+                self.code.emit(PrintChar(r1))
             else:
-                ins += [Print(r1)]
-            return ins
+                self.code.emit(Print(r1))
         else:
             bindingValue = env.get(name)
-            ins = []
             if bindingValue.isRegister():
                 r0 = bindingValue.value
-                ins += [MovReg(reg, r0)]
+                self.code.emit(MovReg(reg, r0))
             else:
                 r0 = bindingValue.value
-                ins += [Load(reg, "@fun", r0 + 2)]
-            return ins
-
-    def compileCase(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+                self.code.emit(Load(reg, env.closure, r0 + 2))
+
+    # salta a la rama del tag en tagReg. Hasta LINEAR_CASE ramas compara una
+    # por una; con mas, busca en forma binaria sobre los tags ordenados. Un
+    # tag que no tiene rama (Flecha no verifica que el case sea exhaustivo)
+    # va siempre a default, la primera rama del case, como cuando se
+    # comparaban todas en orden: la rama default no necesita comparacion
+    def compileDispatch(self, branches: List, tagReg: int, test: int, label: str, default: int) -> None:
+        if not self.binaryCase or len(branches) <= LINEAR_CASE:
+            for tag, branchName in branches:
+                if branchName != default:
+                    self.code.emit(
+                        MovInt(test, tag),
+                        JumpEq(tagReg, test, branchName),
+                    )
+            self.code.emit(Jump(default))
+            return
+        middle = len(branches) // 2
+        lowLabel = self.label(f"MENORES_{self.freshLabel()}_{label}")
+        self.code.emit(
+            MovInt(test, branches[middle][0]),
+            JumpLt(tagReg, test, lowLabel),
+        )
+        self.compileDispatch(branches[middle:], tagReg, test, label, default)
+        self.code.label(lowLabel)
+        self.compileDispatch(branches[:middle], tagReg, test, label, default)
+
+    def compileCase(self, exp: List, env: Env, reg: int, tail: bool = False) -> Iterator:
         val = env.fresh()
         tagReg = env.fresh()
         test = env.fresh()
         label = self.freshLabel()
-        endLabel = f"FIN_CASE_{label}" 
+        endLabel = self.label(f"FIN_CASE_{label}")
 
-        ins = self.compileExpression(exp[1], env, val)
-        ins += [Load(tagReg, val, 0)]
+        yield self.compileNode(exp[1], env, val)
+        self.code.emit(Load(tagReg, val, 0))
+        branches = []
+        # con dos ramas del mismo constructor gana la primera
+        targets = {}
         for id, branch in enumerate(exp[2]):
-            branchName = f"RAMA_{str(id)}_{label}"
-            ins += [
-                MovInt(test, id),
-                JumpEq(tagReg, test, branchName),
-            ]
+            tag = self.tag(branch[1], len(branch[2]) + 1)
+            branchName = self.label(f"RAMA_{str(id)}_{label}")
+            branches.append((tag.tag, branchName))
+            targets.setdefault(tag.tag, branchName)
+        if branches:
+            self.compileDispatch(sorted(targets.items()), tagReg, test, label, branches[0][1])
         for id, branch in enumerate(exp[2]):
-            branchName = f"RAMA_{str(id)}_{label}"
-            ins += [f"{branchName}:"]
-            ins += self.compileCaseBranch(branch, env, val)
-            ins += [Jump(endLabel)]
-        ins += [f"{endLabel}:"]
-        return ins
-
-    def compileCaseBranch(self, exp: List, env: Env, reg: str) -> List[Instruction]:
-        consName = exp[1]
+            self.code.label(branches[id][1])
+            yield self.compileCaseBranch(branch, env, val, reg, tail)
+            self.code.emit(Jump(endLabel))
+        self.code.label(endLabel)
+
+    # liga los parametros de la rama a los campos del constructor (desde el
+    # slot 1, el 0 es el tag) y compila el cuerpo en reg
+    def compileCaseBranch(self, exp: List, env: Env, val: int, reg: int, tail: bool = False) -> Iterator:
+        # la ligadura anterior de cada parametro se guarda una sola vez: con
+        # un parametro repetido (Cons x x) la segunda es la de la rama
         olds: Binding = []
-        regs: str = []
-        ins = []
+        params: str = []
         for id, param in enumerate(exp[2]):
             tmp = env.fresh()
-            regs += [tmp]
-            if env.exists(param):
-                olds += [env.get(param)]
+            if param not in params:
+                params += [param]
+                if env.exists(param):
+                    olds += [env.get(param)]
             env.bindRegister(param, tmp)
-            ins += [Load(tmp, reg, id)]
-        ins += self.compileExpression(exp[3], env, reg)
+            self.code.emit(Load(tmp, val, id + 1))
+        yield self.compileNode(exp[3], env, reg, tail)
+        for param in params:
+            env.unbindRegister(param)
         for old in olds:
-            env.bindRegister(old.name, old.value)
-        return ins
+            env.rebind(old)
 
-    def compileLet(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+    def compileLet(self, exp: List, env: Env, reg: int, tail: bool = False) -> Iterator:
         name = exp[1]
         tmp = env.fresh()
 
-        insE1 = self.compileExpression(exp[2], env, tmp)
-        insE2 = self.compileExpressionWithNewScope(exp[3], env, reg, name, tmp)
-        return insE1 + insE2
-
-    def compileRoutine(self, exp: List, env: Env, name: str) -> List:
+        if self.liftable(exp, env):
+            yield self.compileLiftedLambda(exp, env, tmp)
+        else:
+            yield self.compileNode(exp[2], env, tmp)
+        yield self.compileExpressionWithNewScope(exp[3], env, reg, name, tmp, tail)
+
+    # una lambda ligada por un let con pocas variables capturadas, y que el
+    # cuerpo del let solo usa en llamadas con todos sus argumentos desde la
+    # misma rutina, se compila como una rutina que recibe las variables
+    # capturadas como argumentos extra: no hace falta construir la clausura
+    def liftable(self, exp: List, env: Env) -> bool:
+        if not self.directCalls or not isExprLambda(exp[2]) or env.isPrimitive(exp[1]):
+            return False
+        if len(self.capturedVars(exp[2], env)) > LIFT_LIMIT:
+            return False
+        return self.freeVarsAnalysis.onlyDirectCalls(exp[3], exp[1], len(lambdaChain(exp[2])))
+
+    # reg no se escribe: solo identifica a la funcion en self.liftedFunctions
+    def compileLiftedLambda(self, exp: List, env: Env, reg: int) -> Iterator:
+        chain = lambdaChain(exp[2])
+        freeVars = self.capturedVars(exp[2], env)
+        label = self.label(f"LEVANTADA_{self.freshLabel()}_{exp[1]}")
+        params = freeVars + [lambdaExp[1] for lambdaExp in chain]
+        yield self.compileDirectEntry(label, params, chain[-1][2], env)
+        # los valores capturados se leen ahora, antes de que el cuerpo del
+        # let pueda tapar alguna de esas variables
+        captured = []
+        for freeVar in freeVars:
+            capturedReg = env.fresh()
+            self.compileVar(["ExprVar", freeVar], env, capturedReg)
+            captured.append(capturedReg)
+        self.liftedFunctions[reg] = (label, captured, len(chain))
+
+    # la etiqueta se reparte la primera vez que se pide, que puede ser antes
+    # de compilar la lambda si una llamada de cola salta a ella
+    def routineLabel(self, exp: List) -> int:
+        key = nodeKey(exp)
+        if key not in self.routines:
+            self.routines[key] = self.label(f"rtn_{str(self.lastRoutine)}")
+            self.lastRoutine += 1
+        return self.routines[key]
+
+    def compileRoutine(self, exp: List, env: Env, name: str, freeVars: List[str], label: int) -> Iterator:
         fun = env.fresh()
         arg = env.fresh()
         res = env.fresh()
-        label = f"rtn_{str(self.lastRoutine)}"
-        self.lastRoutine += 1
 
-        oldBinding = None
-        if env.exists(name):
-            oldBinding = env.get(name)
-        env.bindRegister(name, arg)
-
-        freeVars = self.freeVars(exp, env)
-
-        routine = [
-            f"{label}:",
-            MovReg(fun, "@fun"),
-            MovReg(arg, "@arg"),
-        ]
-        routine += self.compileExpression(exp, env, res)
-        routine += [
-            MovReg("@res", res),
+        routineEnv = env.enclose(fun)
+        for index, freeVar in enumerate(freeVars):
+            routineEnv.bindEnclosed(freeVar, index)
+        routineEnv.bindRegister(name, arg)
+
+        previous = self.code.beginRoutine()
+        self.code.label(label)
+        self.code.emit(
+            MovReg(fun, FUN),
+            MovReg(arg, ARG),
+        )
+        # el cuerpo esta en posicion de cola
+        yield self.compileNode(exp, routineEnv, res, self.tailCalls)
+        self.code.emit(
+            MovReg(RES, res),
             Return(),
-        ]
-        env.unbindRegister(name)
-        if oldBinding:
-            env.bindRegister(oldBinding.name, oldBinding.value)
-
-        return label, routine, freeVars
-
-    def isFree(self, env: Env, var: str):
-        return not env.isGlobal(var) and not env.isPrimitive(var) and not env.exists(var)
-
-    def freeVars(self, exp: List, env: Env) -> List:
-        expName = exp[0]
-        if expName == "ExprVar":
-            var = exp[1]
-            if self.isFree(env, var):
-                return [var]
-            return []
-        elif expName in ["ExprConstructor", "ExprNumber", "ExprChar"]:
-            return []
-        elif expName == "CaseBranch":
-            return []
-        elif expName == "ExprLet":
-            var = exp[1]
-            s1 = self.freeVars(exp[2], env)
-            s2 = self.freeVars(exp[3], env)
-            if self.isFree(env, var):
-                s2 = list(filter(lambda a: a != var, s2))
-            return s1 + s2
-        elif expName == "ExprLambda":
-            var = exp[1]
-            s1 = self.freeVars(exp[2], env)
-            if self.isFree(env, var):
-                s1 = list(filter(lambda a: a != var, s1))
-            return s1
-        elif expName == "ExprApply":
-            s1 = self.freeVars(exp[1], env)
-            s2 = self.freeVars(exp[2], env)
-            return s1 + s2
-        elif expName == "Def":
-            var = exp[1]
-            s1 = self.freeVars(exp[2], env)
-            if self.isFree(env, var):
-                s1 = list(filter(lambda a: a != var, s1))
-            return s1
-        return []
-
-    def compileLambda(self, exp: List, env: Env, reg: str) -> List[Instruction]:
-        name = exp[1]
+        )
+        self.code.endRoutine(previous)
+        env.lastReg = routineEnv.lastReg
+
+        return label
+
+    # variables libres de la lambda (anotadas por FreeVarsAnalysis) que en
+    # este punto estan ligadas localmente y hay que capturar en la clausura
+    def capturedVars(self, exp: List, env: Env) -> List[str]:
+        freeVars = self.freeVars[nodeKey(exp)]
+        return [var for var in freeVars if env.exists(var) and not env.isGlobal(var)]
+
+    # los primeros argumentos de una entrada directa van en @arg_0, @arg_1,
+    # ... y el ultimo en @arg, como en una llamada a una clausura
+    def argumentRegister(self, index: int, arity: int) -> int:
+        if index == arity - 1:
+            return ARG
+        return self.globalRegister(f"@arg_{index}")
+
+    def directLabel(self, name: str) -> int:
+        return self.label(f"DIRECTO_{name}")
+
+    # rutina que recibe todos sus argumentos juntos y ejecuta body sin
+    # clausura: todo lo que no es uno de params es global
+    def compileDirectEntry(self, label: int, params: List[str], body: List, env: Env) -> Iterator:
+        routineEnv = env.enclose(env.fresh())
+        previous = self.code.beginRoutine()
+        self.code.label(label)
+        for index, param in enumerate(params):
+            paramReg = routineEnv.fresh()
+            routineEnv.bindRegister(param, paramReg)
+            self.code.emit(MovReg(paramReg, self.argumentRegister(index, len(params))))
+        res = routineEnv.fresh()
+        yield self.compileNode(body, routineEnv, res, self.tailCalls)
+        self.code.emit(
+            MovReg(RES, res),
+            Return(),
+        )
+        self.code.endRoutine(previous)
+        env.lastReg = routineEnv.lastReg
+
+    # entrada directa de una definicion conocida: el cuerpo de la ultima
+    # lambda de su cadena, sin clausuras intermedias
+    def compileDirectRoutine(self, name: str, env: Env) -> Iterator:
+        chain = self.knownFunctions[name]
+        params = [lambdaExp[1] for lambdaExp in chain]
+        yield self.compileDirectEntry(self.directLabel(name), params, chain[-1][2], env)
+
+    # rutina de la ultima lambda de una definicion conocida: pasa los
+    # parametros anteriores, que la clausura tiene capturados, a la entrada
+    # directa y salta a ella con el argumento que ya esta en @arg
+    def compileCurriedEntry(self, exp: List, env: Env, freeVars: List[str], definition: str) -> int:
+        chain = self.knownFunctions[definition]
+        params = [lambdaExp[1] for lambdaExp in chain[:-1]]
+        fun = env.fresh()
+        label = self.routineLabel(exp)
+        previous = self.code.beginRoutine()
+        self.code.label(label)
+        self.code.emit(MovReg(fun, FUN))
+        for index, freeVar in enumerate(freeVars):
+            # si un parametro se repite vale el de la lambda mas interna
+            position = len(params) - 1 - params[::-1].index(freeVar)
+            tmp = env.fresh()
+            self.code.emit(
+                Load(tmp, fun, index + 2),
+                MovReg(self.argumentRegister(position, len(chain)), tmp),
+            )
+        self.code.emit(Jump(self.directLabel(definition)))
+        self.code.endRoutine(previous)
+        return label
+
+    def allocClosure(self, label: int, freeVars: List[str], env: Env, reg: int) -> None:
         r0 = env.fresh()
         t = env.fresh()
-
-        label, routine, freeVars = self.compileRoutine(exp[2], env, name)
-        self.lambdas += routine
-
         paramSize = len(freeVars)
-        ins = [
+        self.code.emit(
             Alloc(r0, paramSize + 2),
-            MovInt(t, 3),
+            MovInt(t, self.tag("Closure").tag),
             Store(r0, 0, t),
             MovLabel(t, label),
             Store(r0, 1, t),
-        ]
+        )
         for ind, freeVar in enumerate(freeVars):
-            freeVarReg = env.get(freeVar).value
-            ins += [
-                MovReg(t, freeVarReg),
-                Store(r0, ind + 2, t),
-            ]
-
-        return ins + [
-            MovReg(reg, r0),
-        ]
+            self.compileVar(["ExprVar", freeVar], env, t)
+            self.code.emit(Store(r0, ind + 2, t))
 
+        self.code.emit(MovReg(reg, r0))
 
-    def compileApplyCons(self, exp: List, env: Env, reg: str) -> List[Instruction]:
-        paramSize, expCons = getExprConstructor(exp)
-        name = expCons[1]
-        self.tag(name, paramSize)
+    # una lambda cerrada no depende de nada del entorno: su clausura se
+    # construye una sola vez, en la seccion de datos, como las constantes
+    def staticClosure(self, label: int, env: Env) -> int:
+        reg = self.globalRegister(f"@C_{self.labels[label]}")
+        previous = self.code.beginData()
+        self.allocClosure(label, [], env, reg)
+        self.code.endData(previous)
+        return reg
 
-        regs = []
-        for _ in range(paramSize + 1):
-            regs += env.fresh()
-        res = regs[0]
-
-        constructorIns = self.compileExpression(expCons, env, res)
+    def compileLambda(self, exp: List, env: Env, reg: int) -> Iterator:
+        name = exp[1]
+        freeVars = self.capturedVars(exp, env)
+        definition = self.innermost.get(nodeKey(exp)) if self.directCalls else None
+        if definition is not None:
+            label = self.compileCurriedEntry(exp, env, freeVars, definition)
+        else:
+            label = yield self.compileRoutine(exp[2], env, name, freeVars, self.routineLabel(exp))
 
-        instructions = []
-        curr = 1
+        if self.staticConstants and not freeVars:
+            self.code.emit(MovReg(reg, self.staticClosure(label, env)))
+        else:
+            self.allocClosure(label, freeVars, env, reg)
+
+    def compileApplyCons(self, exp: List, env: Env, reg: int) -> Iterator:
+        # una cadena de constructores anidados por el ultimo argumento, con
+        # los demas argumentos atomicos (como la lista de un string), se
+        # construye desde la cola: evaluar un atomo no tiene efectos y asi
+        # queda viva una sola celda a la vez en lugar de toda la cadena
+        chain = [exp]
+        while True:
+            args = self.constructorArgs(chain[-1])
+            if not args or not all(arg[0] in ATOMIC for arg in args[:-1]):
+                break
+            if not isExprApply(args[-1]) or not isExprConstructor(args[-1]):
+                break
+            chain.append(args[-1])
+        if len(chain) > 1:
+            tail = env.fresh()
+            yield self.compileApplyCell(chain[-1], self.constructorArgs(chain[-1]), env, tail)
+            for cell in reversed(chain[:-1]):
+                res = env.fresh()
+                args = self.constructorArgs(cell)
+                yield self.compileApplyCell(cell, args[:-1], env, res)
+                self.code.emit(Store(res, len(args), tail))
+                tail = res
+            self.code.emit(MovReg(reg, tail))
+            return
+        yield self.compileApplyCell(exp, self.constructorArgs(exp), env, reg)
+
+    # los argumentos estan en la espina izquierda, del ultimo al primero
+    def constructorArgs(self, exp: List) -> List:
+        paramSize, _ = getExprConstructor(exp)
+        args = []
         currExp = exp
-        while curr < paramSize:
-            instruction = self.compileExpression(currExp[2], env, regs[curr])
-            instructions = instruction + instructions
+        while len(args) < paramSize:
+            args.append(currExp[2])
             currExp = currExp[1]
-            curr += 1
-        instructions += constructorIns
+        args.reverse()
+        return args
 
-        curr = 0
-        while curr < paramSize:
-            instructions += [Store(res, curr, regs[curr])]
-            curr += 1
-
-        return instructions
+    # reserva la celda de un constructor y guarda los primeros argumentos;
+    # si faltan, el que llama guarda los que siguen
+    def compileApplyCell(self, exp: List, args: List, env: Env, reg: int) -> Iterator:
+        paramSize, expCons = getExprConstructor(exp)
+        name = expCons[1]
+        tag = self.tag(name, paramSize + 1)
 
-    def compileLambdaCalls(self, exp, env, fun, arg, res):
+        # la celda se reserva antes y cada argumento se guarda apenas se
+        # evalua, asi no quedan vivos todos los argumentos a la vez
+        res = env.fresh()
+        tmp = env.fresh()
+        self.code.emit(
+            Alloc(res, paramSize + 1),
+            MovInt(tmp, tag.tag),
+            Store(res, 0, tmp),
+        )
+        for index, arg in enumerate(args):
+            argReg = env.fresh()
+            yield self.compileNode(arg, env, argReg)
+            self.code.emit(Store(res, index + 1, argReg))
+        self.code.emit(MovReg(reg, res))
+
+    def compileLambdaCalls(self, exp, env, fun, arg, res) -> None:
         tmp = env.fresh()
-        calls = [
+        self.code.emit(
             Load(tmp, fun, 1),
-            MovReg("@fun", fun),
-            MovReg("@arg", arg),
+            MovReg(FUN, fun),
+            MovReg(ARG, arg),
             ICall(tmp),
-            MovReg(res, "@res"),
-        ]
-        return calls
+            MovReg(res, RES),
+        )
+
+    # valor entero de un Num o un Char ya evaluado en reg
+    def unbox(self, reg: int, env: Env) -> int:
+        value = env.fresh()
+        self.code.emit(Load(value, reg, 1))
+        return value
+
+    def boxNumber(self, value: int, env: Env, reg: int) -> None:
+        r0 = env.fresh()
+        tmp = env.fresh()
+        self.code.emit(
+            Alloc(r0, 2),
+            MovInt(tmp, self.tag("Num").tag),
+            Store(r0, 0, tmp),
+            Store(r0, 1, value),
+            MovReg(reg, r0),
+        )
+
+    def compileBool(self, name: str, env: Env, reg: int) -> None:
+        self.compileTag(self.tag(name), name, None, env, reg)
+
+    # salta a label si el Bool en reg tiene el tag de name
+    def jumpIfBool(self, reg: int, name: str, label: int, env: Env) -> None:
+        tagReg = env.fresh()
+        test = env.fresh()
+        self.code.emit(
+            Load(tagReg, reg, 0),
+            MovInt(test, self.tag(name).tag),
+            JumpEq(tagReg, test, label),
+        )
+
+    # el Bool que queda en reg depende de si se tomo el salto a jumpLabel:
+    # si se salto vale jumpValue y si no el otro
+    def compileBoolResult(self, jumpLabel: int, jumpValue: str, endLabel: int, env: Env, reg: int) -> None:
+        self.compileBool("False" if jumpValue == "True" else "True", env, reg)
+        self.code.emit(Jump(endLabel))
+        self.code.label(jumpLabel)
+        self.compileBool(jumpValue, env, reg)
+        self.code.label(endLabel)
+
+    # aplicacion saturada de un operador: los operandos se desempaquetan, se
+    # opera con una sola instruccion y se empaqueta el resultado, sin
+    # llamar a ninguna clausura. && y || cortocircuitan
+    def compileOperator(self, name: str, args: List, env: Env, reg: int) -> Iterator:
+        label = self.freshLabel()
+        endLabel = self.label(f"FIN_OP_{label}")
+        if name in ["AND", "OR"]:
+            yield self.compileNode(args[0], env, reg)
+            self.jumpIfBool(reg, "False" if name == "AND" else "True", endLabel, env)
+            yield self.compileNode(args[1], env, reg)
+            self.code.label(endLabel)
+            return
+        operands = []
+        for arg in args:
+            argReg = env.fresh()
+            yield self.compileNode(arg, env, argReg)
+            operands.append(argReg)
+        if name == "NOT":
+            jumpLabel = self.label(f"SALTO_OP_{label}")
+            self.jumpIfBool(operands[0], "True", jumpLabel, env)
+            self.compileBoolResult(jumpLabel, "False", endLabel, env, reg)
+            return
+        values = [self.unbox(operand, env) for operand in operands]
+        if name == "UMINUS":
+            zero = env.fresh()
+            self.code.emit(MovInt(zero, 0))
+            values = [zero] + values
+            name = "SUB"
+        if name in ARITHMETIC:
+            result = env.fresh()
+            self.code.emit(ARITHMETIC[name](result, values[0], values[1]))
+            self.boxNumber(result, env, reg)
+            return
+        jump, swap, negated = COMPARISONS[name]
+        left, right = reversed(values) if swap else values
+        jumpLabel = self.label(f"SALTO_OP_{label}")
+        self.code.emit(jump(left, right, jumpLabel))
+        self.compileBoolResult(jumpLabel, "False" if negated else "True", endLabel, env, reg)
+
+    # lambda que ejecuta la clausura que resulta de exp, si se sabe
+    # estaticamente: exp es una definicion global de la que solo hay una
+    # (y no esta tapada por una variable local) aplicada a menos argumentos
+    # que los parametros de su cadena de lambdas
+    def knownRoutine(self, exp: List, env: Env) -> Optional[List]:
+        depth = 0
+        while isExprApply(exp):
+            exp = exp[1]
+            depth += 1
+        if not isExprVar(exp) or exp[1] not in self.knownFunctions:
+            return None
+        name = exp[1]
+        if env.get(name).value != self.globalRegister(f"@G_{name}"):
+            return None
+        chain = self.knownFunctions[name]
+        return chain[depth] if depth < len(chain) else None
+
+    # funcion levantada por compileLiftedLambda aplicada en exp
+    def liftedCall(self, exp: List, env: Env) -> Optional[tuple]:
+        depth = 0
+        while isExprApply(exp):
+            exp = exp[1]
+            depth += 1
+        if not isExprVar(exp) or not env.exists(exp[1]):
+            return None
+        binding = env.get(exp[1])
+        if not binding.isRegister() or binding.value not in self.liftedFunctions:
+            return None
+        lifted = self.liftedFunctions[binding.value]
+        return lifted if depth == lifted[2] else None
+
+    # definicion conocida aplicada a exactamente tantos argumentos como
+    # parametros tiene: se llama a su entrada directa
+    def knownCall(self, exp: List, env: Env) -> Optional[str]:
+        if not self.directCalls:
+            return None
+        depth = 0
+        while isExprApply(exp):
+            exp = exp[1]
+            depth += 1
+        if not isExprVar(exp) or exp[1] not in self.knownFunctions:
+            return None
+        name = exp[1]
+        if env.get(name).value != self.globalRegister(f"@G_{name}"):
+            return None
+        return name if depth == len(self.knownFunctions[name]) else None
+
+    # llama a la entrada directa label con los registros de extra seguidos
+    # de los argumentos de la aplicacion exp
+    def compileDirectCall(self, label: int, extra: List[int], arity: int, exp: List, env: Env, reg: int, tail: bool) -> Iterator:
+        args = []
+        while len(args) < arity:
+            args.append(exp[2])
+            exp = exp[1]
+        args.reverse()
+        argRegs = list(extra)
+        for arg in args:
+            argReg = env.fresh()
+            yield self.compileNode(arg, env, argReg)
+            argRegs.append(argReg)
+        for index, argReg in enumerate(argRegs):
+            self.code.emit(MovReg(self.argumentRegister(index, len(argRegs)), argReg))
+        if tail:
+            self.code.emit(Jump(label))
+            return
+        res = env.fresh()
+        self.code.emit(
+            Call(label),
+            MovReg(res, RES),
+            MovReg(reg, res),
+        )
 
-    def compileApply(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+    def compileApply(self, exp: List, env: Env, reg: int, tail: bool = False) -> Iterator:
         if isExprConstructor(exp[1]):
-            ins = self.compileApplyCons(exp, env, reg)
-        elif isExprVar(exp[1]):
-            insExp1 = self.compileVar(exp[1], env, reg)
-            insExp2 = self.compileExpression(exp[2], env, reg)
-            ins = insExp2 + insExp1
+            yield self.compileApplyCons(exp, env, reg)
+        elif isExprApply(exp[1]) and isExprVar(exp[1][1]) and env.isBinaryOperator(exp[1][1][1]):
+            yield self.compileOperator(exp[1][1][1], [exp[1][2], exp[2]], env, reg)
+        elif isExprVar(exp[1]) and env.isUnaryOperator(exp[1][1]):
+            yield self.compileOperator(exp[1][1], [exp[2]], env, reg)
+        elif isExprVar(exp[1]) and env.isPrimitive(exp[1][1]):
+            yield self.compileNode(exp[2], env, reg)
+            self.compileVar(exp[1], env, reg)
+        elif self.liftedCall(exp, env) is not None:
+            label, captured, arity = self.liftedCall(exp, env)
+            yield self.compileDirectCall(label, captured, arity, exp, env, reg, tail)
+        elif self.knownCall(exp, env) is not None:
+            name = self.knownCall(exp, env)
+            arity = len(self.knownFunctions[name])
+            yield self.compileDirectCall(self.directLabel(name), [], arity, exp, env, reg, tail)
         else:
             fun = env.fresh()
             arg = env.fresh()
             res = env.fresh()
-            ins = []
-            lambdaIns = self.compileExpression(exp[1], env, fun)
-            calls = self.compileLambdaCalls(exp[1], env, fun, arg, res)
-            argIns = self.compileExpression(exp[2], env, arg)
-            ins = lambdaIns + argIns + calls + [MovReg(reg, res)]
-        return ins
+            yield self.compileNode(exp[1], env, fun)
+            yield self.compileNode(exp[2], env, arg)
+            target = self.knownRoutine(exp[1], env) if tail else None
+            if target is not None:
+                # llamada de cola a una rutina conocida: la rutina llamada
+                # reusa el marco actual y su return vuelve directo a quien
+                # llamo a esta, asi la pila no crece
+                self.code.emit(
+                    MovReg(FUN, fun),
+                    MovReg(ARG, arg),
+                    Jump(self.routineLabel(target)),
+                )
+                return
+            self.compileLambdaCalls(exp[1], env, fun, arg, res)
+            self.code.emit(MovReg(reg, res))
 
     # agrega nueva var a scope guardando la anterior si existiera
-    def compileExpressionWithNewScope(self, exp: List, env: Env, reg: str, newName: str, newReg: str) -> List[Instruction]:
+    def compileExpressionWithNewScope(self, exp: List, env: Env, reg: int, newName: str, newReg: int, tail: bool = False) -> Iterator:
         oldBinding = None
         if env.exists(newName):
             oldBinding = env.get(newName)
         env.bindRegister(newName, newReg)
 
-        expBody = self.compileExpression(exp, env, reg)
+        yield self.compileNode(exp, env, reg, tail)
 
         env.unbindRegister(newName)
         if oldBinding:
-            env.bindRegister(oldBinding.name, oldBinding.value)
-        return expBody
-
-    def compileExpression(self, exp: List, env: Env, reg: str) -> List[Instruction]:
+            env.rebind(oldBinding)
+
+    # cada compile* emite sus instrucciones en self.code en lugar de
+    # devolverlas, asi el costo es lineal en el tamaño del codigo generado.
+    # tail indica que el valor de exp es el resultado de la rutina actual.
+    # Los compile* de nodos con hijos son generadores que hacen yield de
+    # compileNode para cada hijo: trampoline los corre sobre una pila
+    # explicita, asi la profundidad del ast no esta limitada por la pila de
+    # Python
+    def compileExpression(self, exp: List, env: Env, reg: int, tail: bool = False) -> None:
+        trampoline(self.compileNode(exp, env, reg, tail))
+
+    # compila las hojas en el momento y devuelve el generador de los demas
+    def compileNode(self, exp: List, env: Env, reg: int, tail: bool = False) -> Optional[Iterator]:
         expName = exp[0]
         if expName == "Def":
             return self.compileDef(exp, env, reg)
         elif expName == "ExprVar":
-            return self.compileVar(exp, env, reg)
+            self.compileVar(exp, env, reg)
         elif expName == "ExprConstructor":
-            return self.compileConstructor(exp, env, reg)
+            self.compileConstructor(exp, env, reg)
         elif expName == "ExprNumber":
-            return self.compileNumber(exp, env, reg)
+            self.compileNumber(exp, env, reg)
         elif expName == "ExprChar":
-            return self.compileChar(exp, env, reg)
+            self.compileChar(exp, env, reg)
+        elif expName == "ExprString":
+            self.compileString(exp, env, reg)
         elif expName == "ExprCase":
-            return self.compileCase(exp, env, reg)
-        elif expName == "CaseBranch":
-            return self.compileCaseBranch(exp, env, reg)
+            return self.compileCase(exp, env, reg, tail)
         elif expName == "ExprLet":
-            return self.compileLet(exp, env, reg)
+            return self.compileLet(exp, env, reg, tail)
         elif expName == "ExprLambda":
             return self.compileLambda(exp, env, reg)
         elif expName == "ExprApply":
-            return self.compileApply(exp, env, reg)
+            return self.compileApply(exp, env, reg, tail)
+        return None
 
     def registerDefinitions(self, exps: List, env: Env) -> None:
         firstDefinition = None
+        counts = {}
         for exp in exps:
             if isExprDef(exp):
                 definition = exp[1]
-                reg = f"@G_{definition}"
+                reg = self.globalRegister(f"@G_{definition}")
                 env.bindRegister(definition, reg)
                 if not firstDefinition:
                     firstDefinition = definition
+                counts[definition] = counts.get(definition, 0) + 1
+        # una definicion repetida cambia de valor mientras corre el programa
+        self.knownFunctions = {}
+        self.innermost = {}
+        for exp in exps:
+            if isExprDef(exp) and counts[exp[1]] == 1 and isExprLambda(exp[2]):
+                chain = lambdaChain(exp[2])
+                self.knownFunctions[exp[1]] = chain
+                self.innermost[nodeKey(chain[-1])] = exp[1]
         return firstDefinition
 
-    def compileExpressions(self, exps: List) -> List[Instruction]:
-        instructions = []
+    def compileExpressions(self, exps: List) -> MamProgram:
+        self.code = CodeBuffer()
+        self.labels = Names()
+        self.globals = globalNames()
+        self.constants = {}
+        self.strings = {}
+        self.routines = {}
+        self.lastRoutine = 0
         env = Env()
-        reg = "$main"
+        reg = 0
+        if self.optimize > 0:
+            exps = self.astOptimizer.optimize(exps)
+        if self.pruneDefinitions:
+            exps = self.reachable.prune(exps)
         firstDefinition = self.registerDefinitions(exps, env)
+        self.liftedFunctions = {}
+        self.freeVarsAnalysis = FreeVarsAnalysis()
+        self.freeVars = self.freeVarsAnalysis.analyze(exps)
         for exp in exps:
-            instructions += self.compileExpression(exp, env, reg)
-        header = [Jump(firstDefinition)] + self.lambdas
-        return header + instructions
+            self.compileExpression(exp, env, reg)
+        instructions = self.code.instructions(Jump(self.label(firstDefinition)))
+        program = MamProgram(instructions, self.labels, self.globals)
+        if self.allocateRegisters:
+            program = self.allocator.allocate(program)
+        if self.optimize > 0:
+            program = self.peephole.optimize(program)
+        return program
+
+    def report(self) -> List[str]:
+        lines = self.reachable.report() if self.pruneDefinitions else []
+        if self.allocateRegisters:
+            lines += self.allocator.report()
+        if self.optimize > 0:
+            lines += self.astOptimizer.report()
+            lines += self.peephole.report()
+        return lines
+
+
+# nivel de optimizacion pasado como -O0, -O1 o -O2
+def optimizationLevel(options: List[str]) -> int:
+    level = 0
+    for option in options:
+        if option.startswith('-O'):
+            level = int(option[2:] or 1)
+    return level
 
 if __name__ == '__main__':
 
     '''
-    python -m src.compiler test_codegen_v2/test_codegen/test01.fl.ast
+    python -m src.compiler test_codegen_v2/test_codegen/test01.fl.ast [-O1]
+
+    acepta tanto el ast en json como el binario de src.parser --binary
     '''
 
     try:
@@ -384,14 +866,17 @@ if __name__ == '__main__':
             raise Exception("Pass a filename as argument")
 
         inputFile = argv[1]
-        with open(inputFile, 'r') as inputContent:
-            inputData = inputContent.read()
-
-        compiler = FlechaCompiler()
-        exps = json.loads(inputData)
-        insList = compiler.compileExpressions(exps)
-        for ins in insList:
-            print(ins)
+        with open(inputFile, 'rb') as inputContent:
+            binary = isBinaryAst(inputContent.read(len(BINARY_MAGIC)))
+
+        compiler = FlechaCompiler(optimize=optimizationLevel(argv[2:]))
+        if binary:
+            exps = FlechaBinaryReader.load(inputFile)
+        else:
+            with open(inputFile, 'r') as inputContent:
+                exps = json.loads(inputContent.read())
+        program = compiler.compileExpressions(exps)
+        program.write(stdout)
     except Exception as e:
         print(e)
         print(traceback.format_exc())
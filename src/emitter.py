@@ -0,0 +1,46 @@
+from typing import List
+
+from .instructions import Instruction, Label
+
+
+class CodeBuffer:
+    '''
+    Buffer donde FlechaCompiler emite las instrucciones a medida que recorre
+    el ast, sin construir y concatenar listas intermedias. El codigo de las
+    rutinas de las lambdas se emite en una seccion fuera de linea que va
+    antes del codigo de las definiciones, y el que construye las constantes
+    en una seccion de datos que corre una vez al empezar el programa.
+    '''
+    def __init__(self) -> None:
+        self.data: List[Instruction] = []
+        self.code: List[Instruction] = []
+        self.routines: List[Instruction] = []
+        self.current = self.code
+
+    def emit(self, *instructions: Instruction) -> None:
+        self.current.extend(instructions)
+
+    def label(self, label: int) -> None:
+        self.current.append(Label(label))
+
+    # empieza una rutina: lo que se emita hasta endRoutine va a la seccion
+    # fuera de linea. Las rutinas anidadas quedan antes que la que las contiene
+    def beginRoutine(self) -> List[Instruction]:
+        previous = self.current
+        self.current = []
+        return previous
+
+    def endRoutine(self, previous: List[Instruction]) -> None:
+        self.routines.extend(self.current)
+        self.current = previous
+
+    def beginData(self) -> List[Instruction]:
+        previous = self.current
+        self.current = self.data
+        return previous
+
+    def endData(self, previous: List[Instruction]) -> None:
+        self.current = previous
+
+    def instructions(self, entry: Instruction) -> List[Instruction]:
+        return self.data + [entry] + self.routines + self.code
@@ -1,15 +1,20 @@
 
 from sys import flags
 
+from .instructions import FUN
+
 
 class Binding:
-    def __init__(self, name: str, value: str) -> None:
+    def __init__(self, name: str, value: int) -> None:
         self.name = name
         self.value = value
 
     def isRegister(self) -> bool:
         return False
 
+    def isGlobal(self) -> bool:
+        return False
+
     def __repr__(self) -> str:
         return str(self.value)
 
@@ -17,6 +22,9 @@ class BindingRegister(Binding):
     def isRegister(self) -> bool:
         return True
 
+    def isGlobal(self) -> bool:
+        return self.value < 0
+
 class BindingEnclosed(Binding):
     def __init__(self, name: str, value: int) -> None:
         self.name = name
@@ -26,43 +34,74 @@ class BindingEnclosed(Binding):
         return False
 
 class Env:
-    def __init__(self, elements = {}, globals = []) -> None:
-        self.elements = elements
-        self.globals = globals
+    def __init__(self, elements = None, globals = None, closure: int = FUN) -> None:
+        # no compartir los defaults mutables entre compilaciones
+        self.elements = elements if elements is not None else {}
+        self.globals = globals if globals is not None else {}
+        self.closure = closure
         self.primitives = ['unsafePrintInt', 'unsafePrintChar']
+        # operadores que genera el parser para las expresiones binarias y unarias
+        self.binaryOperators = ['ADD', 'SUB', 'MUL', 'DIV', 'MOD', 'EQ', 'NE', 'LT', 'GT', 'LE', 'GE', 'AND', 'OR']
+        self.unaryOperators = ['UMINUS', 'NOT']
         self.lastReg = 0
 
+    # entorno de una rutina: comparte los registros globales con el entorno
+    # actual; las variables capturadas se leen de la clausura en `closure`
+    def enclose(self, closure: int) -> 'Env':
+        env = Env(None, self.globals, closure)
+        env.lastReg = self.lastReg
+        return env
+
     # BRegister(Reg)
-    def bindRegister(self, var: str, reg: str) -> str:
+    def bindRegister(self, var: str, reg: int) -> Binding:
         binding = BindingRegister(var, reg)
-        self.elements[var] = binding
-        if '@' == var[0]:
-            self.globals += var[0]
+        if binding.isGlobal():
+            self.globals[var] = binding
+        else:
+            self.elements[var] = binding
+        return binding
+
+    # vuelve a ligar una variable sombreada, sea registro o capturada. Si
+    # era global se borra la ligadura local que la sombreaba, que si no
+    # seguiria tapandola
+    def rebind(self, binding: Binding) -> Binding:
+        if binding.isGlobal():
+            self.elements.pop(binding.name, None)
+            self.globals[binding.name] = binding
+        else:
+            self.elements[binding.name] = binding
         return binding
 
     def unbindRegister(self, var: str) -> None:
         del self.elements[var]
 
-    def bindEnclosed(self, var: str, n: int) -> int:
+    def bindEnclosed(self, var: str, n: int) -> Binding:
         binding = BindingEnclosed(var, n)
         self.elements[var] = binding
         return binding
 
     def exists(self, name: str) -> bool:
-        return name in self.elements
+        return name in self.elements or name in self.globals
 
     def get(self, name: str) -> Binding:
-        if self.exists(name):
+        if name in self.elements:
             return self.elements[name]
+        if name in self.globals:
+            return self.globals[name]
         raise Exception(f"No existe {name} en entorno")
 
-    def fresh(self):
+    def fresh(self) -> int:
         self.lastReg += 1
-        reg = self.lastReg
-        return f"$r{reg}"
+        return self.lastReg
 
     def isGlobal(self, var: str) -> bool:
-        return var in self.globals
+        return self.exists(var) and self.get(var).isGlobal()
 
     def isPrimitive(self, var: str) -> bool:
         return var in self.primitives
+
+    def isBinaryOperator(self, var: str) -> bool:
+        return var in self.binaryOperators and not self.exists(var)
+
+    def isUnaryOperator(self, var: str) -> bool:
+        return var in self.unaryOperators and not self.exists(var)
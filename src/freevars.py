@@ -0,0 +1,96 @@
+from typing import Dict, Iterator, List, Tuple
+
+from .util import nodeKey, trampoline
+
+
+class FreeVarsAnalysis:
+    '''
+    Calcula en una sola pasada, de abajo hacia arriba, las variables libres
+    de cada expresion y anota cada ExprLambda con una tupla ordenada y sin
+    repetidos. Los conjuntos ordenados se representan con dicts.
+    '''
+    def __init__(self) -> None:
+        self.lambdas: Dict[object, Tuple[str, ...]] = {}
+
+    def analyze(self, exps: List) -> Dict[object, Tuple[str, ...]]:
+        for exp in exps:
+            self.freeVars(exp)
+        return self.lambdas
+
+    def bind(self, free: Dict[str, None], names) -> Dict[str, None]:
+        for name in names:
+            free.pop(name, None)
+        return free
+
+    def freeVars(self, exp: List) -> Dict[str, None]:
+        return trampoline(self.visit(exp))
+
+    # cada yield pide las variables libres de un hijo (ver util.trampoline)
+    def visit(self, exp: List) -> Iterator:
+        expName = exp[0]
+        if expName == "ExprVar":
+            return {exp[1]: None}
+        elif expName in ["ExprConstructor", "ExprNumber", "ExprChar", "ExprString"]:
+            return {}
+        elif expName == "ExprApply":
+            free = yield self.visit(exp[1])
+            free.update((yield self.visit(exp[2])))
+            return free
+        elif expName == "ExprLet":
+            free = yield self.visit(exp[2])
+            free.update(self.bind((yield self.visit(exp[3])), [exp[1]]))
+            return free
+        elif expName == "ExprCase":
+            free = yield self.visit(exp[1])
+            for branch in exp[2]:
+                free.update((yield self.visit(branch)))
+            return free
+        elif expName == "CaseBranch":
+            return self.bind((yield self.visit(exp[3])), exp[2])
+        elif expName == "ExprLambda":
+            free = self.bind((yield self.visit(exp[2])), [exp[1]])
+            self.lambdas[nodeKey(exp)] = tuple(free)
+            return free
+        elif expName == "Def":
+            return self.bind((yield self.visit(exp[2])), [exp[1]])
+        return {}
+
+    # si todas las apariciones libres de name en exp son llamadas con
+    # exactamente arity argumentos fuera de cualquier lambda
+    def onlyDirectCalls(self, exp: List, name: str, arity: int) -> bool:
+        return trampoline(self.directCalls(exp, name, arity))
+
+    def directCalls(self, exp: List, name: str, arity: int) -> Iterator:
+        expName = exp[0]
+        if expName == "ExprVar":
+            return exp[1] != name
+        elif expName == "ExprApply":
+            args = []
+            head = exp
+            while head[0] == "ExprApply":
+                args.append(head[2])
+                head = head[1]
+            if head[0] == "ExprVar" and head[1] == name:
+                children = args if len(args) == arity else None
+            else:
+                children = [exp[1], exp[2]]
+            if children is None:
+                return False
+            for child in children:
+                if not (yield self.directCalls(child, name, arity)):
+                    return False
+            return True
+        elif expName == "ExprLet":
+            if not (yield self.directCalls(exp[2], name, arity)):
+                return False
+            return exp[1] == name or (yield self.directCalls(exp[3], name, arity))
+        elif expName == "ExprCase":
+            for child in [exp[1]] + list(exp[2]):
+                if not (yield self.directCalls(child, name, arity)):
+                    return False
+            return True
+        elif expName == "CaseBranch":
+            return name in exp[2] or (yield self.directCalls(exp[3], name, arity))
+        elif expName == "ExprLambda":
+            return name not in self.lambdas[nodeKey(exp)]
+        return True
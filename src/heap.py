@@ -0,0 +1,117 @@
+from array import array
+from time import perf_counter
+from typing import List
+
+# palabras de cada semiespacio al empezar y tope por defecto (512MB)
+INITIAL_WORDS = 1 << 16
+MAX_WORDS = 1 << 26
+
+# si despues de una coleccion queda ocupado mas de este porcentaje del
+# semiespacio, los dos se agrandan al doble
+GROWTH_THRESHOLD = 0.5
+
+
+# los valores son palabras con tag en el bit bajo: un entero n es 2n y un
+# puntero al bloque que empieza en la palabra p es 2p + 1, asi el colector
+# distingue los punteros sin saber que guarda cada bloque
+def pointer(address: int) -> int:
+    return (address << 1) | 1
+
+
+class Heap:
+    '''
+    Heap de la maquina de Mamarracho: dos semiespacios de palabras en
+    array('q'). Cada bloque tiene una palabra de cabecera con su tamaño
+    seguida de sus casillas, que empiezan en cero. Se reserva avanzando un
+    puntero y, cuando no hay lugar, un colector copiador (Cheney) copia al
+    otro semiespacio los bloques alcanzables desde las raices: los registros
+    y los locales guardados en la pila de llamados.
+    '''
+    def __init__(self, initialWords: int = INITIAL_WORDS, maxWords: int = MAX_WORDS) -> None:
+        self.capacity = min(initialWords, maxWords)
+        self.maxWords = maxWords
+        self.words = array('q', bytes(8 * self.capacity))
+        self.spare = array('q', bytes(8 * self.capacity))
+        self.top = 0
+        self.collections = 0
+        self.copiedWords = 0
+        self.pauseTime = 0.0
+        self.maxPause = 0.0
+        self.peakWords = 0
+
+    # deja lugar para un bloque de size palabras (con la cabecera) y
+    # devuelve el arreglo de palabras actual, que cambia al colectar
+    def reserve(self, size: int, roots: List[list]) -> array:
+        if self.top + size > self.capacity:
+            self.collect(roots)
+            if self.top + size > self.capacity * GROWTH_THRESHOLD:
+                self.grow(self.top + size)
+        return self.words
+
+    def collect(self, roots: List[list]) -> None:
+        start = perf_counter()
+        self.peakWords = max(self.peakWords, self.top)
+        old = self.words
+        new = self.spare
+        free = 0
+
+        def forward(value: int) -> int:
+            nonlocal free
+            address = value >> 1
+            size = old[address - 1]
+            # la cabecera de un bloque ya copiado guarda -(nueva direccion) - 1
+            if size < 0:
+                return pointer(-size - 1)
+            new[free] = size
+            new[free + 1:free + 1 + size] = old[address:address + size]
+            old[address - 1] = -(free + 1) - 1
+            free += size + 1
+            return pointer(free - size)
+
+        for registers in roots:
+            for index, value in enumerate(registers):
+                if value & 1:
+                    registers[index] = forward(value)
+
+        scan = 0
+        while scan < free:
+            size = new[scan]
+            for index in range(scan + 1, scan + 1 + size):
+                value = new[index]
+                if value & 1:
+                    new[index] = forward(value)
+            scan += size + 1
+
+        # el espacio libre tiene que estar en cero, porque un bloque recien
+        # reservado puede colectarse antes de que se escriban sus casillas:
+        # el semiespacio que queda libre se limpia para la proxima coleccion
+        old[:self.top] = array('q', bytes(8 * self.top))
+        self.copiedWords += free
+        self.words, self.spare = new, old
+        self.top = free
+        self.collections += 1
+        pause = perf_counter() - start
+        self.pauseTime += pause
+        self.maxPause = max(self.maxPause, pause)
+
+    def grow(self, needed: int) -> None:
+        capacity = self.capacity
+        while capacity < needed / GROWTH_THRESHOLD and capacity < self.maxWords:
+            capacity *= 2
+        capacity = min(capacity, self.maxWords)
+        if needed > capacity:
+            raise Exception(f"Memoria agotada: hacen falta {needed} palabras y el limite es {self.maxWords}")
+        if capacity > self.capacity:
+            extra = bytes(8 * (capacity - self.capacity))
+            self.words.frombytes(extra)
+            self.spare = array('q', bytes(8 * capacity))
+            self.capacity = capacity
+
+    def report(self) -> List[str]:
+        peak = max(self.peakWords, self.top)
+        return [
+            f"colecciones: {self.collections}",
+            f"bytes copiados: {8 * self.copiedWords}",
+            f"pausas: {self.pauseTime * 1000:.1f}ms en total, {self.maxPause * 1000:.1f}ms la mas larga",
+            f"heap: {8 * self.capacity} bytes por semiespacio, maximo usado {8 * peak} bytes",
+        ]
@@ -1,144 +1,360 @@
+from typing import Iterator, List, TextIO
+
+# Los registros locales son enteros no negativos ($r0, $r1, ...) y los
+# globales enteros negativos que indexan la tabla de globales del programa.
+# Las etiquetas tambien son enteros que indexan la tabla de etiquetas. El
+# texto de cada instruccion se genera recien al imprimir el programa.
+FUN = -1
+ARG = -2
+RES = -3
+
+
+class Names:
+    '''
+    Tabla de nombres internados: las instrucciones guardan solo el indice.
+    '''
+    __slots__ = ('names', 'ids')
+
+    def __init__(self, names: List[str] = None) -> None:
+        self.names = []
+        self.ids = {}
+        for name in names or []:
+            self.intern(name)
+
+    def intern(self, name: str) -> int:
+        id = self.ids.get(name)
+        if id is None:
+            id = len(self.names)
+            self.ids[name] = id
+            self.names.append(name)
+        return id
+
+    def __getitem__(self, id: int) -> str:
+        return self.names[id]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class MamProgram:
+    '''
+    Instrucciones compiladas junto con las tablas de nombres de etiquetas y
+    registros globales que hacen falta para escribirlas como texto.
+    '''
+    __slots__ = ('instructions', 'labels', 'globals')
+
+    def __init__(self, instructions: List['Instruction'], labels: Names, globals: Names) -> None:
+        self.instructions = instructions
+        self.labels = labels
+        self.globals = globals
+
+    def __iter__(self) -> Iterator['Instruction']:
+        return iter(self.instructions)
+
+    def __len__(self) -> int:
+        return len(self.instructions)
+
+    def register(self, reg: int) -> str:
+        if reg >= 0:
+            return f"$r{reg}"
+        return self.globals[-reg - 1]
+
+    def label(self, label: int) -> str:
+        return self.labels[label]
+
+    def lines(self) -> Iterator[str]:
+        for ins in self.instructions:
+            yield ins.render(self)
+
+    def write(self, sink: TextIO) -> None:
+        for line in self.lines():
+            sink.write(line)
+            sink.write("\n")
+
+
+def globalNames() -> Names:
+    return Names(["@fun", "@arg", "@res"])
+
+
+# defs y uses nombran los campos con los registros que cada instruccion
+# escribe y lee, para las pasadas que analizan el codigo generado
 class Instruction:
-    pass
+    __slots__ = ()
+    defs = ()
+    uses = ()
+
+    def render(self, program: MamProgram) -> str:
+        raise NotImplementedError
+
+class Label(Instruction):
+    __slots__ = ('label',)
+
+    def __init__(self, label) -> None:
+        self.label = label
+
+    def render(self, program: MamProgram) -> str:
+        return f"{program.label(self.label)}:"
 
 class MovReg(Instruction):
+    __slots__ = ('reg1', 'reg2')
+    defs = ('reg1',)
+    uses = ('reg2',)
+
     def __init__(self, r1, r2) -> None:
         self.reg1 = r1
         self.reg2 = r2
 
-    def __repr__(self) -> str:
-        return f"mov_reg({self.reg1}, {self.reg2})"
+    def render(self, program: MamProgram) -> str:
+        return f"mov_reg({program.register(self.reg1)}, {program.register(self.reg2)})"
 
 class MovInt(Instruction):
+    __slots__ = ('reg', 'value')
+    defs = ('reg',)
+
     def __init__(self, r, n) -> None:
         self.reg = r
         self.value = n
 
-    def __repr__(self) -> str:
-        return f"mov_int({self.reg}, {self.value})"
+    def render(self, program: MamProgram) -> str:
+        return f"mov_int({program.register(self.reg)}, {self.value})"
 
 class MovLabel(Instruction):
+    __slots__ = ('reg', 'value')
+    defs = ('reg',)
+
     def __init__(self, reg, label) -> None:
         self.reg = reg
         self.value = label
 
-    def __repr__(self) -> str:
-        return f"mov_label({self.reg}, {self.value})"
+    def render(self, program: MamProgram) -> str:
+        return f"mov_label({program.register(self.reg)}, {program.label(self.value)})"
 
 class Alloc(Instruction):
+    __slots__ = ('reg', 'slots')
+    defs = ('reg',)
+
     def __init__(self, reg, n) -> None:
         self.reg = reg
         self.slots = n
 
-    def __repr__(self) -> str:
-        return f"alloc({self.reg}, {self.slots})"
+    def render(self, program: MamProgram) -> str:
+        return f"alloc({program.register(self.reg)}, {self.slots})"
 
 # r1 := r2[i]
 class Load(Instruction):
+    __slots__ = ('reg1', 'reg2', 'index')
+    defs = ('reg1',)
+    uses = ('reg2',)
+
     def __init__(self, reg1, reg2, index) -> None:
         self.reg1 = reg1
         self.reg2 = reg2
         self.index = index
 
-    def __repr__(self) -> str:
-        return f"load({self.reg1}, {self.reg2}, {self.index})"
+    def render(self, program: MamProgram) -> str:
+        return f"load({program.register(self.reg1)}, {program.register(self.reg2)}, {self.index})"
 
 # r1[i] := r2
 class Store(Instruction):
+    __slots__ = ('reg1', 'index', 'reg2')
+    uses = ('reg1', 'reg2')
+
     def __init__(self, reg1, index, reg2) -> None:
         self.reg1 = reg1
         self.index = index
         self.reg2 = reg2
 
-    def __repr__(self) -> str:
-        return f"store({self.reg1}, {self.index}, {self.reg2})"
+    def render(self, program: MamProgram) -> str:
+        return f"store({program.register(self.reg1)}, {self.index}, {program.register(self.reg2)})"
 
 class Print(Instruction):
+    __slots__ = ('reg',)
+    uses = ('reg',)
+
     def __init__(self, reg) -> None:
         self.reg = reg
 
-    def __repr__(self) -> str:
-        return f"print({self.reg})"
+    def render(self, program: MamProgram) -> str:
+        return f"print({program.register(self.reg)})"
 
 class PrintChar(Instruction):
+    __slots__ = ('reg',)
+    uses = ('reg',)
+
     def __init__(self, reg) -> None:
         self.reg = reg
 
-    def __repr__(self) -> str:
-        return f"print_char({self.reg})"
+    def render(self, program: MamProgram) -> str:
+        return f"print_char({program.register(self.reg)})"
 
 class JumpInstruction(Instruction):
+    __slots__ = ('reg1', 'reg2', 'label')
+
     def __init__(self, reg1 = None, reg2 = None, label = None) -> None:
         self.reg1 = reg1
         self.reg2 = reg2
         self.label = label
 
+    def renderJump(self, name: str, program: MamProgram) -> str:
+        return f"{name}({program.register(self.reg1)}, {program.register(self.reg2)}, {program.label(self.label)})"
+
 class Jump(JumpInstruction):
+    __slots__ = ()
+
     def __init__(self, label) -> None:
         super().__init__(label=label)
 
-    def __repr__(self) -> str:
-        return f"jump({self.label})"
+    def render(self, program: MamProgram) -> str:
+        return f"jump({program.label(self.label)})"
 
 class JumpEq(JumpInstruction):
-    def __repr__(self) -> str:
-        return f"jump_eq({self.reg1}, {self.reg2}, {self.label})"
+    __slots__ = ()
+    uses = ('reg1', 'reg2')
+
+    def render(self, program: MamProgram) -> str:
+        return self.renderJump("jump_eq", program)
+
+class JumpLt(JumpInstruction):
+    __slots__ = ()
+    uses = ('reg1', 'reg2')
 
-class JumpLt(Instruction):
-    def __repr__(self) -> str:
-        return f"jump_lt({self.reg1}, {self.reg2}, {self.label})"
+    def render(self, program: MamProgram) -> str:
+        return self.renderJump("jump_lt", program)
 
 class OpInstruction(Instruction):
+    __slots__ = ('reg1', 'reg2', 'reg3', 'op')
+    defs = ('reg1',)
+    uses = ('reg2', 'reg3')
+
     def __init__(self, reg1, reg2, reg3, op = None) -> None:
         self.reg1 = reg1
         self.reg2 = reg2
         self.reg3 = reg3
         self.op = op
 
-    def __repr__(self) -> str:
-        return f"{self.op}({self.reg1}, {self.reg2}, {self.reg3})"
+    def render(self, program: MamProgram) -> str:
+        return f"{self.op}({program.register(self.reg1)}, {program.register(self.reg2)}, {program.register(self.reg3)})"
 
 class Add(OpInstruction):
+    __slots__ = ()
+
     def __init__(self, reg1, reg2, reg3) -> None:
         super().__init__(reg1, reg2, reg3, op="add")
 
 class Sub(OpInstruction):
+    __slots__ = ()
+
     def __init__(self, reg1, reg2, reg3) -> None:
         super().__init__(reg1, reg2, reg3, op="sub")
 
 class Mul(OpInstruction):
+    __slots__ = ()
+
     def __init__(self, reg1, reg2, reg3) -> None:
         super().__init__(reg1, reg2, reg3, op="mul")
 
 class Div(OpInstruction):
+    __slots__ = ()
+
     def __init__(self, reg1, reg2, reg3) -> None:
         super().__init__(reg1, reg2, reg3, op="div")
 
 class Mod(OpInstruction):
+    __slots__ = ()
+
     def __init__(self, reg1, reg2, reg3) -> None:
         super().__init__(reg1, reg2, reg3, op="mod")
 
 class Call(Instruction):
+    __slots__ = ('label',)
+
     def __init__(self, label) -> None:
         self.label = label
 
-    def __repr__(self) -> str:
-        return f"call({self.label})"
+    def render(self, program: MamProgram) -> str:
+        return f"call({program.label(self.label)})"
 
 class ICall(Instruction):
+    __slots__ = ('reg',)
+    uses = ('reg',)
+
     def __init__(self, reg) -> None:
         self.reg = reg
 
-    def __repr__(self) -> str:
-        return f"icall({self.reg})"
+    def render(self, program: MamProgram) -> str:
+        return f"icall({program.register(self.reg)})"
 
 class Return(Instruction):
-    def __repr__(self) -> str:
+    __slots__ = ()
+
+    def render(self, program: MamProgram) -> str:
         return f"return()"
 
 class Comment(Instruction):
+    __slots__ = ('msg',)
+
     def __init__(self, msg: str) -> None:
         self.msg = msg
 
-    def __repr__(self) -> str:
+    def render(self, program: MamProgram) -> str:
         return f"%% {self.msg}"
+
+
+# nombre de cada instruccion en el texto y el tipo de sus argumentos:
+# r registro, i entero, l etiqueta
+SYNTAX = {
+    "mov_reg": (MovReg, "rr"),
+    "mov_int": (MovInt, "ri"),
+    "mov_label": (MovLabel, "rl"),
+    "alloc": (Alloc, "ri"),
+    "load": (Load, "rri"),
+    "store": (Store, "rir"),
+    "print": (Print, "r"),
+    "print_char": (PrintChar, "r"),
+    "jump": (Jump, "l"),
+    "jump_eq": (JumpEq, "rrl"),
+    "jump_lt": (JumpLt, "rrl"),
+    "add": (Add, "rrr"),
+    "sub": (Sub, "rrr"),
+    "mul": (Mul, "rrr"),
+    "div": (Div, "rrr"),
+    "mod": (Mod, "rrr"),
+    "call": (Call, "l"),
+    "icall": (ICall, "r"),
+    "return": (Return, ""),
+}
+
+
+# lee el texto de un programa Mamarracho (el que escribe MamProgram.write)
+# y arma las mismas instrucciones con sus tablas de nombres
+def readProgram(lines: Iterator[str]) -> MamProgram:
+    labels = Names()
+    globals = globalNames()
+
+    def register(text: str) -> int:
+        if text.startswith("@"):
+            return -globals.intern(text) - 1
+        if text.startswith("$r") and text[2:].isdigit():
+            return int(text[2:])
+        raise Exception(f"Registro invalido: {text}")
+
+    decoders = {"r": register, "i": int, "l": labels.intern}
+    instructions = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("%%"):
+            instructions.append(Comment(line[2:].strip()))
+        elif line.endswith(":"):
+            instructions.append(Label(labels.intern(line[:-1])))
+        else:
+            name, _, rest = line.partition("(")
+            if name not in SYNTAX or not rest.endswith(")"):
+                raise Exception(f"Instruccion invalida en la linea {number}: {line}")
+            kind, signature = SYNTAX[name]
+            args = [arg.strip() for arg in rest[:-1].split(",")] if rest[:-1].strip() else []
+            if len(args) != len(signature):
+                raise Exception(f"Cantidad de argumentos invalida en la linea {number}: {line}")
+            instructions.append(kind(*[decoders[code](arg) for code, arg in zip(signature, args)]))
+    return MamProgram(instructions, labels, globals)
@@ -1,4 +1,15 @@
+import re
+
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
 from sly import Lexer
+from sly.lex import Token
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
 
 
 class FlechaLexer(Lexer):
@@ -106,3 +117,205 @@ class FlechaLexer(Lexer):
 
     def tokenize(self, s: str) -> Lexer.tokenize:
         return super().tokenize(s)
+
+
+ASCII = range(128)
+CATEGORIES = {'CATEGORY_DIGIT': r'\d', 'CATEGORY_SPACE': r'\s', 'CATEGORY_WORD': r'\w'}
+
+# caracteres ascii con los que puede empezar un match del patron; ante
+# cualquier construccion desconocida se asume que puede empezar con cualquiera
+def firstChars(items) -> Tuple[Set[int], bool]:
+    chars = set()
+    for op, av in items:
+        op = str(op)
+        nullable = False
+        if op == 'LITERAL':
+            current = {av}
+        elif op == 'IN':
+            current = set()
+            for inOp, inAv in av:
+                inOp = str(inOp)
+                if inOp == 'LITERAL':
+                    current.add(inAv)
+                elif inOp == 'RANGE':
+                    current.update(range(inAv[0], inAv[1] + 1))
+                elif inOp == 'CATEGORY' and str(inAv) in CATEGORIES:
+                    category = re.compile(CATEGORIES[str(inAv)])
+                    current.update(c for c in ASCII if category.match(chr(c)))
+                else:
+                    current = set(ASCII)
+                    break
+        elif op == 'SUBPATTERN':
+            current, nullable = firstChars(av[-1])
+        elif op == 'BRANCH':
+            current = set()
+            for branch in av[1]:
+                branchChars, branchNullable = firstChars(branch)
+                current |= branchChars
+                nullable = nullable or branchNullable
+        elif op in ('MAX_REPEAT', 'MIN_REPEAT'):
+            current, nullable = firstChars(av[2])
+            nullable = nullable or av[0] == 0
+        else:
+            current = set(ASCII)
+            nullable = True
+        chars |= current
+        if not nullable:
+            return chars & set(ASCII), False
+    return chars & set(ASCII), True
+
+
+class FlechaFastLexer:
+    '''
+    Lexer alternativo dirigido por tablas: arma los regex con la misma tabla
+    de tokens de FlechaLexer y produce tuplas (kind, start, end) sin crear un
+    Token ni llamar callbacks por cada lexema. Para cada caracter ascii
+    precompila un regex maestro con solo las reglas que pueden empezar con
+    ese caracter, respetando el orden original. Ante un caracter ilegal
+    delega en el lexer de SLY para reportar el error.
+
+    Las tablas se arman una sola vez por clase de lexer y las comparten
+    todas las instancias, asi crear un lexer por programa no cuesta nada.
+    '''
+    cache: Dict[type, tuple] = {}
+
+    def __init__(self, lexer: type = FlechaLexer) -> None:
+        self.lexer = lexer
+        tables = self.cache.get(lexer)
+        if tables is None:
+            self.buildTables()
+            tables = (self.kinds, self.kindIds, self.errorKind, self.master, self.table, self.ignored, self.remapping, self.newlineKind)
+            FlechaFastLexer.cache[lexer] = tables
+        (self.kinds, self.kindIds, self.errorKind, self.master, self.table, self.ignored, self.remapping, self.newlineKind) = tables
+
+    def buildTables(self) -> None:
+        lexer = self.lexer
+        self.kinds = []
+        self.kindIds = {}
+        rules = []
+        for name, pattern in lexer._rules:
+            if name.startswith('ignore_'):
+                name = name[7:]
+            if callable(pattern):
+                pattern = pattern.pattern
+            self.kind(name)
+            rules.append((name, f'(?P<{name}>{pattern})', self.startChars(pattern)))
+        for remapping in lexer._remapping.values():
+            for tokname in remapping.values():
+                self.kind(tokname)
+        self.errorKind = self.kind('ERROR')
+
+        self.master = self.compile(rules)
+        masters = {}
+        self.table = []
+        for c in ASCII:
+            candidates = tuple(rule for rule in rules if c in rule[2])
+            if not candidates:
+                candidates = tuple(rules)
+            key = tuple(name for name, _, _ in candidates)
+            if key not in masters:
+                masters[key] = self.compile(candidates)
+            self.table.append(masters[key])
+
+        self.ignored = [name in lexer._ignored_tokens for name in self.kinds]
+        self.remapping = {
+            self.kindIds[name]: {value: self.kindIds[tokname] for value, tokname in remapping.items()}
+            for name, remapping in lexer._remapping.items()
+        }
+        self.newlineKind = self.kindIds.get('newline', -1)
+
+    def startChars(self, pattern: str) -> Set[int]:
+        if self.lexer.reflags:
+            return set(ASCII)
+        try:
+            chars, _ = firstChars(sre_parse.parse(pattern))
+        except Exception:
+            chars = set(ASCII)
+        return chars
+
+    def compile(self, rules) -> Tuple[Callable, List[int]]:
+        master = self.lexer.regex_module.compile('|'.join(part for _, part, _ in rules), self.lexer.reflags)
+        groupKinds = [-1] * (master.groups + 1)
+        for name, group in master.groupindex.items():
+            groupKinds[group] = self.kindIds[name]
+        return master.match, groupKinds
+
+    def kind(self, name: str) -> int:
+        if name not in self.kindIds:
+            self.kindIds[name] = len(self.kinds)
+            self.kinds.append(name)
+        return self.kindIds[name]
+
+    def scan(self, s: str) -> Iterator[Tuple[int, int, int]]:
+        table = self.table
+        master = self.master
+        ignored = self.ignored
+        remapping = self.remapping
+        newlineKind = self.newlineKind
+        lineno = self.lineno = 1
+        index = 0
+        size = len(s)
+        while index < size:
+            c = ord(s[index])
+            match, groupKinds = table[c] if c < 128 else master
+            m = match(s, index)
+            if m is None:
+                tok, index, lineno = self.fallback(s, index, lineno)
+                self.lineno = lineno
+                if tok is not None:
+                    yield self.errorKind, tok.index, tok.end
+                continue
+            start = index
+            index = m.end()
+            kind = groupKinds[m.lastindex]
+            if ignored[kind]:
+                # replica el callback ignore_newline
+                if kind == newlineKind:
+                    lineno = self.lineno = lineno + index - start
+                continue
+            if kind in remapping:
+                kind = remapping[kind].get(s[start:index], kind)
+            yield kind, start, index
+
+    def fallback(self, s: str, index: int, lineno: int) -> Tuple[Optional[Token], int, int]:
+        lexer = self.lexer()
+        lexer.text = s
+        lexer.index = index
+        lexer.lineno = lineno
+        tok = Token()
+        tok.type = 'ERROR'
+        tok.value = s[index:]
+        tok.lineno = lineno
+        tok.index = index
+        tok = lexer.error(tok)
+        if tok is not None:
+            tok.end = lexer.index
+        return tok, lexer.index, lexer.lineno
+
+    def scanArrays(self, s: str) -> Tuple[array, array, array]:
+        kinds = array('B')
+        starts = array('l')
+        ends = array('l')
+        for kind, start, end in self.scan(s):
+            kinds.append(kind)
+            starts.append(start)
+            ends.append(end)
+        return kinds, starts, ends
+
+    # compatible con FlechaParser, que espera objetos Token
+    def tokenize(self, s: str) -> Iterator[Token]:
+        kinds = self.kinds
+        for kind, start, end in self.scan(s):
+            tok = Token()
+            tok.type = kinds[kind]
+            tok.value = s[start:end]
+            tok.lineno = self.lineno
+            tok.index = start
+            tok.end = end
+            yield tok
+
+
+def makeLexer(fast: bool = False):
+    if fast:
+        return FlechaFastLexer()
+    return FlechaLexer()
@@ -1,19 +1,15 @@
-import json
 import traceback
 
-from sys import argv
+from sys import argv, stderr, stdout
 
-from .compiler import FlechaCompiler
-from .env import Env
-from .lexer import FlechaLexer
-from .parser import FlechaParser
-from .serializer import FlechaSerializer
+from .compiler import optimizationLevel
+from .pipeline import compileSource
 
 
 if __name__ == '__main__':
 
     '''
-    python -m src.main tests_parser/test00.input
+    python -m src.main tests_parser/test00.input [--fast-lexer] [--arena] [--ast] [--stats] [-O1]
     '''
 
     try:
@@ -21,24 +17,14 @@ if __name__ == '__main__':
             raise Exception("Pass a filename as argument")
 
         inputFile = argv[1]
+        options = argv[2:]
         with open(inputFile, 'r') as inputContent:
             inputData = inputContent.read()
 
-        lexer = FlechaLexer()
-        parser = FlechaParser()
-        serializer = FlechaSerializer()
-        compiler = FlechaCompiler()
-        tokenized = lexer.tokenize(inputData)
-        parsed = parser.parse(tokenized)
-        ast = parsed.ast()
-        serialized = serializer.serializeProgram(ast)
-        print(serialized)
-        exps = json.loads(serialized)
-        env = Env()
-        reg = "$main"
-        insList = compiler.compile(exps, env, reg)
-        for ins in insList:
-            print(ins)
+        astOutput = stdout if '--ast' in options else None
+        stats = stderr if '--stats' in options else None
+        program = compileSource(inputData, '--fast-lexer' in options, '--arena' in options, astOutput, stats, optimizationLevel(options))
+        program.write(stdout)
     except Exception as e:
         print(e)
         print(traceback.format_exc())
@@ -1,15 +1,15 @@
 import traceback
 
-from sys import argv
+from sys import argv, stdout
 
-from sly import Parser
+from .arena import ArenaBuilder
+from .ast import Expr, ExprBuilder
 
-from .ast import Expr, ExprApply, ExprAtomic, ExprBinOp, ExprCase, ExprCaseBranch, ExprCases, ExprChar, ExprCons, ExprDefinition, ExprEmpty, ExprExpr, ExprIfThen, ExprLambda, ExprLet, ExprNumber, ExprOp, ExprParams, ExprProgram, ExprSequence, ExprString, ExprUnOp, ExprVar
-
-from .lexer import FlechaLexer
+from .lexer import FlechaLexer, makeLexer
 from .serializer import FlechaSerializer
+from .tables import CachedParser
 
-class FlechaParser(Parser):
+class FlechaParser(CachedParser):
     # debugfile = 'parser.out'
     tokens = FlechaLexer.tokens
     start = 'programa'
@@ -25,81 +25,84 @@ class FlechaParser(Parser):
         ('right', UMINUS),
     )
 
+    def __init__(self, builder: ExprBuilder = None) -> None:
+        self.builder = builder if builder else ExprBuilder()
+
     @_('')
     def empty(self, p) -> Expr:
-        return ExprEmpty()
+        return self.builder.empty()
 
     @_('empty')
     def programa(self, p) -> Expr:
-        return ExprEmpty()
+        return self.builder.program()
 
     @_('programa definicion')
     def programa(self, p) -> Expr:
-        return ExprProgram(p.programa, p.definicion)
+        return self.builder.addDefinition(p.programa, p.definicion)
 
     @_('DEF LOWERID parametros DEFEQ expresion')
     def definicion(self, p) -> Expr:
-        return ExprDefinition(p.LOWERID, p.parametros, p.expresion)
+        return self.builder.definition(p.LOWERID, p.parametros, p.expresion)
 
     @_('empty')
     def parametros(self, p) -> Expr:
-        return ExprEmpty()
+        return self.builder.empty()
 
     @_('LOWERID parametros')
     def parametros(self, p) -> Expr:
-        return ExprParams(p.LOWERID, p.parametros)
+        return self.builder.params(p.LOWERID, p.parametros)
 
     @_('expresionExterna')
     def expresion(self, p) -> Expr:
-        return ExprExpr(p.expresionExterna)
+        return self.builder.expr(p.expresionExterna)
 
     @_('expresionExterna SEMICOLON expresion')
     def expresion(self, p) -> Expr:
-        return ExprSequence(p.expresionExterna, p.expresion)
+        return self.builder.sequence(p.expresionExterna, p.expresion)
 
     @_('expresionIf', 'expresionCase', 'expresionLet', 'expresionLambda', 'expresionInterna')
     def expresionExterna(self, p) -> Expr:
-        return ExprExpr(p[0])
+        return self.builder.expr(p[0])
 
     @_('IF expresionInterna THEN expresionExterna ramasElse')
     def expresionIf(self, p) -> Expr:
-        return ExprIfThen(p.expresionInterna, p.expresionExterna, p.ramasElse)
+        return self.builder.ifThen(p.expresionInterna, p.expresionExterna, p.ramasElse)
 
     @_('ELIF expresionInterna THEN expresionInterna ramasElse')
     def ramasElse(self, p) -> Expr:
-        return ExprIfThen(p.expresionInterna0, p.expresionInterna1, p.ramasElse)
+        return self.builder.ifThen(p.expresionInterna0, p.expresionInterna1, p.ramasElse)
 
     @_('ELSE expresionInterna')
     def ramasElse(self, p) -> Expr:
-        return ExprExpr(p.expresionInterna)
+        return self.builder.expr(p.expresionInterna)
 
     @_('CASE expresionInterna ramasCase')
     def expresionCase(self, p) -> Expr:
-        return ExprCase(p.expresionInterna, p.ramasCase)
+        return self.builder.case(p.expresionInterna, p.ramasCase)
 
     @_('empty')
     def ramasCase(self, p) -> Expr:
-        return ExprEmpty()
+        return self.builder.empty()
 
     @_('ramaCase ramasCase')
     def ramasCase(self, p) -> Expr:
-        return ExprCases(p.ramaCase, p.ramasCase)
+        return self.builder.cases(p.ramaCase, p.ramasCase)
 
     @_('PIPE UPPERID parametros ARROW expresionInterna')
     def ramaCase(self, p) -> Expr:
-        return ExprCaseBranch(p.UPPERID, p.parametros, p.expresionInterna)
+        return self.builder.caseBranch(p.UPPERID, p.parametros, p.expresionInterna)
 
     @_('LET LOWERID parametros DEFEQ expresionInterna IN expresionExterna')
     def expresionLet(self, p) -> Expr:
-        return ExprLet(p.LOWERID, p.parametros, p.expresionInterna, p.expresionExterna)
+        return self.builder.let(p.LOWERID, p.parametros, p.expresionInterna, p.expresionExterna)
 
     @_('LAMBDA parametros ARROW expresionExterna')
     def expresionLambda(self, p) -> Expr:
-        return ExprLambda(p.parametros, p.expresionExterna)
+        return self.builder.lambdaExpr(p.parametros, p.expresionExterna)
 
     @_('expresionAplicacion')
     def expresionInterna(self, p) -> Expr:
-        return ExprExpr(p[0])
+        return self.builder.expr(p[0])
 
     @_('expresionInterna ADD expresionInterna')
     @_('expresionInterna SUB expresionInterna')
@@ -117,7 +120,7 @@ class FlechaParser(Parser):
     def expresionInterna(self, p) -> Expr:
         names = list(p._namemap.keys())
         name = names[1]
-        return ExprBinOp(p.expresionInterna0, ExprOp(name), p.expresionInterna1)
+        return self.builder.binOp(p.expresionInterna0, name, p.expresionInterna1)
 
     @_('SUB expresionInterna %prec UMINUS')
     @_('NOT expresionInterna')
@@ -128,48 +131,49 @@ class FlechaParser(Parser):
             name = "UMINUS"
         elif symb == "!":
             name = "NOT"
-        return ExprUnOp(p.expresionInterna, ExprOp(name))
+        return self.builder.unOp(p.expresionInterna, name)
 
     @_('expresionAtomica')
     def expresionAplicacion(self, p) -> Expr:
-        return ExprExpr(p[0])
+        return self.builder.expr(p[0])
 
     @_('expresionAplicacion expresionAtomica')
     def expresionAplicacion(self, p) -> Expr:
-        return ExprApply(p.expresionAplicacion, p.expresionAtomica)
+        return self.builder.apply(p.expresionAplicacion, p.expresionAtomica)
 
     @_('LOWERID')
     def expresionAtomica(self, p) -> Expr:
-        return ExprVar(p[0])
+        return self.builder.var(p[0])
 
     @_('UPPERID')
     def expresionAtomica(self, p) -> Expr:
-        return ExprCons(p[0])
+        return self.builder.cons(p[0])
 
     @_('CHAR')
     def expresionAtomica(self, p) -> Expr:
-        return ExprChar(p[0])
+        return self.builder.char(p[0])
 
     @_('STRING')
     def expresionAtomica(self, p) -> Expr:
-        return ExprString(p[0])
+        return self.builder.string(p[0])
 
     @_('NUMBER')
     def expresionAtomica(self, p) -> Expr:
-        return ExprNumber(p[0])
+        return self.builder.number(p[0])
 
     @_('LPAREN expresion RPAREN')
     def expresionAtomica(self, p) -> Expr:
-        return ExprAtomic(p[1])
+        return self.builder.atomic(p[1])
 
     def parse(self, tokenized) -> Expr:
+        self.builder.begin()
         return super().parse(tokenized)
 
 
 if __name__ == '__main__':
 
     '''
-    python -m src.parser tests_parser/test00.input
+    python -m src.parser tests_parser/test00.input [--fast-lexer] [--arena] [--stream | --binary]
     '''
 
     try:
@@ -177,17 +181,24 @@ if __name__ == '__main__':
             raise Exception("Pass a filename as argument")
 
         inputFile = argv[1]
+        options = argv[2:]
         with open(inputFile, 'r') as inputContent:
             inputData = inputContent.read()
 
-        lexer = FlechaLexer()
-        parser = FlechaParser()
+        lexer = makeLexer('--fast-lexer' in options)
+        parser = FlechaParser(ArenaBuilder() if '--arena' in options else ExprBuilder())
         serializer = FlechaSerializer()
         tokenized = lexer.tokenize(inputData)
         parsed = parser.parse(tokenized)
         ast = parsed.ast()
-        serialized = serializer.serializeProgram(ast)
-        print(serialized)
+        if '--binary' in options:
+            serializer.writeBinary(ast, stdout.buffer)
+        elif '--stream' in options:
+            serializer.writeProgram(ast, stdout)
+            stdout.write("\n")
+        else:
+            serialized = serializer.serializeProgram(ast)
+            print(serialized)
     except Exception as e:
         print(e)
         print(traceback.format_exc())
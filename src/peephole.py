@@ -0,0 +1,132 @@
+from typing import List
+
+from .instructions import Alloc, Instruction, JumpInstruction, Label, Load, MamProgram, MovInt, MovLabel, MovReg, Return
+from .regalloc import Region
+
+# instrucciones sin efectos mas alla de escribir su registro destino
+PURE = (MovReg, MovInt, MovLabel, Load, Alloc)
+
+MAX_ROUNDS = 8
+
+
+class PeepholeOptimizer:
+    '''
+    Optimizaciones locales sobre el codigo final de compileExpressions,
+    segun el nivel de -O:
+    - 1: saca los saltos a la etiqueta siguiente y los mov_int que vuelven a
+      cargar la constante que el registro ya tiene
+    - 2: ademas pliega las cadenas de copias (la instruccion que produce un
+      temporal escribe directo en el destino del mov_reg que lo copia) y
+      borra las escrituras a temporales que nadie lee
+    '''
+    def __init__(self, level: int = 1) -> None:
+        self.level = level
+        self.counters = {
+            "saltos": 0,
+            "constantes": 0,
+            "copias": 0,
+            "escrituras muertas": 0,
+        }
+
+    def optimize(self, program: MamProgram) -> MamProgram:
+        instructions = program.instructions
+        if self.level >= 1:
+            instructions = self.dropConstants(instructions)
+        if self.level >= 2:
+            for _ in range(MAX_ROUNDS):
+                removed = self.counters["copias"] + self.counters["escrituras muertas"]
+                instructions = self.foldRegions(instructions)
+                if removed == self.counters["copias"] + self.counters["escrituras muertas"]:
+                    break
+        if self.level >= 1:
+            instructions = self.dropJumps(instructions)
+        return MamProgram(instructions, program.labels, program.globals)
+
+    def report(self) -> List[str]:
+        removed = sum(self.counters.values())
+        lines = [f"{name}: {count}" for name, count in self.counters.items()]
+        lines.append(f"instrucciones eliminadas: {removed}")
+        return lines
+
+    # un salto, condicional o no, a una de las etiquetas que siguen
+    # inmediatamente no cambia el flujo
+    def dropJumps(self, instructions: List[Instruction]) -> List[Instruction]:
+        code = []
+        for index, ins in enumerate(instructions):
+            if isinstance(ins, JumpInstruction):
+                following = index + 1
+                targets = set()
+                while following < len(instructions) and isinstance(instructions[following], Label):
+                    targets.add(instructions[following].label)
+                    following += 1
+                if ins.label in targets:
+                    self.counters["saltos"] += 1
+                    continue
+            code.append(ins)
+        return code
+
+    # recuerda que constante tiene cada registro local dentro del bloque
+    def dropConstants(self, instructions: List[Instruction]) -> List[Instruction]:
+        code = []
+        known = {}
+        for ins in instructions:
+            if isinstance(ins, (Label, JumpInstruction, Return)):
+                known.clear()
+            elif isinstance(ins, MovInt) and ins.reg >= 0:
+                if known.get(ins.reg) == ins.value:
+                    self.counters["constantes"] += 1
+                    continue
+                known[ins.reg] = ins.value
+                code.append(ins)
+                continue
+            else:
+                for field in ins.defs:
+                    known.pop(getattr(ins, field), None)
+            code.append(ins)
+        return code
+
+    def foldRegions(self, instructions: List[Instruction]) -> List[Instruction]:
+        code = []
+        start = 0
+        for index, ins in enumerate(instructions):
+            if isinstance(ins, Return):
+                code += self.foldRegion(instructions[start:index + 1])
+                start = index + 1
+        code += self.foldRegion(instructions[start:])
+        return code
+
+    def foldRegion(self, code: List[Instruction]) -> List[Instruction]:
+        region = Region(code)
+        region.buildBlocks()
+        liveOut = region.liveness()
+        removed = set()
+        for block, (start, end) in enumerate(region.blocks):
+            live = set(liveOut[block])
+            for index in reversed(range(start, end)):
+                ins = code[index]
+                defs = region.defs[index]
+                # temporal que nadie lee: solo se escriben registros locales
+                if isinstance(ins, PURE) and defs and len(defs) == len(ins.defs) and live.isdisjoint(defs):
+                    removed.add(index)
+                    self.counters["escrituras muertas"] += 1
+                    continue
+                # producer(t); mov_reg(x, t) con t muerto => producer(x)
+                if isinstance(ins, MovReg) and index > start and self.foldCopy(region, index, live):
+                    removed.add(index)
+                    self.counters["copias"] += 1
+                    continue
+                live.difference_update(defs)
+                live.update(region.uses[index])
+        return [ins for index, ins in enumerate(code) if index not in removed]
+
+    def foldCopy(self, region: Region, index: int, live: set) -> bool:
+        move = region.code[index]
+        temp = move.reg2
+        if temp < 0 or temp == move.reg1 or temp in live:
+            return False
+        producer = region.code[index - 1]
+        if len(producer.defs) != 1 or region.defs[index - 1] != [temp]:
+            return False
+        setattr(producer, producer.defs[0], move.reg1)
+        region.defs[index - 1] = [move.reg1] if move.reg1 >= 0 else []
+        return True
@@ -0,0 +1,50 @@
+from typing import List, Optional, TextIO
+
+from .arena import ArenaBuilder
+from .ast import ExprBuilder
+from .compiler import FlechaCompiler
+from .instructions import MamProgram
+from .lexer import makeLexer
+from .parser import FlechaParser
+from .serializer import FlechaSerializer
+
+# api para usar el compilador como biblioteca: el ast pasa del parser al
+# compilador en memoria, sin serializarlo a json y volver a leerlo. Con
+# arena=True se usa un AstArena, que ocupa menos memoria pero es mas lento
+# de recorrer que el ast de listas
+
+
+# un lexer de cada tipo para todo el proceso: tokenize no guarda estado
+# entre programas, asi un servicio no arma las tablas en cada pedido
+LEXERS = {}
+
+
+def parseSource(source: str, fastLexer: bool = True, arena: bool = False) -> List:
+    lexer = LEXERS.get(fastLexer)
+    if lexer is None:
+        lexer = LEXERS[fastLexer] = makeLexer(fastLexer)
+    parser = FlechaParser(ArenaBuilder() if arena else ExprBuilder())
+    parsed = parser.parse(lexer.tokenize(source))
+    if parsed is None:
+        raise Exception("No se pudo parsear el programa")
+    return parsed.ast()
+
+
+# con stats se escribe el reporte de registros antes y despues de la
+# asignacion de registros y, con optimize > 0, lo que saco el optimizador
+def compileAst(ast: List, stats: Optional[TextIO] = None, optimize: int = 0) -> MamProgram:
+    compiler = FlechaCompiler(optimize=optimize)
+    program = compiler.compileExpressions(ast)
+    if stats is not None:
+        for line in compiler.report():
+            stats.write(line)
+            stats.write("\n")
+    return program
+
+
+def compileSource(source: str, fastLexer: bool = True, arena: bool = False, astOutput: Optional[TextIO] = None, stats: Optional[TextIO] = None, optimize: int = 0) -> MamProgram:
+    ast = parseSource(source, fastLexer, arena)
+    if astOutput is not None:
+        FlechaSerializer().writeProgram(ast, astOutput)
+        astOutput.write("\n")
+    return compileAst(ast, stats, optimize)
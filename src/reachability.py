@@ -0,0 +1,97 @@
+from typing import Dict, List, Set
+
+from .freevars import FreeVarsAnalysis
+from .util import isExprDef
+
+ENTRY = "main"
+
+
+class ReachableDefinitions:
+    '''
+    Se queda con las definiciones globales que alcanza main, siguiendo las
+    variables libres de cada una. Evaluar una definicion puede tener efectos
+    (imprimir, no terminar), asi que las que no son trivialmente puras
+    tambien son raices y se conservan aunque main no las use.
+    '''
+    def __init__(self) -> None:
+        self.total = 0
+        self.removed = 0
+        self.removedLambdas = 0
+
+    # definiciones cuya evaluacion no hace nada mas que construir un valor
+    def isPure(self, exp: List) -> bool:
+        if exp[0] in ["ExprLambda", "ExprNumber", "ExprChar", "ExprConstructor", "ExprVar", "ExprString"]:
+            return True
+        # un constructor aplicado a valores puros, recorrido con una pila
+        # porque los strings son cadenas de Cons tan largas como el texto
+        pending = [exp]
+        while pending:
+            exp = pending.pop()
+            if exp[0] in ["ExprLambda", "ExprNumber", "ExprChar", "ExprConstructor", "ExprVar", "ExprString"]:
+                continue
+            head = exp
+            while head[0] == "ExprApply":
+                pending.append(head[2])
+                head = head[1]
+            if head[0] != "ExprConstructor" or head is exp:
+                return False
+        return True
+
+    def countLambdas(self, exp: List) -> int:
+        count = 0
+        pending = [exp]
+        while pending:
+            exp = pending.pop()
+            expName = exp[0]
+            if expName == "ExprLambda":
+                count += 1
+                pending.append(exp[2])
+            elif expName == "ExprApply":
+                pending += [exp[1], exp[2]]
+            elif expName == "ExprLet":
+                pending += [exp[2], exp[3]]
+            elif expName == "Def":
+                pending.append(exp[2])
+            elif expName == "ExprCase":
+                pending.append(exp[1])
+                pending += [branch[3] for branch in exp[2]]
+        return count
+
+    def prune(self, exps: List) -> List:
+        definitions = [exp for exp in exps if isExprDef(exp)]
+        self.total = len(definitions)
+        self.removed = 0
+        self.removedLambdas = 0
+        names = {exp[1] for exp in definitions}
+        if ENTRY not in names:
+            return exps
+
+        analysis = FreeVarsAnalysis()
+        uses: Dict[str, Set[str]] = {}
+        for exp in definitions:
+            free = analysis.freeVars(exp)
+            uses.setdefault(exp[1], set()).update(var for var in free if var in names)
+
+        pending = [ENTRY] + [exp[1] for exp in definitions if not self.isPure(exp[2])]
+        reachable = set()
+        while pending:
+            name = pending.pop()
+            if name in reachable:
+                continue
+            reachable.add(name)
+            pending.extend(uses[name] - reachable)
+
+        kept = []
+        for exp in exps:
+            if isExprDef(exp) and exp[1] not in reachable:
+                self.removed += 1
+                self.removedLambdas += self.countLambdas(exp)
+                continue
+            kept.append(exp)
+        return kept
+
+    def report(self) -> List[str]:
+        return [
+            f"definiciones eliminadas: {self.removed} de {self.total}",
+            f"lambdas sin generar: {self.removedLambdas}",
+        ]
@@ -0,0 +1,154 @@
+import mmap
+
+from codecs import utf_8_decode
+from typing import List
+
+from .arena import APPLY, BRANCH, CASE, CHAR, CONSTRUCTOR, DEF, LAMBDA, LET, NUMBER, STRING, VAR, AstArena
+from .serializer import BINARY_MAGIC, BINARY_VERSION
+
+# la version 1 es la misma sin nodos de string, asi que se sigue leyendo
+READABLE_VERSIONS = (1, BINARY_VERSION)
+
+
+def isBinaryAst(data) -> bool:
+    return bytes(data[:len(BINARY_MAGIC)]) == BINARY_MAGIC
+
+
+class FlechaBinaryReader:
+    '''
+    Lee el ast binario que escribe FlechaSerializer.serializeBinary y lo
+    reconstruye como un AstArena. Decodifica directamente sobre un
+    memoryview, asi que un archivo mapeado en memoria no se copia a un
+    bytes intermedio.
+    '''
+    def __init__(self, data) -> None:
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def varint(self) -> int:
+        data = self.data
+        pos = self.pos
+        byte = data[pos]
+        if byte < 0x80:
+            self.pos = pos + 1
+            return byte
+        result = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        self.pos = pos
+        return result
+
+    def signed(self) -> int:
+        value = self.varint()
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+    def header(self) -> None:
+        if not isBinaryAst(self.data):
+            raise Exception("El archivo no es un ast binario de Flecha")
+        self.pos = len(BINARY_MAGIC)
+        version = self.data[self.pos]
+        if version not in READABLE_VERSIONS:
+            raise Exception(f"Version de ast binario no soportada: {version}")
+        self.pos += 1
+
+    def strings(self) -> List[str]:
+        strings = []
+        for _ in range(self.varint()):
+            size = self.varint()
+            name, _ = utf_8_decode(self.data[self.pos:self.pos + size])
+            strings.append(name)
+            self.pos += size
+        return strings
+
+    def read(self) -> AstArena:
+        self.header()
+        arena = AstArena()
+        arena.symbols = self.strings()
+        arena.symbolIds = {name: sym for sym, name in enumerate(arena.symbols)}
+        data = self.data
+        kinds = arena.kinds
+        op1 = arena.op1
+        op2 = arena.op2
+        op3 = arena.op3
+
+        roots = self.varint()
+        stack = []
+        pop = stack.pop
+        pos = self.pos
+        end = len(data)
+        # decodificacion especializada por tipo de nodo; los varints de un
+        # byte, que son la gran mayoria, se leen sin llamar a varint()
+        while pos < end:
+            kind = data[pos]
+            pos += 1
+            arg2 = arg3 = 0
+            if kind == APPLY:
+                arg2 = pop()
+                value = pop()
+            else:
+                value = data[pos]
+                pos += 1
+                if value >= 0x80:
+                    self.pos = pos - 1
+                    value = self.varint()
+                    pos = self.pos
+                if kind == VAR or kind == CONSTRUCTOR:
+                    pass
+                elif kind == NUMBER or kind == CHAR:
+                    value = (value >> 1) if not value & 1 else -((value + 1) >> 1)
+                elif kind == LAMBDA or kind == DEF:
+                    arg2 = pop()
+                elif kind == LET:
+                    arg3 = pop()
+                    arg2 = pop()
+                elif kind == CASE:
+                    branches = stack[len(stack) - value:]
+                    del stack[len(stack) - value:]
+                    arg2 = arena.list(branches)
+                    value = pop()
+                elif kind == BRANCH:
+                    self.pos = pos
+                    params = [self.varint() for _ in range(self.varint())]
+                    pos = self.pos
+                    arg2 = arena.list(params)
+                    arg3 = pop()
+                elif kind == STRING:
+                    self.pos = pos
+                    codes = [self.varint() for _ in range(value)]
+                    pos = self.pos
+                    value = arena.list(codes)
+                else:
+                    raise Exception(f"Tipo de nodo desconocido: {kind}")
+            stack.append(len(kinds))
+            kinds.append(kind)
+            op1.append(value)
+            op2.append(arg2)
+            op3.append(arg3)
+        self.pos = pos
+
+        # al terminar quedan en la pila las raices de cada definicion
+        if len(stack) != roots:
+            raise Exception("Ast binario corrupto")
+        arena.roots.extend(stack)
+        return arena
+
+    @classmethod
+    def loads(cls, data) -> List:
+        return cls(data).read().ast()
+
+    @classmethod
+    def load(cls, path: str) -> List:
+        with open(path, 'rb') as inputFile:
+            with mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                reader = cls(mapped)
+                try:
+                    arena = reader.read()
+                finally:
+                    reader.data.release()
+        return arena.ast()
@@ -0,0 +1,200 @@
+from typing import Dict, List, Set, Tuple
+
+from .instructions import Instruction, Jump, JumpInstruction, Label, MamProgram, MovReg, Return
+
+
+class Region:
+    '''
+    Tramo de codigo con sus propios registros locales: una rutina, desde su
+    etiqueta rtn_N: hasta su return(), o el codigo de las definiciones.
+    '''
+    def __init__(self, code: List[Instruction]) -> None:
+        self.code = code
+        self.blocks: List[Tuple[int, int]] = []
+        self.successors: List[List[int]] = []
+        # registros locales que escribe y lee cada instruccion
+        self.defs: List[List[int]] = []
+        self.uses: List[List[int]] = []
+
+    def name(self, program: MamProgram) -> str:
+        for ins in self.code:
+            if isinstance(ins, Label):
+                return program.label(ins.label)
+        return "-"
+
+    def registers(self) -> Set[int]:
+        registers = set()
+        for defs, uses in zip(self.defs, self.uses):
+            registers.update(defs)
+            registers.update(uses)
+        return registers
+
+    def locals(self, ins: Instruction, fields: Tuple[str, ...]) -> List[int]:
+        return [reg for reg in (getattr(ins, field) for field in fields) if reg >= 0]
+
+    # bloques basicos: empiezan en una etiqueta o despues de un salto
+    def buildBlocks(self) -> None:
+        code = self.code
+        self.defs = [self.locals(ins, ins.defs) for ins in code]
+        self.uses = [self.locals(ins, ins.uses) for ins in code]
+        starts = [0]
+        for index, ins in enumerate(code):
+            if isinstance(ins, Label) and index != starts[-1]:
+                starts.append(index)
+            elif isinstance(ins, (JumpInstruction, Return)) and index + 1 < len(code):
+                starts.append(index + 1)
+        starts = sorted(set(starts))
+        self.blocks = [(start, end) for start, end in zip(starts, starts[1:] + [len(code)])]
+
+        blockOfLabel = {}
+        for block, (start, _) in enumerate(self.blocks):
+            if isinstance(code[start], Label):
+                blockOfLabel[code[start].label] = block
+        self.successors = []
+        for block, (start, end) in enumerate(self.blocks):
+            last = code[end - 1]
+            successors = []
+            if isinstance(last, JumpInstruction) and last.label in blockOfLabel:
+                successors.append(blockOfLabel[last.label])
+            fallsThrough = not isinstance(last, (Jump, Return))
+            if fallsThrough and block + 1 < len(self.blocks):
+                successors.append(block + 1)
+            self.successors.append(successors)
+
+    def useDef(self, start: int, end: int) -> Tuple[Set[int], Set[int]]:
+        uses = set()
+        defs = set()
+        for index in range(start, end):
+            for reg in self.uses[index]:
+                if reg not in defs:
+                    uses.add(reg)
+            defs.update(self.defs[index])
+        return uses, defs
+
+    # registros vivos a la salida de cada bloque, iterando hasta el punto fijo
+    def liveness(self) -> List[Set[int]]:
+        useDefs = [self.useDef(start, end) for start, end in self.blocks]
+        liveIn = [set() for _ in self.blocks]
+        liveOut = [set() for _ in self.blocks]
+        changed = True
+        while changed:
+            changed = False
+            for block in reversed(range(len(self.blocks))):
+                out = set()
+                for successor in self.successors[block]:
+                    out |= liveIn[successor]
+                uses, defs = useDefs[block]
+                live = uses | (out - defs)
+                if live != liveIn[block] or out != liveOut[block]:
+                    liveIn[block] = live
+                    liveOut[block] = out
+                    changed = True
+        return liveOut
+
+
+class RegisterAllocator:
+    '''
+    Asigna los registros virtuales que reparte Env.fresh a la menor cantidad
+    de registros que encuentra, region por region: calcula la vida de cada
+    registro, une los dos registros de un mov_reg cuando no interfieren (y
+    borra la copia) y colorea el grafo de interferencia de forma greedy.
+    '''
+    def __init__(self) -> None:
+        self.stats: List[Tuple[str, int, int]] = []
+
+    def regions(self, instructions: List[Instruction]) -> List[Region]:
+        regions = []
+        start = 0
+        for index, ins in enumerate(instructions):
+            if isinstance(ins, Return):
+                regions.append(Region(instructions[start:index + 1]))
+                start = index + 1
+        regions.append(Region(instructions[start:]))
+        return regions
+
+    def interference(self, region: Region) -> Dict[int, Set[int]]:
+        graph = {reg: set() for reg in region.registers()}
+        liveOut = region.liveness()
+        for block, (start, end) in enumerate(region.blocks):
+            live = set(liveOut[block])
+            for index in reversed(range(start, end)):
+                ins = region.code[index]
+                source = ins.reg2 if isinstance(ins, MovReg) else None
+                for reg in region.defs[index]:
+                    for other in live:
+                        if other != reg and other != source:
+                            graph[reg].add(other)
+                            graph[other].add(reg)
+                    live.discard(reg)
+                live.update(region.uses[index])
+        return graph
+
+    # une los registros de cada copia que no interfieren entre si
+    def coalesce(self, region: Region, graph: Dict[int, Set[int]]) -> Dict[int, int]:
+        parent = {reg: reg for reg in graph}
+
+        def find(reg: int) -> int:
+            while parent[reg] != reg:
+                parent[reg] = parent[parent[reg]]
+                reg = parent[reg]
+            return reg
+
+        for ins in region.code:
+            if not isinstance(ins, MovReg) or ins.reg1 < 0 or ins.reg2 < 0:
+                continue
+            dst = find(ins.reg1)
+            src = find(ins.reg2)
+            if dst == src or src in graph[dst]:
+                continue
+            parent[src] = dst
+            for neighbor in graph.pop(src):
+                graph[neighbor].discard(src)
+                graph[neighbor].add(dst)
+                graph[dst].add(neighbor)
+        return {reg: find(reg) for reg in parent}
+
+    def color(self, region: Region, graph: Dict[int, Set[int]], representative: Dict[int, int]) -> Dict[int, int]:
+        colors = {}
+        for defs, uses in zip(region.defs, region.uses):
+            for reg in defs + uses:
+                node = representative[reg]
+                if node in colors:
+                    continue
+                used = {colors[neighbor] for neighbor in graph[node] if neighbor in colors}
+                color = 0
+                while color in used:
+                    color += 1
+                colors[node] = color
+        return {reg: colors[node] for reg, node in representative.items()}
+
+    def allocateRegion(self, region: Region, name: str) -> List[Instruction]:
+        region.buildBlocks()
+        graph = self.interference(region)
+        before = len(graph)
+        representative = self.coalesce(region, graph)
+        assignment = self.color(region, graph, representative)
+        code = []
+        for ins in region.code:
+            for field in ins.defs + ins.uses:
+                reg = getattr(ins, field)
+                if reg >= 0:
+                    setattr(ins, field, assignment[reg])
+            if isinstance(ins, MovReg) and ins.reg1 == ins.reg2:
+                continue
+            code.append(ins)
+        self.stats.append((name, before, len(set(assignment.values()))))
+        return code
+
+    def allocate(self, program: MamProgram) -> MamProgram:
+        self.stats = []
+        instructions = []
+        for region in self.regions(program.instructions):
+            instructions += self.allocateRegion(region, region.name(program))
+        return MamProgram(instructions, program.labels, program.globals)
+
+    def report(self) -> List[str]:
+        before = sum(stat[1] for stat in self.stats)
+        after = sum(stat[2] for stat in self.stats)
+        lines = [f"{name}: {regsBefore} -> {regsAfter} registros" for name, regsBefore, regsAfter in self.stats]
+        lines.append(f"total: {before} -> {after} registros en {len(self.stats)} regiones")
+        return lines
@@ -1,110 +1,213 @@
-from typing import List
+from typing import BinaryIO, Iterator, List, TextIO
 
-class FlechaSerializer:
-    def spaced(self, ss: str, depth: int) -> str:
-        spaces = " " * depth
-        return """{spaces}{s}{spaces}""".format(s=ss, spaces=spaces)
+from .arena import KIND_IDS
 
-    def serializeList(self, ls: List, depth: int) -> str:
-        space = " " * depth
-        if len(ls) == 0:
-            return """{space}[]""".format(space=space)
-        ss = """{space}[\n""".format(space=space)
-        last = len(ls) - 1
-        for idx, d in enumerate(ls):
-            s = self.serializeExp(d, depth + 1)
-            ss += s
-            if idx < last:
-              ss += ","
-            ss += "\n"
-        ss += """{space}]""".format(space=space)
-        return ss
+CHUNK_SIZE = 1 << 16
 
-    def serializeDef(self, expDef: List, depth: int) -> str:
-        spaces = " " * depth
-        body = self.serializeExp(expDef[2], depth + 1)
-        s = """{spaces}["{expName}", "{name}",\n{body}\n{spaces}]""".format(expName=expDef[0], name=expDef[1], body=body, spaces=spaces)
-        return s
+# niveles de sangria que se guardan ya armados
+INDENT_CACHE = 1024
 
-    def serializeUnQuoted(self, exp: List, depth: int) -> str:
-        spaces = " " * depth
-        s = """{spaces}["{expName}", {value}]""".format(expName=exp[0], value=exp[1], spaces=spaces)
-        return s
+# formato binario: MAGIC, version, tabla de strings (cantidad y cada string
+# como largo + utf-8), cantidad de definiciones y los nodos en postorden.
+# Cada nodo es un byte con su tipo seguido de sus campos: enteros en varint
+# zigzag, strings como indice varint en la tabla, listas de strings como
+# cantidad + indices y listas de nodos solo como cantidad. Los hijos se
+# escriben antes que el padre, asi que el lector los toma de una pila. Un
+# string es la cantidad de caracteres seguida de sus codigos en varint.
+BINARY_MAGIC = b"FLAST"
+BINARY_VERSION = 2
 
-    def serializeQuoted(self, exp: List, depth: int) -> str:
-        spaces = " " * depth
-        s = """{spaces}["{expName}", "{value}"]""".format(expName=exp[0], value=exp[1], spaces=spaces)
-        return s
 
-    def serializeNumber(self, exp: List, depth: int) -> str:
-        return self.serializeUnQuoted(exp, depth)
+def writeVarint(out: bytearray, value: int) -> None:
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
 
-    def serializeChar(self, exp: List, depth: int) -> str:
-        return self.serializeUnQuoted(exp, depth)
 
-    def serializeVar(self, exp: List, depth: int) -> str:
-        return self.serializeQuoted(exp, depth)
+def zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
 
-    def serializeConstructor(self, exp: List, depth: int) -> str:
-        return self.serializeQuoted(exp, depth)
+class FlechaSerializer:
+    def __init__(self) -> None:
+        self.indents = [""]
 
-    def serializeApply(self, exp: List, depth: int) -> str:
+    def spaced(self, ss: str, depth: int) -> str:
         spaces = " " * depth
-        sign = self.serializeExp(exp[1], depth + 1)
-        body = self.serializeExp(exp[2], depth + 1)
-        s = """{spaces}["{expName}",\n{sign},\n{body}\n{spaces}]""".format(expName=exp[0], sign=sign, body=body, spaces=spaces)
-        return s
+        return """{spaces}{s}{spaces}""".format(s=ss, spaces=spaces)
 
-    def serializeExprCase(self, exp: List, depth: int) -> str:
-        spaces = " " * depth
-        sign = self.serializeExp(exp[1], depth + 1)
-        cases = self.serializeList(exp[2], depth + 1)
-        s = """{spaces}["{expName}",\n{sign},\n{cases}\n{spaces}]""".format(expName=exp[0], sign=sign, cases=cases, spaces=spaces)
-        return s
+    # serializeList y serializeExp arman el texto con el mismo recorrido de
+    # pila explicita que el modo streaming, asi no dependen de la
+    # profundidad del ast
+    def serializeList(self, ls: List, depth: int) -> str:
+        return "".join(self.fragments(self.expandList(ls, depth)))
 
-    def serializeCaseBranch(self, exp: List, depth: int) -> str:
-        spaces = " " * depth
-        params = str(exp[2]).replace("'", '"')
-        body = self.serializeExp(exp[3], depth + 1)
-        s = """{spaces}["{expName}", "{name}", {params},\n{body}\n{spaces}]""".format(expName=exp[0], name=exp[1], params=params, body=body, spaces=spaces)
-        return s
+    def serializeExp(self, exp: List, depth: int) -> str:
+        return "".join(self.fragments([(exp, depth)]))
 
-    def serializeLambda(self, exp: List, depth: int) -> str:
-        spaces = " " * depth
-        body = self.serializeExp(exp[2], depth + 1)
-        s = """{spaces}["{expName}", "{name}",\n{body}\n{spaces}]""".format(expName=exp[0], name=exp[1], body=body, spaces=spaces)
-        return s
+    def serializeProgram(self, ast: List, depth: int = 0) -> str:
+        return self.serializeList(ast, depth)
 
-    def serializeLet(self, exp: List, depth: int) -> str:
-        spaces = " " * depth
-        sign = self.serializeExp(exp[2], depth + 1)
-        body = self.serializeExp(exp[3], depth + 1)
-        s = """{spaces}["{expName}", "{name}",\n{sign},\n{body}\n{spaces}]""".format(expName=exp[0], name=exp[1], params=exp[2], sign=sign, body=body, spaces=spaces)
-        return s
 
-    def serializeExp(self, exp: List, depth: int) -> str:
+    # modo streaming: misma salida que serializeProgram, pero escrita por
+    # fragmentos a medida que se recorre el ast
+
+    # solo se guardan las sangrias de los primeros niveles: guardarlas todas
+    # ocuparia memoria cuadratica en la profundidad del ast
+    def indent(self, depth: int) -> str:
+        indents = self.indents
+        if depth >= INDENT_CACHE:
+            return " " * depth
+        while len(indents) <= depth:
+            indents.append(" " * len(indents))
+        return indents[depth]
+
+    def expandList(self, ls: List, depth: int) -> List:
+        space = self.indent(depth)
+        if len(ls) == 0:
+            return [f"{space}[]"]
+        parts = [f"{space}[\n"]
+        last = len(ls) - 1
+        for idx, d in enumerate(ls):
+            parts.append((d, depth + 1))
+            if idx < last:
+                parts.append(",\n")
+        parts.append(depth)
+        return parts
+
+    def expandExp(self, exp: List, depth: int) -> List:
+        spaces = self.indent(depth)
         name = exp[0]
-        if name == "Def":
-            return self.serializeDef(exp, depth)
-        elif name == "ExprNumber":
-            return self.serializeNumber(exp, depth)
-        elif name == "ExprChar":
-            return self.serializeChar(exp, depth)
-        elif name == "ExprVar":
-            return self.serializeVar(exp, depth)
-        elif name == "ExprConstructor":
-            return self.serializeConstructor(exp, depth)
+        if name in ("Def", "ExprLambda"):
+            return [f'{spaces}["{name}", "{exp[1]}",\n', (exp[2], depth + 1), depth]
+        elif name in ("ExprNumber", "ExprChar"):
+            return [f'{spaces}["{name}", {exp[1]}]']
+        elif name in ("ExprVar", "ExprConstructor"):
+            return [f'{spaces}["{name}", "{exp[1]}"]']
         elif name == "ExprApply":
-            return self.serializeApply(exp, depth)
+            return [f'{spaces}["{name}",\n', (exp[1], depth + 1), ",\n", (exp[2], depth + 1), depth]
         elif name == "ExprCase":
-            return self.serializeExprCase(exp, depth)
+            cases = self.expandList(exp[2], depth + 1)
+            return [f'{spaces}["{name}",\n', (exp[1], depth + 1), ",\n"] + cases + [depth]
         elif name == "CaseBranch":
-            return self.serializeCaseBranch(exp, depth)
-        elif name == "ExprLambda":
-            return self.serializeLambda(exp, depth)
+            params = str(list(exp[2])).replace("'", '"')
+            return [f'{spaces}["{name}", "{exp[1]}", {params},\n', (exp[3], depth + 1), depth]
         elif name == "ExprLet":
-            return self.serializeLet(exp, depth)
-        return ""
-
-    def serializeProgram(self, ast: List, depth: int = 0) -> str:
-        return self.serializeList(ast, depth)
+            return [f'{spaces}["{name}", "{exp[1]}",\n', (exp[2], depth + 1), ",\n", (exp[3], depth + 1), depth]
+        elif name == "ExprString":
+            return self.expandString(exp, depth)
+        return []
+
+    # el json conserva la forma original de un string, una cadena de Cons
+    # aplicados a cada caracter: se expande de a un caracter, con la
+    # posicion del resto en un tercer campo
+    def expandString(self, exp: List, depth: int) -> List:
+        codes = exp[1]
+        start = exp[2] if len(exp) > 2 else 0
+        spaces = self.indent(depth)
+        if start == len(codes):
+            return [f'{spaces}["ExprConstructor", "Nil"]']
+        inner = self.indent(depth + 1)
+        cons = self.indent(depth + 2)
+        head = f'{inner}["ExprApply",\n{cons}["ExprConstructor", "Cons"],\n{cons}["ExprChar", {codes[start]}]'
+        rest = ("ExprString", codes, start + 1)
+        return [f'{spaces}["ExprApply",\n', head, depth + 1, ",\n", (rest, depth + 1), depth]
+
+    # parts mezcla texto, pares (exp, depth) que todavia hay que expandir y
+    # la profundidad de cada corchete que cierra: la sangria del cierre se
+    # arma recien al escribirlo, asi la pila no guarda una por nivel
+    def fragments(self, parts: List) -> Iterator[str]:
+        stack = list(reversed(parts))
+        while stack:
+            part = stack.pop()
+            if isinstance(part, str):
+                yield part
+            elif isinstance(part, int):
+                yield f"\n{self.indent(part)}]"
+            else:
+                stack.extend(reversed(self.expandExp(*part)))
+
+    def streamFragments(self, ast: List, depth: int = 0) -> Iterator[str]:
+        return self.fragments(self.expandList(ast, depth))
+
+    def streamProgram(self, ast: List, depth: int = 0, chunkSize: int = CHUNK_SIZE) -> Iterator[str]:
+        chunk = []
+        size = 0
+        for fragment in self.streamFragments(ast, depth):
+            chunk.append(fragment)
+            size += len(fragment)
+            if size >= chunkSize:
+                yield "".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield "".join(chunk)
+
+    def writeProgram(self, ast: List, sink: TextIO, depth: int = 0) -> None:
+        for chunk in self.streamProgram(ast, depth):
+            sink.write(chunk)
+
+    def serializeBinary(self, ast: List) -> bytes:
+        strings = {}
+        body = bytearray()
+
+        def intern(name: str) -> int:
+            if name not in strings:
+                strings[name] = len(strings)
+            return strings[name]
+
+        writeVarint(body, len(ast))
+        stack = [(exp, False) for exp in reversed(ast)]
+        push = stack.append
+        while stack:
+            exp, visited = stack.pop()
+            name = exp[0]
+            if not visited:
+                push((exp, True))
+                if name == "ExprApply":
+                    push((exp[2], False))
+                    push((exp[1], False))
+                elif name in ("Def", "ExprLambda"):
+                    push((exp[2], False))
+                elif name == "ExprLet":
+                    push((exp[3], False))
+                    push((exp[2], False))
+                elif name == "ExprCase":
+                    stack += [(branch, False) for branch in reversed(exp[2])]
+                    push((exp[1], False))
+                elif name == "CaseBranch":
+                    push((exp[3], False))
+                continue
+            kind = KIND_IDS[name]
+            body.append(kind)
+            if name == "ExprApply":
+                continue
+            elif name in ("ExprNumber", "ExprChar"):
+                value = zigzag(exp[1])
+            elif name == "ExprCase":
+                value = len(exp[2])
+            elif name == "ExprString":
+                writeVarint(body, len(exp[1]))
+                for code in exp[1]:
+                    writeVarint(body, code)
+                continue
+            else:
+                value = intern(exp[1])
+            writeVarint(body, value)
+            if name == "CaseBranch":
+                writeVarint(body, len(exp[2]))
+                for param in exp[2]:
+                    writeVarint(body, intern(param))
+
+        out = bytearray(BINARY_MAGIC)
+        out.append(BINARY_VERSION)
+        writeVarint(out, len(strings))
+        for name in strings:
+            encoded = name.encode("utf-8")
+            writeVarint(out, len(encoded))
+            out += encoded
+        out += body
+        return bytes(out)
+
+    def writeBinary(self, ast: List, sink: BinaryIO) -> None:
+        sink.write(self.serializeBinary(ast))
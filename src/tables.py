@@ -0,0 +1,101 @@
+import hashlib
+import os
+import pickle
+
+from sly import Parser, __version__ as slyVersion
+from sly.yacc import YaccError
+
+CACHE_VERSION = 1
+CACHE_ENV = 'FLECHA_PARSER_CACHE'
+
+
+class CachedLRTable:
+    def __init__(self, action: dict, goto: dict, defaulted: dict) -> None:
+        self.lr_action = action
+        self.lr_goto = goto
+        self.defaulted_states = defaulted
+
+
+class CachedParser(Parser):
+    '''
+    Parser de SLY que guarda en disco las tablas LALR generadas, indexadas
+    por un hash de la gramatica y las precedencias. Si el hash coincide las
+    tablas se cargan del archivo en lugar de recalcularse al definir la clase.
+    '''
+
+    @classmethod
+    def cachePath(cls) -> str:
+        default = os.path.join(os.path.dirname(__file__), '__pycache__', f'{cls.__name__}.lrtab')
+        return os.environ.get(CACHE_ENV, default)
+
+    @classmethod
+    def grammarKey(cls) -> str:
+        productions = [(str(p), p.prec) for p in cls._grammar.Productions]
+        spec = repr((CACHE_VERSION, slyVersion, cls._grammar.Start, sorted(cls.tokens), cls.precedence, productions))
+        return hashlib.sha256(spec.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def loadTables(cls, path: str, key: str):
+        try:
+            with open(path, 'rb') as cacheFile:
+                cached = pickle.load(cacheFile)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION or cached.get('key') != key:
+            return None
+        return CachedLRTable(cached['action'], cached['goto'], cached['defaulted'])
+
+    @classmethod
+    def saveTables(cls, path: str, key: str, lrtable) -> None:
+        cached = {
+            'version': CACHE_VERSION,
+            'key': key,
+            'action': lrtable.lr_action,
+            'goto': lrtable.lr_goto,
+            'defaulted': lrtable.defaulted_states,
+        }
+        tmpPath = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(tmpPath, 'wb') as cacheFile:
+                pickle.dump(cached, cacheFile, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, path)
+        except OSError:
+            # sin permisos de escritura se sigue sin cache
+            pass
+
+    @classmethod
+    def buildTables(cls) -> None:
+        if not cls._Parser__build_lrtables():
+            raise YaccError('Can\'t build parsing tables')
+
+        if cls.debugfile:
+            with open(cls.debugfile, 'w') as f:
+                f.write(str(cls._grammar))
+                f.write('\n')
+                f.write(str(cls._lrtable))
+            cls.log.info('Parser debugging for %s written to %s', cls.__qualname__, cls.debugfile)
+
+    # reemplaza Parser._build de SLY, que siempre recalcula las tablas
+    @classmethod
+    def _build(cls, definitions):
+        if vars(cls).get('_build', False):
+            return
+
+        rules = cls._Parser__collect_rules(definitions)
+        if not cls._Parser__validate_specification():
+            raise YaccError('Invalid parser specification')
+        cls._Parser__build_grammar(rules)
+
+        path = cls.cachePath()
+        if not path or cls.debugfile:
+            cls.buildTables()
+            return
+
+        key = cls.grammarKey()
+        lrtable = cls.loadTables(path, key)
+        if lrtable is None:
+            cls.buildTables()
+            cls.saveTables(path, key, cls._lrtable)
+        else:
+            cls._lrtable = lrtable
@@ -0,0 +1,414 @@
+import traceback
+
+from sys import argv, stderr, stdout
+from typing import Dict, List, Set, TextIO
+
+from .heap import Heap
+from .instructions import (
+    Add, Alloc, Call, Comment, Div, ICall, Jump, JumpEq, JumpLt, Label, Load, MamProgram, Mod, MovInt, MovLabel, MovReg,
+    Mul, Print, PrintChar, Return, Store, Sub, readProgram,
+)
+from .regalloc import RegisterAllocator
+from .vm import truncatedDivision
+
+OPERATORS = {Add: '+', Sub: '-'}
+
+# los tramos compartidos de hasta estas instrucciones que no siguen a otro
+# tramo de la funcion (como el final de un case) se copian en cada funcion
+# que llega a ellos en vez de ser una funcion aparte
+DUPLICATE_LIMIT = 8
+
+
+class Segment:
+    '''
+    Tramo de instrucciones sin etiquetas en el medio que termina en un
+    salto, un call, un icall, un return o justo antes de una etiqueta.
+    '''
+    def __init__(self, start: int, end: int, region: int) -> None:
+        self.start = start
+        self.end = end
+        self.region = region
+        self.successors: List[int] = []
+        self.size = 0
+        # registros locales vivos al empezar el tramo
+        self.live: List[int] = []
+
+
+class ThreadedVM:
+    '''
+    Ejecuta un programa Mamarracho traduciendolo antes a funciones de
+    python. Cada rutina (de su etiqueta rtn_N: a su return()) se parte en
+    tramos que terminan en call, icall o return, y cada funcion junta un
+    tramo de entrada con los que alcanza por saltos: los registros locales
+    son variables locales de la funcion y los saltos hacia atras un while.
+
+    Las funciones no se llaman entre si sino que devuelven la siguiente a
+    ejecutar a un ciclo principal, asi la pila de python no crece con la del
+    programa: call apila la continuacion y los registros que siguen vivos,
+    que tambien son las raices del colector junto con los globales.
+    '''
+    def __init__(self, program: MamProgram, sink: TextIO = stdout, heap: Heap = None) -> None:
+        self.program = program
+        self.sink = sink
+        self.heap = heap if heap is not None else Heap()
+        self.source = self.translate(program)
+        self.code = compile(self.source, "<mamarracho>", "exec")
+
+    def splitSegments(self, program: MamProgram) -> List[Segment]:
+        instructions = program.instructions
+        leaders = {len(instructions)}
+        regionOf = []
+        start = 0
+        for number, region in enumerate(RegisterAllocator().regions(instructions)):
+            region.buildBlocks()
+            liveOut = region.liveness()
+            for block, (first, end) in enumerate(region.blocks):
+                leaders.add(start + first)
+                live = set(liveOut[block])
+                for index in reversed(range(first, end)):
+                    live = (live - set(region.defs[index])) | set(region.uses[index])
+                    self.liveBefore[start + index] = live
+            for index, ins in enumerate(region.code):
+                regionOf.append(number)
+                if isinstance(ins, (Call, ICall)):
+                    leaders.add(start + index + 1)
+            start += len(region.code)
+        regionOf.append(len(regionOf))
+
+        leaders = sorted(leaders)
+        segments = [Segment(first, end, regionOf[first]) for first, end in zip(leaders, leaders[1:] + [len(instructions)])]
+        for number, segment in enumerate(segments):
+            self.segmentAt[segment.start] = number
+            segment.live = sorted(self.liveBefore.get(segment.start, ()))
+        return segments
+
+    # sucesores de cada tramo por saltos o por seguir de largo
+    def linkSegments(self, segments: List[Segment], program: MamProgram) -> None:
+        instructions = program.instructions
+        for segment in segments:
+            segment.size = sum(1 for ins in instructions[segment.start:segment.end] if not isinstance(ins, (Label, Comment)))
+        for number, segment in enumerate(segments):
+            last = instructions[segment.end - 1] if segment.end > segment.start else None
+            if isinstance(last, (Jump, JumpEq, JumpLt)):
+                segment.successors.append(self.labelSegment(last.label, program))
+            if segment.end < len(instructions) and not isinstance(last, (Jump, Call, ICall, Return)):
+                segment.successors.append(self.follow(number + 1))
+
+    # un tramo con solo etiquetas que sigue de largo o salta se saltea
+    def follow(self, number: int) -> int:
+        segments = self.segments
+        instructions = self.program.instructions
+        visited = set()
+        while number not in visited and segments[number].end < len(instructions):
+            segment = segments[number]
+            last = instructions[segment.end - 1]
+            if segment.size > 1 or segment.size == 1 and not isinstance(last, Jump):
+                break
+            visited.add(number)
+            number = self.segmentAt[self.labelPositions[last.label]] if isinstance(last, Jump) else number + 1
+        return number
+
+    def labelSegment(self, label: int, program: MamProgram) -> int:
+        if label not in self.labelPositions:
+            raise Exception(f"Etiqueta inexistente: {program.label(label)}")
+        return self.follow(self.segmentAt[self.labelPositions[label]])
+
+    # tramos que empiezan una funcion: los de entrada (el comienzo del
+    # programa y los destinos de call y mov_label, que arrancan con los
+    # locales en cero) y los que reciben sus registros vivos de la pila (las
+    # continuaciones de los llamados, los destinos de saltos desde otra
+    # rutina y los tramos a los que se llega desde mas de una funcion)
+    def findSeeds(self, segments: List[Segment], program: MamProgram) -> Dict[int, List[int]]:
+        entries = {0}
+        framed = set()
+        for index, ins in enumerate(program.instructions):
+            if isinstance(ins, Call):
+                entries.add(self.labelSegment(ins.label, program))
+            elif isinstance(ins, MovLabel):
+                entries.add(self.labelSegment(ins.value, program))
+            if isinstance(ins, (Call, ICall)):
+                framed.add(self.segmentAt[index + 1])
+        conflicts = entries & framed
+        if conflicts:
+            raise Exception(f"El tramo {segments[min(conflicts)].start} es a la vez entrada y continuacion")
+
+        while True:
+            seeds = entries | framed
+            owners = {}
+            members = {}
+            promoted = set()
+            for seed in sorted(seeds):
+                members[seed] = [seed]
+                pending = [seed]
+                visited = {seed}
+                while pending:
+                    current = pending.pop()
+                    for successor in segments[current].successors:
+                        if successor in visited or successor in seeds:
+                            continue
+                        if segments[successor].region != segments[seed].region:
+                            promoted.add(successor)
+                            continue
+                        if successor in owners and owners[successor] != seed:
+                            segment = segments[successor]
+                            if segment.size > DUPLICATE_LIMIT or any(next not in seeds for next in segment.successors):
+                                promoted.add(successor)
+                                continue
+                        owners.setdefault(successor, seed)
+                        visited.add(successor)
+                        members[seed].append(successor)
+                        pending.append(successor)
+            if not promoted:
+                break
+            framed |= promoted
+        self.entries = entries
+        return members
+
+    def translate(self, program: MamProgram) -> str:
+        self.liveBefore: Dict[int, Set[int]] = {}
+        self.segmentAt: Dict[int, int] = {}
+        self.labelPositions = {ins.label: index for index, ins in enumerate(program.instructions) if isinstance(ins, Label)}
+        segments = self.splitSegments(program)
+        self.segments = segments
+        self.linkSegments(segments, program)
+        pieces = self.findSeeds(segments, program)
+        self.pieces = len(pieces)
+
+        functions = {seed: index for index, seed in enumerate(sorted(pieces))}
+        entries = sorted(self.entries)
+        self.entryIndex = {seed: index for index, seed in enumerate(entries)}
+        lines = []
+        for seed in sorted(pieces):
+            lines.extend(self.translatePiece(seed, sorted(pieces[seed][1:]), segments, functions, program))
+        lines.append("FUNCS = [" + ", ".join(f"P{functions[seed]}" for seed in entries) + "]")
+        lines.append(f"ENTRY = P{functions[0]}")
+        lines.append("NAMES = {" + ", ".join(f"P{index}: {self.pieceName(seed, segments, program)!r}" for seed, index in functions.items()) + "}")
+        return "\n".join(lines) + "\n"
+
+    def pieceName(self, seed: int, segments: List[Segment], program: MamProgram) -> str:
+        start = segments[seed].start
+        for ins in program.instructions[start:segments[seed].end]:
+            if isinstance(ins, Label):
+                return program.label(ins.label)
+        return f"instruccion {start}"
+
+    def translatePiece(self, seed: int, rest: List[int], segments: List[Segment], functions: Dict[int, int], program: MamProgram) -> List[str]:
+        order = [seed] + rest
+        predecessors = {segment: [] for segment in order}
+        for segment in order:
+            for successor in segments[segment].successors:
+                if successor in predecessors:
+                    predecessors[successor].append(segment)
+        # un tramo al que solo se llega siguiendo de largo desde el anterior
+        # va en el mismo bloque que ese, sin pasar por el despacho
+        merged = {}
+        for previous, segment in zip(order, order[1:]):
+            if predecessors[segment] == [previous] and segments[previous].successors == [segment]:
+                merged[previous] = segment
+        continued = set(merged.values())
+        ids = {}
+        block = -1
+        for segment in order:
+            if segment not in continued:
+                block += 1
+            ids[segment] = block
+        loop = any(merged.get(segment) != successor and ids.get(successor, len(order)) <= ids[segment]
+                   for segment in order for successor in segments[segment].successors)
+        dispatch = block > 0
+
+        def reg(number: int) -> str:
+            return f"r{number}" if number >= 0 else f"G[{-number - 1}]"
+
+        def frame(registers: List[int]) -> str:
+            return "[" + ", ".join(reg(number) for number in registers) + "]"
+
+        def unpack(registers: List[int]) -> str:
+            return ", ".join(reg(number) for number in registers) + ","
+
+        def transfer(current: int, target: int) -> List[str]:
+            if merged.get(current) == target:
+                return []
+            if target in ids:
+                backward = ids[target] <= ids[current]
+                if not dispatch:
+                    return ["continue"]
+                return [f"b = {ids[target]}"] + (["continue"] if backward else [])
+            if target == len(segments) - 1 and target not in functions:
+                return ["return None"]
+            moves = []
+            if target not in self.entries and segments[target].live:
+                moves.append(f"frames.append({frame(segments[target].live)})")
+            return moves + [f"return P{functions[target]}"]
+
+        def branch(current: int, test: str, target: int) -> List[str]:
+            fallthrough = self.follow(current + 1)
+            return [f"if {test}:"] + ["    " + line for line in transfer(current, target)] + \
+                ["else:"] + ["    " + line for line in transfer(current, fallthrough)]
+
+        blocks = {}
+        allocates = False
+        instructions = program.instructions
+        for segment in order:
+            lines = []
+            for index in range(segments[segment].start, segments[segment].end):
+                ins = instructions[index]
+                kind = type(ins)
+                if kind is MovReg:
+                    if ins.reg1 != ins.reg2:
+                        lines.append(f"{reg(ins.reg1)} = {reg(ins.reg2)}")
+                elif kind is Load:
+                    lines.append(f"{reg(ins.reg1)} = W[({reg(ins.reg2)} >> 1) + {ins.index}]")
+                elif kind is Store:
+                    lines.append(f"W[({reg(ins.reg1)} >> 1) + {ins.index}] = {reg(ins.reg2)}")
+                elif kind is MovInt:
+                    lines.append(f"{reg(ins.reg)} = {ins.value << 1}")
+                elif kind is MovLabel:
+                    lines.append(f"{reg(ins.reg)} = {self.entryIndex[self.labelSegment(ins.value, program)] << 1}")
+                elif kind is Alloc:
+                    allocates = True
+                    live = sorted(self.liveBefore.get(index + 1, set()) - {ins.reg})
+                    size = ins.slots + 1
+                    lines.append(f"if T + {size} > CAP:")
+                    if live:
+                        lines.append(f"    {unpack(live)} = reserve({size}, {frame(live)})")
+                    else:
+                        lines.append(f"    reserve({size}, [])")
+                    lines.append(f"W[T] = {ins.slots}")
+                    lines.append(f"{reg(ins.reg)} = (T << 1) + 3")
+                    lines.append(f"T += {size}")
+                elif kind in OPERATORS:
+                    lines.append(f"{reg(ins.reg1)} = {reg(ins.reg2)} {OPERATORS[kind]} {reg(ins.reg3)}")
+                elif kind is Mul:
+                    lines.append(f"{reg(ins.reg1)} = ({reg(ins.reg2)} >> 1) * {reg(ins.reg3)}")
+                elif kind is Div:
+                    lines.append(f"{reg(ins.reg1)} = div({reg(ins.reg2)} >> 1, {reg(ins.reg3)} >> 1) << 1")
+                elif kind is Mod:
+                    x, y = reg(ins.reg2), reg(ins.reg3)
+                    lines.append(f"{reg(ins.reg1)} = {x} - {y} * div({x}, {y})")
+                elif kind is Print:
+                    lines.append(f"write(str({reg(ins.reg)} >> 1))")
+                elif kind is PrintChar:
+                    lines.append(f"write(chr({reg(ins.reg)} >> 1))")
+                elif kind is JumpEq:
+                    lines.extend(branch(segment, f"{reg(ins.reg1)} == {reg(ins.reg2)}", self.labelSegment(ins.label, program)))
+                elif kind is JumpLt:
+                    lines.extend(branch(segment, f"{reg(ins.reg1)} < {reg(ins.reg2)}", self.labelSegment(ins.label, program)))
+                elif kind is Jump:
+                    lines.extend(transfer(segment, self.labelSegment(ins.label, program)))
+                elif kind is Call or kind is ICall:
+                    continuation = segment + 1
+                    if segments[continuation].live:
+                        lines.append(f"frames.append({frame(segments[continuation].live)})")
+                    lines.append(f"conts.append(P{functions[continuation]})")
+                    if kind is Call:
+                        lines.append(f"return P{functions[self.labelSegment(ins.label, program)]}")
+                    else:
+                        lines.append(f"return FUNCS[{reg(ins.reg)} >> 1]")
+                elif kind is Return:
+                    lines.append("return conts.pop()")
+                elif kind is not Label and kind is not Comment:
+                    raise Exception(f"Instruccion desconocida: {ins.render(program)}")
+            last = instructions[segments[segment].end - 1] if segments[segment].end > segments[segment].start else None
+            if not isinstance(last, (Jump, JumpEq, JumpLt, Call, ICall, Return)):
+                if segments[segment].end == len(instructions):
+                    lines.append("return None")
+                else:
+                    lines.extend(transfer(segment, self.follow(segment + 1)))
+            blocks.setdefault(ids[segment], []).extend(lines)
+
+        body = []
+        for block, lines in blocks.items():
+            if dispatch and (loop or block > 0):
+                body.append(f"if b == {block}:")
+                body.extend("    " + line for line in lines)
+            else:
+                body.extend(lines)
+
+        name = self.pieceName(seed, segments, program)
+        header = [f"def P{functions[seed]}():  # {name}"]
+        if allocates:
+            header.append("    global T")
+        live = segments[seed].live
+        if live and seed in self.entries:
+            header.append("    " + " = ".join(reg(number) for number in live) + " = 0")
+        elif live:
+            header.append(f"    {unpack(live)} = frames.pop()")
+        if dispatch:
+            header.append("    b = 0")
+        if loop:
+            header.append("    while True:")
+            return header + ["        " + line for line in body] + [""]
+        return header + ["    " + line for line in body] + [""]
+
+    def run(self) -> None:
+        heap = self.heap
+        globals = [0] * len(self.program.globals)
+        frames = []
+        namespace = {
+            'G': globals, 'W': heap.words, 'T': heap.top, 'CAP': heap.capacity, 'frames': frames, 'conts': [],
+            'write': self.sink.write, 'div': truncatedDivision,
+        }
+
+        # el colector cambia de semiespacio y mueve los bloques, asi que
+        # actualiza las palabras, el tope y los registros vivos que recibe
+        def reserve(size: int, live: list) -> list:
+            heap.top = namespace['T']
+            namespace['W'] = heap.reserve(size, [globals, live] + frames)
+            namespace['T'] = heap.top
+            namespace['CAP'] = heap.capacity
+            return live
+
+        namespace['reserve'] = reserve
+        exec(self.code, namespace)
+        names = namespace['NAMES']
+        function = namespace['ENTRY']
+        try:
+            while function is not None:
+                function = function()
+        except (TypeError, IndexError, ValueError, OverflowError) as e:
+            raise Exception(f"Error en {names.get(function, function)}: {e}")
+        finally:
+            heap.top = namespace['T']
+
+    def report(self) -> List[str]:
+        return [
+            f"funciones de python: {self.pieces}",
+            f"lineas generadas: {self.source.count(chr(10))}",
+        ] + self.heap.report()
+
+
+def runThreaded(program: MamProgram, sink: TextIO = stdout, heap: Heap = None) -> ThreadedVM:
+    vm = ThreadedVM(program, sink, heap)
+    vm.run()
+    return vm
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m src.threaded test_codegen_v2/test_codegen/test01.fl.mam [--stats] [--heap=<palabras>] [--source]
+
+    ejecuta un programa Mamarracho traducido a funciones de python. Con
+    --source imprime el codigo generado en vez de correrlo
+    '''
+
+    try:
+        if len(argv) < 2:
+            raise Exception("Pass a filename as argument")
+
+        with open(argv[1], 'r') as inputContent:
+            program = readProgram(inputContent)
+        heap = Heap()
+        for option in argv[2:]:
+            if option.startswith('--heap='):
+                heap = Heap(maxWords=int(option[len('--heap='):]))
+        if '--source' in argv[2:]:
+            print(ThreadedVM(program, stdout, heap).source)
+        else:
+            vm = runThreaded(program, heap=heap)
+            if '--stats' in argv[2:]:
+                for line in vm.report():
+                    print(line, file=stderr)
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
@@ -1,4 +1,6 @@
-from typing import List, Tuple, Optional
+from collections.abc import Sequence
+from types import GeneratorType
+from typing import Any, Iterator, List, Tuple, Optional
 
 def parseSpecialChar(char: str) -> int:
     charList = list(char)
@@ -33,24 +35,65 @@ def parseString(s: str) -> List:
                 slashed = False
     return resultList
 
+# acepta tanto listas como vistas de nodos de un AstArena
 def isNotEmptyList(expr: List) -> bool:
-    return isinstance(expr, list) and len(expr) > 0
+    return isinstance(expr, Sequence) and not isinstance(expr, str) and len(expr) > 0
 
 def getExprConstructor(exprApplyList: List) -> Tuple[int, Optional[List]]:
-    if isNotEmptyList(exprApplyList) and len(exprApplyList) == 3:
-        dep, cons = getExprConstructor(exprApplyList[1])
-        return 1 + dep, cons
+    dep = 0
+    while isNotEmptyList(exprApplyList) and len(exprApplyList) == 3:
+        exprApplyList = exprApplyList[1]
+        dep += 1
     if exprApplyList[0] == "ExprConstructor":
-        return 0, exprApplyList
-    return 0, None
+        return dep, exprApplyList
+    return dep, None
+
+# un string literal guarda los codigos de sus caracteres en un solo nodo;
+# el string vacio es directamente Nil
+def stringExpr(codes: List[int]) -> List:
+    if len(codes) == 0:
+        return ["ExprConstructor", "Nil"]
+    return ["ExprString", codes]
+
+def isExprString(expr: List) -> bool:
+    return isNotEmptyList(expr) and expr[0] == "ExprString"
 
 def isExprConstructor(exprApplyList: List) -> bool:
-    if isNotEmptyList(exprApplyList):
-        if exprApplyList[0] == "ExprApply":
-            return isExprConstructor(exprApplyList[1])
-        elif exprApplyList[0] == "ExprConstructor":
-            return True
-    return False
+    while isNotEmptyList(exprApplyList) and exprApplyList[0] == "ExprApply":
+        exprApplyList = exprApplyList[1]
+    return isNotEmptyList(exprApplyList) and exprApplyList[0] == "ExprConstructor"
+
+# corre un recorrido recursivo escrito como generador sobre una pila
+# explicita, sin usar la pila de Python: cada `yield` de otro generador pide
+# ese sub-recorrido y recibe su resultado (el valor de su return) como valor
+# del yield. Un `yield` de cualquier otra cosa la devuelve tal cual, asi los
+# casos base pueden ser funciones comunes
+def trampoline(generator: Iterator) -> Any:
+    stack = [generator]
+    value = None
+    while stack:
+        try:
+            step = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            continue
+        if isinstance(step, GeneratorType):
+            stack.append(step)
+            value = None
+        else:
+            value = step
+    return value
+
+# identifica un nodo para anotarlo en tablas auxiliares: las listas por
+# identidad y las vistas de un AstArena por su indice de nodo
+def nodeKey(expr: List):
+    if isinstance(expr, list):
+        return id(expr)
+    return expr.key()
+
+def isExprApply(expr: List) -> bool:
+    return isNotEmptyList(expr) and expr[0] == "ExprApply"
 
 def isExprVar(expr: List) -> bool:
     return isNotEmptyList(expr) and expr[0] == "ExprVar"
@@ -60,3 +103,11 @@ def isExprDef(expr: List) -> bool:
 
 def isExprLambda(expr: List) -> bool:
     return isNotEmptyList(expr) and expr[0] == "ExprLambda"
+
+# lambdas anidadas directamente desde exp, de afuera hacia adentro
+def lambdaChain(expr: List) -> List:
+    chain = []
+    while isExprLambda(expr):
+        chain.append(expr)
+        expr = expr[2]
+    return chain
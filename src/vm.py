@@ -0,0 +1,250 @@
+import traceback
+
+from sys import argv, stderr, stdout
+from typing import List, TextIO, Tuple
+
+from .heap import Heap
+from .instructions import (
+    Add, Alloc, Call, Comment, Div, ICall, Instruction, Jump, JumpEq, JumpLt, Label, Load, MamProgram, Mod, MovInt,
+    MovLabel, MovReg, Mul, Print, PrintChar, Return, Store, Sub, readProgram,
+)
+
+# codigos de operacion densos. El ciclo de ejecucion los compara en este
+# orden, que es mas o menos el de su frecuencia en el codigo generado
+MOV_REG = 0
+LOAD = 1
+STORE = 2
+MOV_INT = 3
+ALLOC = 4
+JUMP_EQ = 5
+JUMP = 6
+ICALL = 7
+CALL = 8
+RETURN = 9
+ADD = 10
+SUB = 11
+MUL = 12
+DIV = 13
+MOD = 14
+JUMP_LT = 15
+PRINT = 16
+PRINT_CHAR = 17
+HALT = 18
+
+OPERATIONS = {Add: ADD, Sub: SUB, Mul: MUL, Div: DIV, Mod: MOD}
+
+# tope de pasos por defecto, para cortar los programas que no terminan
+MAX_STEPS = 1 << 62
+
+
+# los registros y las casillas guardan palabras con tag (ver heap.pointer):
+# los enteros se operan corridos un bit
+def truncatedDivision(x: int, y: int) -> int:
+    if y == 0:
+        raise Exception("Division por cero")
+    quotient = abs(x) // abs(y)
+    return quotient if (x < 0) == (y < 0) else -quotient
+
+
+class MamarrachoVM:
+    '''
+    Interprete de Mamarracho que ejecuta las instrucciones de
+    src/instructions.py. Antes de correr traduce el programa a tuplas
+    (opcode, a, b, c) con las etiquetas resueltas a posiciones y los
+    registros a indices de un unico arreglo: primero los globales y despues
+    los locales del llamado actual, que call guarda e icall/return
+    restauran. Los bloques de alloc viven en un Heap con recoleccion de
+    basura, cuyas raices son los registros y los locales guardados.
+    '''
+    def __init__(self, program: MamProgram, sink: TextIO = stdout, maxSteps: int = MAX_STEPS, heap: Heap = None) -> None:
+        self.program = program
+        self.sink = sink
+        self.maxSteps = maxSteps
+        self.heap = heap if heap is not None else Heap()
+        self.code, self.source = self.assemble(program)
+        self.steps = 0
+        self.calls = 0
+        self.allocations = 0
+        self.maxDepth = 0
+
+    def assemble(self, program: MamProgram) -> Tuple[List[tuple], List[Instruction]]:
+        positions = {}
+        source = []
+        for ins in program:
+            if isinstance(ins, Label):
+                positions[ins.label] = len(source)
+            elif not isinstance(ins, Comment):
+                source.append(ins)
+
+        self.globalCount = len(program.globals)
+        self.localCount = 1 + max([0] + [getattr(ins, field) for ins in source for field in ins.defs + ins.uses])
+
+        def reg(number: int) -> int:
+            return -number - 1 if number < 0 else self.globalCount + number
+
+        def label(number: int) -> int:
+            if number not in positions:
+                raise Exception(f"Etiqueta inexistente: {program.label(number)}")
+            return positions[number]
+
+        code = []
+        for ins in source:
+            kind = type(ins)
+            if kind is MovReg:
+                code.append((MOV_REG, reg(ins.reg1), reg(ins.reg2), 0))
+            elif kind is Load:
+                code.append((LOAD, reg(ins.reg1), reg(ins.reg2), ins.index))
+            elif kind is Store:
+                code.append((STORE, reg(ins.reg1), ins.index, reg(ins.reg2)))
+            elif kind is MovInt:
+                code.append((MOV_INT, reg(ins.reg), ins.value << 1, 0))
+            # una etiqueta como valor es su posicion en el codigo
+            elif kind is MovLabel:
+                code.append((MOV_INT, reg(ins.reg), label(ins.value) << 1, 0))
+            elif kind is Alloc:
+                code.append((ALLOC, reg(ins.reg), ins.slots, 0))
+            elif kind is JumpEq:
+                code.append((JUMP_EQ, reg(ins.reg1), reg(ins.reg2), label(ins.label)))
+            elif kind is JumpLt:
+                code.append((JUMP_LT, reg(ins.reg1), reg(ins.reg2), label(ins.label)))
+            elif kind is Jump:
+                code.append((JUMP, label(ins.label), 0, 0))
+            elif kind is ICall:
+                code.append((ICALL, reg(ins.reg), 0, 0))
+            elif kind is Call:
+                code.append((CALL, label(ins.label), 0, 0))
+            elif kind is Return:
+                code.append((RETURN, 0, 0, 0))
+            elif kind in OPERATIONS:
+                code.append((OPERATIONS[kind], reg(ins.reg1), reg(ins.reg2), reg(ins.reg3)))
+            elif kind is Print:
+                code.append((PRINT, reg(ins.reg), 0, 0))
+            elif kind is PrintChar:
+                code.append((PRINT_CHAR, reg(ins.reg), 0, 0))
+            else:
+                raise Exception(f"Instruccion desconocida: {ins.render(program)}")
+        # el programa termina al pasar la ultima instruccion
+        code.append((HALT, 0, 0, 0))
+        return code, source
+
+    def run(self) -> None:
+        code = self.code
+        base = self.globalCount
+        registers = [0] * (base + self.localCount)
+        stack = []
+        write = self.sink.write
+        maxSteps = self.maxSteps
+        steps = calls = allocations = maxDepth = 0
+        heap = self.heap
+        words = heap.words
+        top = heap.top
+        capacity = heap.capacity
+        pc = 0
+        try:
+            while True:
+                op, a, b, c = code[pc]
+                pc += 1
+                steps += 1
+                if op == MOV_REG:
+                    registers[a] = registers[b]
+                elif op == LOAD:
+                    registers[a] = words[(registers[b] >> 1) + c]
+                elif op == STORE:
+                    words[(registers[a] >> 1) + b] = registers[c]
+                elif op == MOV_INT:
+                    registers[a] = b
+                elif op == ALLOC:
+                    if top + b + 1 > capacity:
+                        heap.top = top
+                        words = heap.reserve(b + 1, [registers] + [frame for _, frame in stack])
+                        top = heap.top
+                        capacity = heap.capacity
+                    words[top] = b
+                    registers[a] = ((top + 1) << 1) | 1
+                    top += b + 1
+                    allocations += 1
+                elif op == JUMP_EQ:
+                    if registers[a] == registers[b]:
+                        pc = c
+                elif op == JUMP:
+                    pc = a
+                elif op == ICALL or op == CALL:
+                    stack.append((pc, registers[base:]))
+                    pc = registers[a] >> 1 if op == ICALL else a
+                    calls += 1
+                    if len(stack) > maxDepth:
+                        maxDepth = len(stack)
+                elif op == RETURN:
+                    pc, registers[base:] = stack.pop()
+                elif op == ADD:
+                    registers[a] = registers[b] + registers[c]
+                elif op == SUB:
+                    registers[a] = registers[b] - registers[c]
+                elif op == MUL:
+                    registers[a] = (registers[b] >> 1) * registers[c]
+                elif op == DIV:
+                    registers[a] = truncatedDivision(registers[b] >> 1, registers[c] >> 1) << 1
+                elif op == MOD:
+                    x, y = registers[b], registers[c]
+                    registers[a] = x - y * truncatedDivision(x, y)
+                elif op == JUMP_LT:
+                    if registers[a] < registers[b]:
+                        pc = c
+                elif op == PRINT:
+                    write(str(registers[a] >> 1))
+                elif op == PRINT_CHAR:
+                    write(chr(registers[a] >> 1))
+                else:
+                    break
+                if steps >= maxSteps:
+                    raise Exception(f"Se supero el limite de {maxSteps} instrucciones")
+        except (TypeError, IndexError, ValueError, OverflowError) as e:
+            raise Exception(f"Error en {self.source[pc - 1].render(self.program)}: {e}")
+        finally:
+            heap.top = top
+            self.steps = steps
+            self.calls = calls
+            self.allocations = allocations
+            self.maxDepth = maxDepth
+
+    def report(self) -> List[str]:
+        return [
+            f"instrucciones ejecutadas: {self.steps}",
+            f"llamadas: {self.calls}",
+            f"bloques reservados: {self.allocations}",
+            f"profundidad maxima de la pila: {self.maxDepth}",
+        ] + self.heap.report()
+
+
+def runProgram(program: MamProgram, sink: TextIO = stdout, maxSteps: int = MAX_STEPS, heap: Heap = None) -> MamarrachoVM:
+    vm = MamarrachoVM(program, sink, maxSteps, heap)
+    vm.run()
+    return vm
+
+
+if __name__ == '__main__':
+
+    '''
+    python -m src.vm test_codegen_v2/test_codegen/test01.fl.mam [--stats] [--heap=<palabras>]
+
+    ejecuta un programa Mamarracho en texto, sin mamarracho.bin. --heap
+    limita el tamaño de cada semiespacio
+    '''
+
+    try:
+        if len(argv) < 2:
+            raise Exception("Pass a filename as argument")
+
+        with open(argv[1], 'r') as inputContent:
+            program = readProgram(inputContent)
+        heap = Heap()
+        for option in argv[2:]:
+            if option.startswith('--heap='):
+                heap = Heap(maxWords=int(option[len('--heap='):]))
+        vm = runProgram(program, heap=heap)
+        if '--stats' in argv[2:]:
+            for line in vm.report():
+                print(line, file=stderr)
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
@@ -34,6 +34,15 @@ tests=(
     "test31"
 )
 
-for test in "${tests[@]}"; do
-    (bash "test_compiler.sh" $test) || exit 1;
+# la salida esperada es la misma con cualquier nivel de optimizacion
+levels=(
+    "-O0"
+    "-O1"
+    "-O2"
+)
+
+for level in "${levels[@]}"; do
+    for test in "${tests[@]}"; do
+        (bash "test_compiler.sh" $test $level) || exit 1;
+    done
 done
@@ -2,23 +2,33 @@
 
 BASE="$(pwd)/test_codegen_v2/test_codegen/"
 TARGET=$1
+# nivel de optimizacion opcional, por ejemplo -O2
+LEVEL=$2
 INPUT_NAME="${BASE}${TARGET}.fl"
 EXPECTED_NAME="${BASE}${TARGET}.expected"
 
-echo ".....testing $INPUT_NAME"
+# sin ./mamarracho.bin el programa se ejecuta en la maquina de src.vm
+if [ -x "./mamarracho.bin" ]
+then
+    MAMARRACHO="./mamarracho.bin"
+else
+    MAMARRACHO="python -m src.vm"
+fi
+
+echo ".....testing $INPUT_NAME $LEVEL"
 
 python -m src.parser $INPUT_NAME > "$INPUT_NAME.ast"
 
-python -m src.compiler "$INPUT_NAME.ast" > "$INPUT_NAME.mam"
+python -m src.compiler "$INPUT_NAME.ast" $LEVEL > "$INPUT_NAME.mam"
 
-"./mamarracho.bin" "$INPUT_NAME.mam" > "$INPUT_NAME.eval"
+$MAMARRACHO "$INPUT_NAME.mam" > "$INPUT_NAME.eval"
 
 diff "$INPUT_NAME.eval" "$EXPECTED_NAME"
 
 if [ $? == 0 ]
 then
-    echo "test: $TARGET succeded"
+    echo "test: $TARGET $LEVEL succeded"
 else
-    echo "test: $TARGET failed"
+    echo "test: $TARGET $LEVEL failed"
     exit 1
 fi
@@ -5,9 +5,17 @@ TARGET=$1
 INPUT_NAME="${BASE}${TARGET}.fl.mam"
 EXPECTED_NAME="${BASE}${TARGET}.expected"
 
+# sin ./mamarracho.bin el programa se ejecuta en la maquina de src.vm
+if [ -x "./mamarracho.bin" ]
+then
+    MAMARRACHO="./mamarracho.bin"
+else
+    MAMARRACHO="python -m src.vm"
+fi
+
 echo ".....testing $INPUT_NAME"
 
-"./mamarracho.bin" "$INPUT_NAME" > "$INPUT_NAME.eval"
+$MAMARRACHO "$INPUT_NAME" > "$INPUT_NAME.eval"
 
 diff "$INPUT_NAME.eval" "$EXPECTED_NAME"
 
@@ -0,0 +1,107 @@
+import sys
+
+from io import StringIO
+
+from src.compiler import FlechaCompiler
+from src.pipeline import parseSource
+from src.threaded import runThreaded
+from src.vm import runProgram
+
+# programas chicos con su salida esperada. Cada uno se compila con -O0,
+# -O1 y -O2, con las opciones por defecto y sin ninguna de las pasadas
+# opcionales, y se corre en src.vm y en src.threaded
+PROGRAMS = {
+    # un parametro de una rama que sombrea a un global no puede quedar
+    # ligado en las otras ramas ni despues del case
+    "sombra": (
+        "def x = 1\n"
+        "def f l = case l | Nil -> x | Cons x xs -> x\n"
+        "def g l = case l | Cons x xs -> 10 | Nil -> x\n"
+        "def h y l = case l | Cons y y -> 7 | Nil -> y\n"
+        "def k l = case l | Cons x x -> 7 | Nil -> x\n"
+        "def main = (unsafePrintInt (f (Cons 5 Nil)); unsafePrintInt (f Nil); unsafePrintInt (g Nil);\n"
+        "            unsafePrintInt (h 3 Nil); unsafePrintInt (k Nil))\n",
+        "51131",
+    ),
+    "levantadas": (
+        "def f n = let g x = x + n in g 1 + g 2\n"
+        "def h a b = let sum x y = x * 10 + y + a - b in sum (sum 1 2) 3\n"
+        "def main = (unsafePrintInt (f 10); unsafePrintChar ' '; unsafePrintInt (h 5 1))\n",
+        "23 167",
+    ),
+    "cola": (
+        "def loop n acc = if n == 0 then acc else loop (n - 1) (acc + n)\n"
+        "def even n = if n == 0 then True else odd (n - 1)\n"
+        "def odd n = if n == 0 then False else even (n - 1)\n"
+        "def main = (unsafePrintInt (loop 100000 0); unsafePrintChar ' ';\n"
+        "            unsafePrintInt (if even 100001 then 1 else 0))\n",
+        "5000050000 0",
+    ),
+    "strings": (
+        "def printS xs = case xs | Nil -> 0 | Cons c cs -> (unsafePrintChar c; printS cs)\n"
+        "def length xs = case xs | Nil -> 0 | Cons c cs -> 1 + length cs\n"
+        "def main = (printS \"hola\\n\"; printS \"\"; unsafePrintInt (length \"mamarracho\");\n"
+        "            printS (case \"xyz\" | Nil -> \"vacio\" | Cons c cs -> cs))\n",
+        "hola\n10yz",
+    ),
+    "clausuras": (
+        "def map f xs = case xs | Nil -> Nil | Cons y ys -> Cons (f y) (map f ys)\n"
+        "def foldr f z xs = case xs | Nil -> z | Cons y ys -> f y (foldr f z ys)\n"
+        "def compose f g x = f (g x)\n"
+        "def main = unsafePrintInt (foldr (\\a b -> a + b) 0 (map (compose (\\x -> x * 2) (\\x -> x - 1)) "
+        "(Cons 1 (Cons 2 (Cons 3 Nil)))) / 3 % 5)\n",
+        "2",
+    ),
+    # un tag sin rama cae en la primera rama del case, tanto en la busqueda
+    # lineal como en la binaria; con ramas repetidas gana la primera
+    "sin rama": (
+        "def f x = case x | C -> 1 | B -> 2 | A -> 3 | D -> 4 | E -> 5\n"
+        "def g x = case x | A -> 1 | B -> 2\n"
+        "def h x = case x | B -> 1 | A -> 2 | A -> 3 | A -> 4 | C -> 5\n"
+        "def main = (unsafePrintInt (f Z); unsafePrintInt (f E); unsafePrintInt (g Z);\n"
+        "            unsafePrintInt (h A); unsafePrintInt (h Z))\n",
+        "15121",
+    ),
+}
+
+CONFIGS = {
+    "": {},
+    " sin pasadas": {
+        "allocateRegisters": False, "staticConstants": False, "binaryCase": False,
+        "tailCalls": False, "directCalls": False, "pruneDefinitions": False,
+    },
+}
+
+
+def run(engine, program) -> str:
+    sink = StringIO()
+    try:
+        engine(program, sink)
+    except Exception as e:
+        return f"{sink.getvalue()}<error: {e}>"
+    return sink.getvalue()
+
+
+if __name__ == '__main__':
+
+    '''
+    python test_vm.py
+
+    corre los programas de PROGRAMS en src.vm y src.threaded, sin
+    ./mamarracho.bin
+    '''
+
+    failed = 0
+    for name, (source, expected) in PROGRAMS.items():
+        ast = parseSource(source)
+        for level in [0, 1, 2]:
+            for config, options in CONFIGS.items():
+                program = FlechaCompiler(optimize=level, **options).compileExpressions(ast)
+                for engine, runner in [("vm", runProgram), ("threaded", runThreaded)]:
+                    output = run(runner, program)
+                    if output != expected:
+                        failed += 1
+                        print(f"test: {name} -O{level}{config} {engine} failed: {output!r} en vez de {expected!r}")
+    if failed:
+        sys.exit(1)
+    print(f"test: {len(PROGRAMS)} programas succeded")